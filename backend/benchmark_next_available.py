@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark for GET /api/doctors/next-available
+
+Seeds synthetic approved doctors with weekly schedules and random bookings,
+then compares probing every doctor's availability (what the client had to
+do) with one search over the free window index. Counts MongoDB round trips
+and wall time. Runs against a local mongod (override with MONGODB_URI).
+"""
+
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import MongoClient, monitoring
+from models import Doctor, DoctorAvailability, SlotOccupancy, FreeWindow
+
+MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
+DATABASE_NAME = 'doceasy_benchmark'
+DOCTOR_COUNT = int(os.getenv('BENCHMARK_DOCTORS', '2000'))
+SPECIALTIES = ['Cardiology', 'Dermatology', 'General Medicine', 'Neurology', 'Orthopedics',
+               'Pediatrics', 'Psychiatry', 'Gynecology', 'ENT', 'Ophthalmology']
+SEARCH_SPECIALTY = 'Cardiology'
+RUNS = 5
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent to the server"""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name in ('find', 'aggregate', 'count', 'getMore'):
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+def seed(db):
+    """Create approved doctors with weekday schedules and mostly booked mornings"""
+    random.seed(42)
+    for collection in (Doctor.collection_name, DoctorAvailability.collection_name,
+                       SlotOccupancy.collection_name, FreeWindow.collection_name):
+        db[collection].delete_many({})
+    FreeWindow.create_indexes(db)
+    SlotOccupancy.create_indexes(db)
+
+    doctors = [{
+        '_id': ObjectId(),
+        'name': f"Dr. Benchmark {i}",
+        'specialty': SPECIALTIES[i % len(SPECIALTIES)],
+        'verificationStatus': 'approved'
+    } for i in range(DOCTOR_COUNT)]
+    db[Doctor.collection_name].insert_many(doctors)
+
+    availabilities = []
+    for doctor in doctors:
+        weekly = DoctorAvailability.create_default_availability()
+        for day in ['monday', 'tuesday', 'wednesday', 'thursday', 'friday']:
+            weekly[day] = {
+                'is_available': True,
+                'time_slots': [{'start_time': '09:00', 'end_time': '13:00'}, {'start_time': '14:00', 'end_time': '18:00'}]
+            }
+        availabilities.append({'doctor_id': str(doctor['_id']), 'weekly_availability': weekly})
+    db[DoctorAvailability.collection_name].insert_many(availabilities)
+
+    # Book 80% of each doctor's slots over the next week so the earliest
+    # free slot differs per doctor
+    today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    for doctor in doctors:
+        for day_offset in range(1, 8):
+            day = today + timedelta(days=day_offset)
+            for minutes in range(9 * 60, 18 * 60, DoctorAvailability.slot_duration_minutes):
+                if random.random() < 0.8:
+                    start = day + timedelta(minutes=minutes)
+                    SlotOccupancy.update_cells(
+                        db, str(doctor['_id']), start,
+                        start + timedelta(minutes=DoctorAvailability.slot_duration_minutes), occupied=True
+                    )
+
+    FreeWindow.refresh_all(db)
+
+def probe_every_doctor(db, after):
+    """Previous approach: list the specialty's doctors and scan each calendar"""
+    doctors = Doctor.find_all(db, filters={'verificationStatus': 'approved', 'specialty': SEARCH_SPECIALTY})
+    from_date = after.strftime('%Y-%m-%d')
+    to_date = (after + timedelta(days=13)).strftime('%Y-%m-%d')
+
+    earliest = None
+    for doctor in doctors:
+        for day in DoctorAvailability.get_available_slots_for_range(db, doctor['id'], from_date, to_date):
+            open_slots = [
+                slot['datetime'] for slot in day['available_slots']
+                if slot['is_available'] and DoctorAvailability.parse_slot_datetime(slot['datetime']) >= after
+            ]
+            if open_slots:
+                if earliest is None or open_slots[0] < earliest:
+                    earliest = open_slots[0]
+                break
+    return earliest
+
+def search_free_windows(db, after):
+    """New approach: one search over the free window index"""
+    results = FreeWindow.find_earliest(db, after, specialty=SEARCH_SPECIALTY, limit=1)
+    return results[0]['slot_datetime'] if results else None
+
+def measure(counter, label, func):
+    """Run func RUNS times and print round trips and latency per call"""
+    counter.count = 0
+    started = time.perf_counter()
+    for _ in range(RUNS):
+        result = func()
+    elapsed_ms = (time.perf_counter() - started) * 1000 / RUNS
+    print(f"{label:<12} {counter.count / RUNS:>8.1f} round trips {elapsed_ms:>10.2f} ms   earliest {result}")
+    return result
+
+def run_benchmark():
+    counter = CommandCounter()
+    client = MongoClient(MONGODB_URI, event_listeners=[counter])
+    db = client[DATABASE_NAME]
+
+    print(f"Seeding {DOCTOR_COUNT} doctors across {len(SPECIALTIES)} specialties...")
+    seed(db)
+    print(f"Indexed {db[FreeWindow.collection_name].count_documents({})} free windows")
+
+    after = (datetime.utcnow() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    print(f"Earliest {SEARCH_SPECIALTY} slot after {after.isoformat()}, {RUNS} runs")
+    before = measure(counter, 'before', lambda: probe_every_doctor(db, after))
+    after_result = measure(counter, 'after', lambda: search_free_windows(db, after))
+    print("Results match" if before == after_result else "Results differ!")
+
+    client.drop_database(DATABASE_NAME)
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the day-slot engine behind
+GET /api/doctors/<id>/availability/date/<date>
+
+Counts MongoDB round trips and wall time for one availability request,
+comparing the previous per-slot lookup pattern with the single-query engine.
+Runs against a local mongod (override with MONGODB_URI).
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+from pymongo import MongoClient, monitoring
+from models import DoctorAvailability, Appointment, SlotReservation, SlotOccupancy
+
+MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
+DATABASE_NAME = 'doceasy_benchmark'
+DOCTOR_ID = 'benchmark_doctor'
+RUNS = 20
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent to the server"""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name in ('find', 'aggregate', 'count'):
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+def legacy_is_slot_booked(db, doctor_id, slot_dt):
+    """Replay of the previous is_slot_booked query pattern (exact, variations, regex)"""
+    collection = db[Appointment.collection_name]
+    statuses = {'$in': ['confirmed', 'pending']}
+
+    if collection.find_one({'doctor_id': doctor_id, 'appointment_date': slot_dt.isoformat(), 'status': statuses}):
+        return True
+
+    for iso_format in [
+        slot_dt.isoformat(),
+        slot_dt.strftime('%Y-%m-%dT%H:%M:%S'),
+        slot_dt.strftime('%Y-%m-%d %H:%M:%S'),
+        f"{slot_dt.strftime('%Y-%m-%dT%H:%M:%S')}.000Z",
+        f"{slot_dt.strftime('%Y-%m-%dT%H:%M:%S')}Z"
+    ]:
+        if collection.find_one({'doctor_id': doctor_id, 'appointment_date': iso_format, 'status': statuses}):
+            return True
+
+    appointments = list(collection.find({
+        'doctor_id': doctor_id,
+        'status': statuses,
+        'appointment_date': {'$regex': f"^{slot_dt.date().isoformat()}"}
+    }))
+    for appointment in appointments:
+        apt_dt = DoctorAvailability.parse_slot_datetime(appointment['appointment_date'])
+        if apt_dt and slot_dt < apt_dt + timedelta(minutes=30) and slot_dt + timedelta(minutes=30) > apt_dt:
+            return True
+    return False
+
+def legacy_get_available_slots_for_date(db, doctor_id, date):
+    """Replay of the previous engine: one is_slot_booked call per generated slot"""
+    date_obj = datetime.strptime(date, '%Y-%m-%d')
+    day_slots = DoctorAvailability.get_available_slots_for_day(db, doctor_id, date_obj.strftime('%A').lower())
+    slots = []
+    for slot_range in day_slots:
+        current = date_obj.replace(hour=int(slot_range['start_time'][:2]), minute=int(slot_range['start_time'][3:]))
+        end = date_obj.replace(hour=int(slot_range['end_time'][:2]), minute=int(slot_range['end_time'][3:]))
+        while current < end:
+            slots.append(legacy_is_slot_booked(db, doctor_id, current))
+            current += timedelta(minutes=30)
+    return slots
+
+def seed(db, date):
+    """Create a 09:00-18:00 schedule and a few bookings for the benchmark doctor"""
+    db[DoctorAvailability.collection_name].delete_many({'doctor_id': DOCTOR_ID})
+    db[Appointment.collection_name].delete_many({'doctor_id': DOCTOR_ID})
+    db[SlotReservation.collection_name].delete_many({'doctor_id': DOCTOR_ID})
+    db[SlotOccupancy.collection_name].delete_many({'doctor_id': DOCTOR_ID})
+
+    weekly = DoctorAvailability.create_default_availability()
+    day_of_week = datetime.strptime(date, '%Y-%m-%d').strftime('%A').lower()
+    weekly[day_of_week] = {
+        'is_available': True,
+        'time_slots': [{'start_time': '09:00', 'end_time': '18:00'}]
+    }
+    DoctorAvailability.create_or_update(db, DOCTOR_ID, weekly)
+
+    for booked_time in ['09:30', '11:00', '14:30', '16:00']:
+        Appointment.create(db, {
+            'patient_id': 'benchmark_patient',
+            'doctor_id': DOCTOR_ID,
+            'appointment_date': f"{date}T{booked_time}:00",
+            'status': 'confirmed'
+        })
+
+def measure(counter, label, func):
+    """Run func RUNS times and print round trips and latency per call"""
+    counter.count = 0
+    started = time.perf_counter()
+    for _ in range(RUNS):
+        func()
+    elapsed_ms = (time.perf_counter() - started) * 1000 / RUNS
+    print(f"{label:<12} {counter.count / RUNS:>8.1f} round trips {elapsed_ms:>10.2f} ms")
+
+def run_benchmark():
+    counter = CommandCounter()
+    client = MongoClient(MONGODB_URI, event_listeners=[counter])
+    db = client[DATABASE_NAME]
+
+    # Use a future date so no slots are filtered out as past
+    date = (datetime.utcnow() + timedelta(days=7)).strftime('%Y-%m-%d')
+    seed(db, date)
+
+    print(f"Availability for {DOCTOR_ID} on {date} (09:00-18:00, 18 slots), {RUNS} runs")
+    measure(counter, 'before', lambda: legacy_get_available_slots_for_date(db, DOCTOR_ID, date))
+    measure(counter, 'after', lambda: DoctorAvailability.get_available_slots_for_date(db, DOCTOR_ID, date))
+
+    client.drop_database(DATABASE_NAME)
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark for completing a consultation
+(PUT /api/appointments/<id>/complete and the overdue payment sweep)
+
+Compares the previous sequence of independent writes (complete the
+appointment, look up the payment, approve it, release it, one insert per
+notification) with Payment.settle_consultation, which runs the same writes
+as one transaction, followed by a single notification insert. Counts MongoDB
+commands and wall time per consultation.
+
+Transactions need a replica set. Start a local single-node one with
+    mongod --replSet rs0 --dbpath /tmp/rs0 --port 27017
+    mongosh --eval "rs.initiate()"
+(override the connection string with MONGODB_URI).
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+from pymongo import MongoClient, monitoring
+from models import Appointment, Payment, Notification, SlotReservation, SlotOccupancy, StatsCounter
+
+MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/?replicaSet=rs0')
+DATABASE_NAME = 'doceasy_benchmark'
+DOCTOR_ID = 'benchmark_doctor'
+RUNS = int(os.getenv('BENCHMARK_RUNS', '50'))
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent to the server"""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        if event.command_name not in ('hello', 'isMaster', 'endSessions'):
+            self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+def seed(db, count):
+    """Create confirmed appointments with completed payments on hold, one per hour"""
+    for collection in (Appointment.collection_name, Payment.collection_name, Notification.collection_name,
+                       SlotReservation.collection_name, SlotOccupancy.collection_name,
+                       StatsCounter.collection_name, StatsCounter.pairs_collection_name):
+        db[collection].drop()
+        # Transactions cannot create collections on servers before 4.4
+        db.create_collection(collection)
+    Appointment.create_indexes(db)
+    SlotReservation.create_indexes(db)
+
+    start = (datetime.utcnow() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    appointments = []
+    for i in range(count):
+        appointment = Appointment.create(db, {
+            'patient_id': f"benchmark_patient_{i}",
+            'doctor_id': DOCTOR_ID,
+            'doctor_name': 'Benchmark',
+            'patient_name': f"Patient {i}",
+            'appointment_date': (start + timedelta(hours=i)).strftime('%Y-%m-%dT%H:%M:%S'),
+            'status': 'confirmed'
+        })
+        Payment.create(db, {
+            'appointment_id': appointment['id'],
+            'doctor_id': DOCTOR_ID,
+            'patient_id': appointment['patient_id'],
+            'amount': 500,
+            'status': 'completed',
+            'payment_status': 'hold'
+        })
+        appointments.append(Appointment.find_by_id(db, appointment['id']))
+    return appointments
+
+def notifications_for(appointment, payment):
+    """The four notifications a completed and released consultation produces"""
+    return [
+        {'title': 'Consultation Completed', 'userId': appointment['patient_id'], 'type': 'appointment'},
+        {'title': 'Payment Auto-Approved', 'userId': 'admin', 'type': 'payment', 'relatedTo': {'type': 'payment', 'id': payment['id']}},
+        {'title': 'Payment Released', 'userId': appointment['doctor_id'], 'type': 'payment', 'relatedTo': {'type': 'payment', 'id': payment['id']}},
+        {'title': 'Payment Processed', 'userId': appointment['patient_id'], 'type': 'payment', 'relatedTo': {'type': 'payment', 'id': payment['id']}}
+    ]
+
+def complete_sequentially(db, appointment):
+    """Previous approach: every step is its own round trip and can fail half-applied"""
+    if not Appointment.update_status(db, appointment['id'], 'completed'):
+        return
+    payment = Payment.find_by_appointment_id(db, appointment['id'])
+    Payment.approve_for_release(db, payment['id'])
+    Payment.release_payment(db, payment['id'])
+    for notification in notifications_for(appointment, payment):
+        Notification.create(db, notification)
+
+def complete_in_transaction(db, appointment):
+    """New approach: one transaction, then one notification insert"""
+    outcome = Payment.settle_consultation(db, appointment)
+    if outcome['payment']:
+        Notification.create_many(db, notifications_for(appointment, outcome['payment']))
+
+def measure(counter, label, func, appointments):
+    """Complete each appointment with func and print commands and latency per consultation"""
+    counter.count = 0
+    latencies = []
+    for appointment in appointments:
+        started = time.perf_counter()
+        func(appointment)
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    print(f"{label:<12} {counter.count / len(appointments):>8.1f} commands "
+          f"{sum(latencies) / len(latencies):>10.2f} ms mean {latencies[len(latencies) // 2]:>10.2f} ms p50 "
+          f"{latencies[int(len(latencies) * 0.95) - 1]:>10.2f} ms p95")
+
+def run_benchmark():
+    counter = CommandCounter()
+    client = MongoClient(MONGODB_URI, event_listeners=[counter])
+    db = client[DATABASE_NAME]
+
+    print(f"Seeding {2 * RUNS} confirmed consultations with held payments...")
+    appointments = seed(db, 2 * RUNS)
+
+    print(f"Completing {RUNS} consultations each way")
+    measure(counter, 'sequential', lambda appointment: complete_sequentially(db, appointment), appointments[:RUNS])
+    measure(counter, 'transaction', lambda appointment: complete_in_transaction(db, appointment), appointments[RUNS:])
+
+    released = db[Payment.collection_name].count_documents({'payment_status': 'released'})
+    print("All payments released" if released == 2 * RUNS else f"Only {released} of {2 * RUNS} payments released!")
+
+    client.drop_database(DATABASE_NAME)
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,76 @@
+"""
+In-process TTL cache for expensive read-only results.
+
+Dashboard statistics are aggregated over whole collections and change
+slowly, so admins loading the dashboard at the same time share one result
+for a few seconds instead of each running the aggregation. The cache is per
+worker process; every gunicorn worker computes its own copy, and drops it
+when the event bus (`events.py`) reports a write that changes the result,
+whichever worker made it.
+"""
+
+import os
+import threading
+import time
+
+class TTLCache:
+    """Thread-safe cache whose entries expire after ttl_seconds"""
+
+    def __init__(self, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    def get_or_compute(self, key, compute):
+        """Return the cached value for key, calling compute() when it is missing or expired
+        
+        Concurrent callers for the same key wait for a single computation.
+        Falsy results (e.g. {} from a failed query) are returned but not cached.
+        """
+        value = self._get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            # Another thread may have filled the entry while we waited
+            value = self._get(key)
+            if value is not None:
+                return value
+
+            value = compute()
+            if value:
+                with self._lock:
+                    self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            return value
+
+    def invalidate(self, key=None):
+        """Drop one entry, or every entry when key is None"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+# Shared by the admin dashboard endpoints
+dashboard_cache = TTLCache(int(os.getenv('DASHBOARD_CACHE_SECONDS', '30')))
+
+def invalidate_dashboard(event):
+    """Drop the dashboard statistics a change makes stale (event bus subscriber)"""
+    if event['collection'] == 'doctors':
+        if event['fields'] is None or 'verificationStatus' in event['fields']:
+            dashboard_cache.invalidate('admin_dashboard_stats')
+    elif event['collection'] == 'payments':
+        dashboard_cache.invalidate('payment_statistics')
+    else:
+        dashboard_cache.invalidate()
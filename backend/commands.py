@@ -0,0 +1,79 @@
+"""
+Flask CLI commands for database maintenance.
+
+Run with the Flask CLI from the backend directory, e.g.
+    flask --app app backfill-appointment-dates --batch-size 500
+"""
+
+import click
+from flask import current_app
+from migrations import backfill_appointment_dates, backfill_slot_reservations, drop_default_availability, backfill_identities
+from models import SlotOccupancy, FreeWindow, StatsCounter
+from indexes import ensure_indexes
+
+def register_commands(app):
+    """Register maintenance commands on the Flask app"""
+
+    @app.cli.command('create-indexes')
+    def create_indexes_command():
+        """Build every index in the index manifest"""
+        db = current_app.config['DATABASE']
+        ensured, failed = ensure_indexes(db)
+        click.echo(f"Ensured {ensured} index groups ({failed} failed)")
+
+    @app.cli.command('backfill-appointment-dates')
+    @click.option('--batch-size', default=500, show_default=True, help='Appointments updated per bulk write')
+    def backfill_appointment_dates_command(batch_size):
+        """Backfill appointment_start/appointment_end on existing appointments"""
+        db = current_app.config['DATABASE']
+        result = backfill_appointment_dates(db, batch_size=batch_size)
+        click.echo(f"Backfilled {result['processed']} appointments ({result['unparseable']} unparseable)")
+
+    @app.cli.command('backfill-slot-reservations')
+    @click.option('--batch-size', default=500, show_default=True, help='Appointments reserved per bulk insert')
+    def backfill_slot_reservations_command(batch_size):
+        """Reserve the slots of existing pending and confirmed appointments"""
+        db = current_app.config['DATABASE']
+        result = backfill_slot_reservations(db, batch_size=batch_size)
+        click.echo(f"Reserved {result['reserved']} slot cells ({result['conflicts']} double-booked cells found)")
+
+    @app.cli.command('rebuild-slot-occupancy')
+    @click.option('--doctor-id', default=None, help='Only rebuild the bitmaps of this doctor')
+    def rebuild_slot_occupancy_command(doctor_id):
+        """Regenerate slot occupancy bitmaps from active appointments"""
+        db = current_app.config['DATABASE']
+        count = SlotOccupancy.rebuild(db, doctor_id=doctor_id)
+        click.echo(f"Rebuilt {count} slot occupancy bitmaps")
+
+    @app.cli.command('refresh-free-windows')
+    @click.option('--doctor-id', default=None, help='Only refresh the windows of this doctor')
+    def refresh_free_windows_command(doctor_id):
+        """Rebuild the free windows used by the next-available search"""
+        db = current_app.config['DATABASE']
+        if doctor_id:
+            count = FreeWindow.refresh_doctor(db, doctor_id)
+        else:
+            count = FreeWindow.refresh_all(db)
+        click.echo(f"Refreshed {count} free windows")
+
+    @app.cli.command('drop-default-availability')
+    def drop_default_availability_command():
+        """Delete availability documents created by reads for doctors without a schedule"""
+        db = current_app.config['DATABASE']
+        result = drop_default_availability(db)
+        click.echo(f"Deleted {result['deleted']} default availability documents")
+
+    @app.cli.command('rebuild-counters')
+    def rebuild_counters_command():
+        """Regenerate the per-doctor and per-patient stats counters"""
+        db = current_app.config['DATABASE']
+        count = StatsCounter.rebuild(db)
+        click.echo(f"Rebuilt {count} counter documents")
+
+    @app.cli.command('backfill-identities')
+    @click.option('--batch-size', default=500, show_default=True, help='Users indexed per bulk insert')
+    def backfill_identities_command(batch_size):
+        """Index the emails of existing admins, doctors and patients"""
+        db = current_app.config['DATABASE']
+        result = backfill_identities(db, batch_size=batch_size)
+        click.echo(f"Indexed {result['indexed']} identities ({result['conflicts']} emails shared by several accounts)")
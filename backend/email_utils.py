@@ -547,4 +547,56 @@ def send_password_reset_confirmation_email(email, user_name=None, user_role='use
         
     except Exception as e:
         logger.error(f"Failed to send password reset confirmation email to {email}: {str(e)}")
-        return False 
\ No newline at end of file
+        return False 
+
+def send_appointment_reminder_email(email, name, with_name, appointment_date, consultation_type='video', minutes=15):
+    """Send a reminder shortly before a confirmed consultation starts"""
+    try:
+        mail = Mail(current_app)
+        
+        subject = f"DocEasy - Your consultation starts in {minutes} minutes"
+        
+        html_body = f"""
+        <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+            <div style="background-color: #1e40af; color: white; padding: 20px; text-align: center;">
+                <h1 style="margin: 0;">DocEasy</h1>
+                <p style="margin: 5px 0;">Appointment Reminder</p>
+            </div>
+            
+            <div style="padding: 30px; background-color: #f5f5f5;">
+                <h2 style="color: #333;">Hello {name}!</h2>
+                <p style="color: #666;">Your {consultation_type} consultation with {with_name} starts in {minutes} minutes.</p>
+                
+                <div style="background-color: white; padding: 15px; border-radius: 8px; border-left: 4px solid #1e40af; margin: 20px 0;">
+                    <p style="color: #333; margin: 0;"><strong>Scheduled for:</strong> {appointment_date}</p>
+                </div>
+                
+                <p style="color: #666;">Open your DocEasy dashboard to join the consultation on time.</p>
+                
+                <hr style="border: none; border-top: 1px solid #ddd; margin: 30px 0;">
+                
+                <p style="color: #999; font-size: 12px; text-align: center;">
+                    This is an automated message from DocEasy. Please do not reply to this email.
+                </p>
+            </div>
+            
+            <div style="background-color: #333; color: white; padding: 20px; text-align: center; font-size: 12px;">
+                <p style="margin: 0;">© 2025 DocEasy. All rights reserved.</p>
+            </div>
+        </div>
+        """
+        
+        msg = Message(
+            subject=subject,
+            recipients=[email],
+            html=html_body,
+            sender=current_app.config.get('MAIL_DEFAULT_SENDER', 'DocEasy <doceasy4@gmail.com>')
+        )
+        
+        mail.send(msg)
+        logger.info(f"Appointment reminder email sent successfully to {email}")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Failed to send appointment reminder email to {email}: {str(e)}")
+        return False
@@ -0,0 +1,275 @@
+"""
+Cross-worker change feed.
+
+Every worker process runs one EventBus thread that follows writes to the
+watched collections and hands each change to the subscribers registered in
+that process (the dashboard cache, Socket.IO rooms). State a worker keeps in
+memory therefore follows writes made by any other worker or job.
+
+On a replica set (or sharded cluster) the feed is a MongoDB change stream:
+every committed write is seen whichever process made it, and writes inside a
+transaction arrive once it commits. Standalone servers have no change
+streams; there writers record their changes in the capped `events`
+collection with `publish` and the bus follows it with a tailable cursor.
+Only writes that go through a `publish` call reach that fallback feed.
+
+Subscribers receive events shaped like
+    {'collection': 'payments', 'operation': 'update', 'id': '<_id>',
+     'document': {...the fields listed in EVENT_FIELDS...},
+     'fields': ['payment_status', ...]}
+where operation is insert, update, replace or delete, document is None for
+deletes and fields names the fields an update changed (None when unknown).
+After a possible gap in the feed (the change stream history was lost, the
+capped collection wrapped or could not be read) they get
+{'collection': None, 'operation': 'resync'} and should drop whatever they
+cached.
+
+Set EVENT_BUS_MODE to change_stream or capped to skip detection, or to off
+to disable the bus.
+"""
+
+import os
+import threading
+import logging
+from datetime import datetime
+from pymongo import CursorType
+from pymongo.errors import PyMongoError, OperationFailure, CollectionInvalid
+
+logger = logging.getLogger(__name__)
+
+# Fields of each watched collection that subscribers get
+EVENT_FIELDS = {
+    'appointments': ('doctor_id', 'patient_id', 'status', 'appointment_date', 'appointment_start'),
+    'payments': ('doctor_id', 'patient_id', 'appointment_id', 'status', 'payment_status', 'amount'),
+    'notifications': ('title', 'message', 'type', 'read', 'userId', 'relatedTo', 'date', 'time', 'created_at'),
+    'doctors': ('verificationStatus', 'specialty'),
+    'doctor_availability': ('doctor_id',),
+}
+
+EVENTS_COLLECTION = 'events'
+EVENTS_CAPPED_BYTES = int(os.getenv('EVENT_BUS_CAPPED_MB', '16')) * 1024 * 1024
+RETRY_SECONDS = 2
+AWAIT_MS = 1000
+
+# Server error code for a resume token older than the oplog
+CHANGE_STREAM_HISTORY_LOST = 286
+
+def trim_document(collection, document):
+    """Keep only the fields subscribers of collection need"""
+    if document is None:
+        return None
+    return {field: document[field] for field in EVENT_FIELDS.get(collection, ()) if field in document}
+
+def change_to_event(change):
+    """Convert a change stream document into a bus event"""
+    collection = change['ns']['coll']
+    return {
+        'collection': collection,
+        'operation': change['operationType'],
+        'id': str(change['documentKey']['_id']),
+        'document': trim_document(collection, change.get('fullDocument')),
+        'fields': change.get('changedFields') if change['operationType'] == 'update' else None
+    }
+
+def detect_mode(db):
+    """Pick the feed the deployment supports: change_stream or capped"""
+    mode = os.getenv('EVENT_BUS_MODE', 'auto')
+    if mode != 'auto':
+        return mode
+    hello = db.client.admin.command('hello')
+    if hello.get('setName') or hello.get('msg') == 'isdbgrid':
+        return 'change_stream'
+    return 'capped'
+
+def ensure_events_collection(db):
+    """Create the capped collection behind the fallback feed"""
+    try:
+        db.create_collection(EVENTS_COLLECTION, capped=True, size=EVENTS_CAPPED_BYTES)
+    except CollectionInvalid:
+        pass
+
+class EventBus:
+    """Follows the change feed in a background thread and fans events out to local subscribers"""
+
+    def __init__(self, collections=tuple(EVENT_FIELDS)):
+        self.collections = tuple(collections)
+        self.mode = None
+        self._db = None
+        self._subscribers = []
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        # Set while the feed is open; writes made before that may be missed
+        self.following = threading.Event()
+        self._resume_token = None
+        self._last_event_id = None
+
+    def subscribe(self, collections, handler):
+        """Call handler(event) for changes to the given collections (and for resyncs)"""
+        self._subscribers.append((frozenset(collections), handler))
+
+    def running(self):
+        """Whether this process follows the feed"""
+        return self._pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+
+    def start(self, db):
+        """Start following the feed in this process; a no-op once started
+
+        Safe to call on every request: a process forked after the bus was
+        started (gunicorn --preload) starts its own thread.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopped.clear()
+            self.following.clear()
+            try:
+                self.mode = detect_mode(db)
+            except PyMongoError as e:
+                logger.error(f"Event bus not started, cannot reach MongoDB: {e}")
+                self._pid = None
+                return
+            if self.mode == 'off':
+                return
+            if self.mode == 'capped':
+                ensure_events_collection(db)
+            self._db = db
+            self._resume_token = None
+            self._last_event_id = None
+            self._thread = threading.Thread(target=self._run, name='event-bus', daemon=True)
+            self._thread.start()
+            logger.info(f"Event bus following {', '.join(self.collections)} ({self.mode}) in process {self._pid}")
+
+    def stop(self, timeout=None):
+        """Stop following the feed (tests and shutdown)"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+        self._pid = None
+
+    def publish(self, collection, operation, document_id, document=None, fields=None):
+        """Announce a change made by this process
+
+        With a change stream the write is already on the feed, so this does
+        nothing. With the capped fallback the change is recorded for every
+        worker to pick up. In a process that does not follow the feed (CLI
+        commands, tests) the change goes straight to local subscribers.
+        Never raises.
+        """
+        event = {
+            'collection': collection,
+            'operation': operation,
+            'id': str(document_id),
+            'document': trim_document(collection, document),
+            'fields': list(fields) if fields is not None else None
+        }
+        if not self.running():
+            self.dispatch(event)
+        elif self.mode == 'capped':
+            try:
+                self._db[EVENTS_COLLECTION].insert_one(dict(event, created_at=datetime.utcnow()))
+            except PyMongoError as e:
+                logger.warning(f"Failed to publish {operation} on {collection}: {e}")
+
+    def dispatch(self, event):
+        """Hand an event to every matching subscriber; a failing subscriber does not stop the others"""
+        for collections, handler in self._subscribers:
+            if event['collection'] is None or event['collection'] in collections:
+                try:
+                    handler(event)
+                except Exception as e:
+                    logger.warning(f"Event subscriber {getattr(handler, '__name__', handler)} failed: {e}")
+
+    def _run(self):
+        follow = self._follow_change_stream if self.mode == 'change_stream' else self._follow_capped
+        while not self._stopped.is_set():
+            try:
+                follow()
+            except PyMongoError as e:
+                if self._stopped.is_set():
+                    break
+                logger.warning(f"Event bus interrupted, retrying in {RETRY_SECONDS}s: {e}")
+                if self.mode == 'capped':
+                    # Resuming by _id can miss events written meanwhile by other processes
+                    self.resync()
+                self._stopped.wait(RETRY_SECONDS)
+
+    def resync(self):
+        """Tell every subscriber to drop what it derived from earlier events"""
+        self.dispatch({'collection': None, 'operation': 'resync', 'id': None, 'document': None, 'fields': None})
+
+    def _follow_change_stream(self):
+        """Follow the change stream, resuming after the last event seen"""
+        pipeline = [
+            {'$match': {
+                'ns.coll': {'$in': list(self.collections)},
+                'operationType': {'$in': ['insert', 'update', 'replace', 'delete']}
+            }},
+            # Name the updated fields without shipping their values
+            {'$addFields': {'changedFields': {'$map': {
+                'input': {'$objectToArray': {'$ifNull': ['$updateDescription.updatedFields', {}]}},
+                'in': '$$this.k'
+            }}}},
+            # Ship only the fields subscribers use, not whole doctor profiles
+            {'$project': self._change_projection()}
+        ]
+        try:
+            stream = self._db.watch(
+                pipeline, full_document='updateLookup', resume_after=self._resume_token, max_await_time_ms=AWAIT_MS
+            )
+        except OperationFailure as e:
+            if e.code != CHANGE_STREAM_HISTORY_LOST:
+                raise
+            logger.warning("Event bus fell behind the oplog; resyncing subscribers")
+            self._resume_token = None
+            self.resync()
+            return
+
+        with stream:
+            self.following.set()
+            while not self._stopped.is_set() and stream.alive:
+                change = stream.try_next()
+                self._resume_token = stream.resume_token
+                if change is not None:
+                    self.dispatch(change_to_event(change))
+
+    def _change_projection(self):
+        projection = {'operationType': 1, 'ns': 1, 'documentKey': 1, 'changedFields': 1}
+        for collection in self.collections:
+            for field in EVENT_FIELDS.get(collection, ()):
+                projection[f"fullDocument.{field}"] = 1
+        return projection
+
+    def _follow_capped(self):
+        """Tail the capped events collection from the last event seen"""
+        events = self._db[EVENTS_COLLECTION]
+        if self._last_event_id is None:
+            latest = events.find_one({}, {'_id': 1}, sort=[('$natural', -1)])
+            self._last_event_id = latest['_id'] if latest else None
+        else:
+            oldest = events.find_one({}, {'_id': 1}, sort=[('$natural', 1)])
+            if oldest and oldest['_id'] > self._last_event_id:
+                logger.warning("Event bus fell behind the capped events collection; resyncing subscribers")
+                self.resync()
+        query = {'_id': {'$gt': self._last_event_id}} if self._last_event_id else {}
+
+        cursor = events.find(query, cursor_type=CursorType.TAILABLE_AWAIT).max_await_time_ms(AWAIT_MS)
+        self.following.set()
+        try:
+            while cursor.alive and not self._stopped.is_set():
+                for record in cursor:
+                    self._last_event_id = record['_id']
+                    if record.get('collection') in self.collections:
+                        self.dispatch({key: record.get(key) for key in ('collection', 'operation', 'id', 'document', 'fields')})
+        finally:
+            cursor.close()
+        # A dead cursor (empty collection, or it wrapped past us): reopen shortly
+        self._stopped.wait(RETRY_SECONDS)
+
+# One bus per process; subscribers register at startup
+event_bus = EventBus()
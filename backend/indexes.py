@@ -0,0 +1,144 @@
+"""
+Index manifest for the DocEasy database.
+
+Every hot query in models.py and routes.py needs an index behind it. The
+manifest lists them per collection; `ensure_indexes` builds them at startup
+and from the `create-indexes` CLI command. `create_index` is a no-op for an
+index that already exists, so running it repeatedly is safe.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import PyMongoError
+from models import (
+    Admin, Doctor, Patient, Complaint, Notification, Appointment, DoctorAvailability,
+    SlotReservation, SlotOccupancy, FreeWindow, Payment, Identity, User
+)
+
+logger = logging.getLogger(__name__)
+
+# (collection, keys, options) for collections without their own create_indexes
+INDEX_MANIFEST = [
+    # Login, registration and password reset look users up by email
+    (Admin.collection_name, [('email', ASCENDING)], {}),
+    (Doctor.collection_name, [('email', ASCENDING)], {}),
+    (Patient.collection_name, [('email', ASCENDING)], {}),
+    # Auth resolves an email to its account in one lookup; an email belongs to one account
+    (Identity.collection_name, [('email', ASCENDING)], {'unique': True}),
+
+    # Approved doctor listing, optionally narrowed to a specialty
+    (Doctor.collection_name, [('verificationStatus', ASCENDING), ('specialty', ASCENDING)], {}),
+
+    # Paginated lists walk (created_at, _id) newest first
+    (Admin.collection_name, [('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+    (Doctor.collection_name, [('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+    (Patient.collection_name, [('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+
+    # Notification feeds are read newest first; mark-all-read filters on read
+    (Notification.collection_name, [('userId', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+    (Notification.collection_name, [('userId', ASCENDING), ('read', ASCENDING)], {}),
+
+    (Complaint.collection_name, [('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+
+    (DoctorAvailability.collection_name, [('doctor_id', ASCENDING)], {}),
+
+    # Payment histories are read newest first per doctor or patient
+    (Payment.collection_name, [('appointment_id', ASCENDING)], {}),
+    (Payment.collection_name, [('doctor_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+    (Payment.collection_name, [('patient_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+    (Payment.collection_name, [('status', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+    (Payment.collection_name, [('created_at', DESCENDING), ('_id', DESCENDING)], {}),
+]
+
+# Model calls behind the API. test_indexes.py records every query each call
+# sends and fails if one is not served by an index, so add a call here
+# whenever a model gains a query, next to the index it needs.
+SAMPLE_ID = '5f0000000000000000000001'
+SAMPLE_SLOT = datetime(2030, 1, 1, 9, 0)
+
+HOT_QUERIES = [
+    ('admin by email', lambda db: Admin.find_by_email(db, 'admin@example.com')),
+    ('doctor by email', lambda db: Doctor.find_by_email(db, 'doctor@example.com')),
+    ('patient by email', lambda db: Patient.find_by_email(db, 'patient@example.com')),
+    ('identity by email', lambda db: Identity.find_by_email(db, 'patient@example.com')),
+    ('doctor password reset', lambda db: Doctor.verify_reset_token(db, 'doctor@example.com', 'token')),
+    ('patient password reset', lambda db: Patient.verify_reset_token(db, 'patient@example.com', 'token')),
+    ('approved doctors by specialty',
+     lambda db: Doctor.find_all(db, {'verificationStatus': 'approved', 'specialty': 'Cardiology'})),
+    ('doctors page', lambda db: Doctor.find_page(db)),
+    ('users page', lambda db: User.find_users_page(db)),
+    ('complaints page', lambda db: Complaint.find_page(db)),
+    ('complaints', lambda db: Complaint.find_all(db)),
+    ('admin notifications', lambda db: Notification.find_admin_notifications(db)),
+    ('admin notifications page', lambda db: Notification.find_page(db, {'userId': 'admin'})),
+    ('mark notifications read', lambda db: Notification.mark_all_as_read(db)),
+    ('doctor availability', lambda db: DoctorAvailability.find_by_doctor_id(db, SAMPLE_ID)),
+    ('slots for a week',
+     lambda db: DoctorAvailability.get_available_slots_for_range(db, SAMPLE_ID, '2030-01-01', '2030-01-07')),
+    ('appointments page', lambda db: Appointment.find_page(db)),
+    ('consultation history', lambda db: Appointment.find_consultation_history(db)),
+    ('doctor appointments', lambda db: Appointment.find_by_doctor_id(db, SAMPLE_ID)),
+    ('doctor pending appointments', lambda db: Appointment.find_pending_by_doctor_id(db, SAMPLE_ID)),
+    ('doctor appointments today', lambda db: Appointment.find_today_by_doctor_id(db, SAMPLE_ID)),
+    ('doctor patients', lambda db: Appointment.get_doctor_patients(db, SAMPLE_ID)),
+    ('patient appointments', lambda db: Appointment.find_by_patient_id(db, SAMPLE_ID)),
+    ('overdue appointments', lambda db: Appointment.find_overdue_appointments(db, datetime.utcnow())),
+    ('reminders due',
+     lambda db: Appointment.find_reminders_due(db, datetime.utcnow(), datetime.utcnow() + timedelta(hours=24))),
+    ('payments page', lambda db: Payment.find_page(db)),
+    ('payments by status', lambda db: Payment.find_page(db, {'status': 'completed'})),
+    ('payment by appointment', lambda db: Payment.find_by_appointment_id(db, SAMPLE_ID)),
+    ('doctor payments', lambda db: Payment.find_by_doctor_id(db, SAMPLE_ID)),
+    ('doctor payment history', lambda db: Payment.find_doctor_history(db, SAMPLE_ID)),
+    ('patient payments', lambda db: Payment.find_by_patient_id(db, SAMPLE_ID)),
+    ('slot hold', lambda db: SlotReservation.hold(db, SAMPLE_ID, SAMPLE_SLOT, SAMPLE_SLOT + timedelta(minutes=30), SAMPLE_ID)),
+    ('slot free check', lambda db: SlotOccupancy.is_free(db, SAMPLE_ID, SAMPLE_SLOT, SAMPLE_SLOT + timedelta(minutes=30))),
+    ('next available by specialty', lambda db: FreeWindow.find_earliest(db, datetime.utcnow(), 'Cardiology')),
+    ('free window refresh', lambda db: FreeWindow.refresh_doctor(db, SAMPLE_ID)),
+    ('dirty free window days', lambda db: FreeWindow.refresh_dirty(db)),
+]
+
+# (description, collection, filter, sort) for the queries routes.py issues itself
+ROUTE_QUERIES = [
+    ('doctor appointments for a day', Appointment.collection_name,
+     {'doctor_id': SAMPLE_ID, 'appointment_start': {'$gte': SAMPLE_SLOT, '$lt': SAMPLE_SLOT + timedelta(days=1)}}, None),
+    ('patient upcoming appointments', Appointment.collection_name,
+     {'patient_id': SAMPLE_ID, 'status': {'$in': ['pending', 'confirmed']}}, [('appointment_start', 1)]),
+    ('patient completed appointments', Appointment.collection_name,
+     {'patient_id': SAMPLE_ID, 'status': 'completed'}, [('appointment_start', -1)]),
+    ('consultations starting soon', Appointment.collection_name,
+     {'doctor_id': SAMPLE_ID, 'status': 'confirmed',
+      'appointment_start': {'$gt': SAMPLE_SLOT, '$lte': SAMPLE_SLOT + timedelta(minutes=15)}}, None),
+]
+
+# Models that own their indexes (unique and TTL indexes the booking flow relies on)
+MODELS_WITH_INDEXES = [Appointment, SlotReservation, SlotOccupancy, FreeWindow]
+
+def ensure_indexes(db):
+    """Build every index in the manifest; returns (ensured, failed) counts
+    
+    A failing index (e.g. a conflicting spec left over from a manual change)
+    is logged and skipped so it does not stop the application from starting.
+    """
+    ensured = 0
+    failed = 0
+
+    for model in MODELS_WITH_INDEXES:
+        try:
+            model.create_indexes(db)
+            ensured += 1
+        except PyMongoError as e:
+            failed += 1
+            logger.error(f"Failed to create indexes for {model.collection_name}: {e}")
+
+    for collection_name, keys, options in INDEX_MANIFEST:
+        try:
+            db[collection_name].create_index(keys, **options)
+            ensured += 1
+        except PyMongoError as e:
+            failed += 1
+            logger.error(f"Failed to create index {keys} on {collection_name}: {e}")
+
+    logger.info(f"Ensured {ensured} index groups ({failed} failed)")
+    return ensured, failed
@@ -0,0 +1,248 @@
+"""
+One-off data migrations for the DocEasy database.
+
+Each migration records its progress in the `migrations` collection so an
+interrupted run picks up where it stopped instead of starting over.
+"""
+
+from datetime import datetime
+import logging
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from models import Appointment, DoctorAvailability, SlotReservation, Identity, StatsCounter
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_COLLECTION = 'migrations'
+
+def get_checkpoint(db, migration_id):
+    """Get the saved progress document for a migration"""
+    return db[MIGRATIONS_COLLECTION].find_one({'_id': migration_id}) or {'_id': migration_id}
+
+def save_checkpoint(db, migration_id, data):
+    """Save progress for a migration"""
+    data['updated_at'] = datetime.utcnow()
+    db[MIGRATIONS_COLLECTION].update_one(
+        {'_id': migration_id},
+        {'$set': data, '$setOnInsert': {'started_at': datetime.utcnow()}},
+        upsert=True
+    )
+
+def backfill_appointment_dates(db, batch_size=500):
+    """Set appointment_start/appointment_end on appointments created before they existed"""
+    migration_id = 'appointment_canonical_dates'
+    checkpoint = get_checkpoint(db, migration_id)
+    last_id = checkpoint.get('last_id')
+    processed = checkpoint.get('processed', 0)
+    unparseable = checkpoint.get('unparseable', 0)
+
+    collection = db[Appointment.collection_name]
+
+    while True:
+        query = {'appointment_start': {'$exists': False}}
+        if last_id is not None:
+            query['_id'] = {'$gt': last_id}
+
+        batch = list(collection.find(query, {'appointment_date': 1}).sort('_id', 1).limit(batch_size))
+        if not batch:
+            break
+
+        updates = []
+        for appointment in batch:
+            appointment_start, appointment_end = Appointment.canonical_times(appointment.get('appointment_date'))
+            if not appointment_start:
+                unparseable += 1
+                logger.warning(f"Unparseable appointment_date on {appointment['_id']}: {appointment.get('appointment_date')!r}")
+            updates.append(UpdateOne(
+                {'_id': appointment['_id']},
+                {'$set': {'appointment_start': appointment_start, 'appointment_end': appointment_end}}
+            ))
+
+        collection.bulk_write(updates, ordered=False)
+
+        last_id = batch[-1]['_id']
+        processed += len(batch)
+        save_checkpoint(db, migration_id, {
+            'last_id': last_id,
+            'processed': processed,
+            'unparseable': unparseable
+        })
+        logger.info(f"Backfilled {processed} appointments (last _id {last_id})")
+
+    save_checkpoint(db, migration_id, {'completed_at': datetime.utcnow()})
+    return {'processed': processed, 'unparseable': unparseable}
+
+def backfill_slot_reservations(db, batch_size=500):
+    """Reserve the 15-minute cells of active appointments booked before reservations existed"""
+    migration_id = 'slot_reservation_cells'
+    checkpoint = get_checkpoint(db, migration_id)
+    last_id = checkpoint.get('last_id')
+    reserved = checkpoint.get('reserved', 0)
+    conflicts = checkpoint.get('conflicts', 0)
+
+    collection = db[Appointment.collection_name]
+
+    while True:
+        query = {
+            'status': {'$in': DoctorAvailability.active_statuses},
+            'appointment_start': {'$ne': None}
+        }
+        if last_id is not None:
+            query['_id'] = {'$gt': last_id}
+
+        batch = list(collection.find(
+            query, {'doctor_id': 1, 'appointment_start': 1, 'appointment_end': 1}
+        ).sort('_id', 1).limit(batch_size))
+        if not batch:
+            break
+
+        reservations = []
+        for appointment in batch:
+            reservations.extend(SlotReservation.cell_documents(
+                appointment['doctor_id'], appointment['appointment_start'],
+                appointment['appointment_end'], appointment['_id']
+            ))
+
+        # Already-reserved slots (from a previous run or a double booking made
+        # before reservations existed) fail on the unique index and are skipped
+        try:
+            result = db[SlotReservation.collection_name].insert_many(reservations, ordered=False)
+            reserved += len(result.inserted_ids)
+        except BulkWriteError as e:
+            duplicates = [error for error in e.details['writeErrors'] if error['code'] == 11000]
+            if len(duplicates) != len(e.details['writeErrors']):
+                raise
+            reserved += e.details['nInserted']
+            for error in duplicates:
+                existing = db[SlotReservation.collection_name].find_one({
+                    'doctor_id': error['op']['doctor_id'],
+                    'slot_start': error['op']['slot_start']
+                })
+                if existing and existing['appointment_id'] != error['op']['appointment_id']:
+                    conflicts += 1
+                    logger.warning(
+                        f"Appointment {error['op']['appointment_id']} double-books the slot held by "
+                        f"{existing['appointment_id']} ({error['op']['slot_start']})"
+                    )
+
+        last_id = batch[-1]['_id']
+        save_checkpoint(db, migration_id, {
+            'last_id': last_id,
+            'reserved': reserved,
+            'conflicts': conflicts
+        })
+        logger.info(f"Reserved {reserved} slot cells (last _id {last_id})")
+
+    save_checkpoint(db, migration_id, {'completed_at': datetime.utcnow()})
+    return {'reserved': reserved, 'conflicts': conflicts}
+
+def drop_default_availability(db):
+    """Delete the default availability documents reads used to create
+
+    Reads used to upsert an all-unavailable schedule for doctors without one.
+    Reads now return that default in memory, so these documents carry no
+    information and can be removed. Only untouched generated documents are
+    matched; a schedule a doctor saved stays even if no day is available.
+    """
+    migration_id = 'drop_default_availability'
+    result = db[DoctorAvailability.collection_name].delete_many(DoctorAvailability.default_availability_query())
+    logger.info(f"Deleted {result.deleted_count} default availability documents")
+
+    save_checkpoint(db, migration_id, {'deleted': result.deleted_count, 'completed_at': datetime.utcnow()})
+    return {'deleted': result.deleted_count}
+
+def seed_counters(db):
+    """Build the stats counters once on a database that predates them
+
+    Counters are only updated incrementally, so on existing data they start
+    empty. The first process to start claims this migration and rebuilds
+    them from appointments and payments; every later start does nothing.
+    Returns the number of counter documents written, or None if the
+    counters were already seeded.
+    """
+    migration_id = 'seed_counters'
+    try:
+        db[MIGRATIONS_COLLECTION].insert_one({'_id': migration_id, 'started_at': datetime.utcnow()})
+    except DuplicateKeyError:
+        return None
+
+    try:
+        written = StatsCounter.rebuild(db)
+    except Exception:
+        # Let the next start try again
+        db[MIGRATIONS_COLLECTION].delete_one({'_id': migration_id})
+        raise
+    logger.info(f"Seeded {written} counter documents")
+
+    save_checkpoint(db, migration_id, {'written': written, 'completed_at': datetime.utcnow()})
+    return written
+
+def backfill_identities(db, batch_size=500):
+    """Index the emails of users created before the identities collection existed
+
+    Roles are indexed in the order login used to try them, so when several
+    accounts share an email the one login resolved keeps it; the others are
+    logged as conflicts.
+    """
+    migration_id = 'user_identities'
+    checkpoint = get_checkpoint(db, migration_id)
+    indexed = checkpoint.get('indexed', 0)
+    conflicts = checkpoint.get('conflicts', 0)
+    done_roles = checkpoint.get('done_roles', [])
+
+    for role in ('admin', 'doctor', 'patient'):
+        if role in done_roles:
+            continue
+        collection_name = Identity.home_model(role).collection_name
+        last_id = checkpoint.get('last_id') if checkpoint.get('role') == role else None
+
+        while True:
+            query = {'email': {'$type': 'string', '$ne': ''}}
+            if last_id is not None:
+                query['_id'] = {'$gt': last_id}
+
+            batch = list(db[collection_name].find(query, {'email': 1}).sort('_id', 1).limit(batch_size))
+            if not batch:
+                break
+
+            identities = [{
+                '_id': user['_id'],
+                'email': user['email'],
+                'role': role,
+                'collection': collection_name,
+                'created_at': datetime.utcnow()
+            } for user in batch]
+
+            # Users indexed by a previous run, and emails another account
+            # already owns, fail on the unique indexes and are skipped
+            try:
+                result = db[Identity.collection_name].insert_many(identities, ordered=False)
+                indexed += len(result.inserted_ids)
+            except BulkWriteError as e:
+                duplicates = [error for error in e.details['writeErrors'] if error['code'] == 11000]
+                if len(duplicates) != len(e.details['writeErrors']):
+                    raise
+                indexed += e.details['nInserted']
+                for error in duplicates:
+                    owner = Identity.find_by_email(db, error['op']['email'])
+                    if owner and owner['_id'] != error['op']['_id']:
+                        conflicts += 1
+                        logger.warning(
+                            f"Email {error['op']['email']} of {role} {error['op']['_id']} is already "
+                            f"registered to {owner['role']} {owner['_id']}"
+                        )
+
+            last_id = batch[-1]['_id']
+            save_checkpoint(db, migration_id, {
+                'role': role,
+                'last_id': last_id,
+                'indexed': indexed,
+                'conflicts': conflicts
+            })
+            logger.info(f"Indexed {indexed} identities (last {role} _id {last_id})")
+
+        done_roles.append(role)
+        save_checkpoint(db, migration_id, {'done_roles': done_roles})
+
+    save_checkpoint(db, migration_id, {'completed_at': datetime.utcnow()})
+    return {'indexed': indexed, 'conflicts': conflicts}
@@ -1,15 +1,152 @@
-from datetime import datetime, timedelta
-from bson import ObjectId
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId, json_util
+from bson.int64 import Int64
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
-from flask import current_app
+from flask import current_app, g, has_request_context
 import random
 import string
+from pymongo import ReturnDocument, UpdateOne, ReplaceOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.write_concern import WriteConcern
+from pymongo.read_concern import ReadConcern
 import os
+import re
+import base64
+import realtime
+from events import event_bus
+
+class SlotAlreadyBookedError(Exception):
+    """Raised when an appointment slot has already been reserved by another booking"""
+    pass
+
+class EmailAlreadyRegisteredError(Exception):
+    """Raised when an email already belongs to an admin, doctor or patient"""
+    pass
+
+# Credentials and one-time codes never leave the database in list views
+SECRET_FIELDS = {'password': 0, 'otp': 0, 'otpExpiresAt': 0, 'reset_token': 0, 'reset_token_expires': 0}
+
+# Durability per kind of operation, as (write concern, read concern); see
+# BaseModel.collection. Operations not bound to a profile use the client default.
+CONCERN_PROFILES = {
+    # Best-effort writes (notifications): no acknowledgement round trip
+    'fire_and_forget': (WriteConcern(w=0), ReadConcern('local')),
+    # Derived or easily repaired data (counters, read flags): primary acknowledgement
+    'standard': (WriteConcern(w=1), ReadConcern('local')),
+    # Money and bookings: majority-acknowledged and journaled, read majority-committed
+    'financial': (WriteConcern(w='majority', j=True, wtimeout=10000), ReadConcern('majority'))
+}
 
 class BaseModel:
     """Base model with common methods for all models"""
     
+    # Named projections applied at the query; None fetches the whole document
+    views = {'full': None}
+    
+    @classmethod
+    def projection(cls, view='full'):
+        """Get the MongoDB projection for a named view of the model"""
+        if view not in cls.views:
+            raise ValueError(f"Unknown {cls.__name__} view: {view}")
+        return cls.views[view]
+    
+    @classmethod
+    def collection(cls, db, profile):
+        """Get the model's collection with the concerns of a CONCERN_PROFILES profile"""
+        write_concern, read_concern = CONCERN_PROFILES[profile]
+        return db[cls.collection_name].with_options(write_concern=write_concern, read_concern=read_concern)
+    
+    @staticmethod
+    def run_transaction(db, callback):
+        """Run callback(session) as one multi-document transaction and return its result
+        
+        with_transaction retries the whole callback on transient errors (e.g.
+        write conflicts, primary elections) and retries the commit when its
+        outcome is unknown, so callback must only touch the database through
+        the session and return what it did rather than act on it. Standalone
+        servers (local development) have no transactions; there the callback
+        runs with session=None, and the model methods it calls push their
+        own real-time updates, so callers must not repeat them after it
+        returns.
+        """
+        write_concern, read_concern = CONCERN_PROFILES['financial']
+        with db.client.start_session() as session:
+            try:
+                return session.with_transaction(
+                    callback, read_concern=ReadConcern('snapshot'), write_concern=write_concern
+                )
+            except OperationFailure as e:
+                # IllegalOperation: transactions need a replica set or mongos
+                if e.code != 20 or session.in_transaction:
+                    raise
+                print(f"Transactions unavailable, running without one: {e}")
+        return callback(None)
+    
+    # Keyset pagination: pages are ordered newest first by (sort field, _id)
+    default_page_size = 100
+    max_page_size = 500
+    
+    @staticmethod
+    def page_size(limit):
+        """Clamp a requested page size to the allowed range"""
+        return min(max(limit or BaseModel.default_page_size, 1), BaseModel.max_page_size)
+    
+    @staticmethod
+    def encode_cursor(document, sort_field):
+        """Encode the position of the last document on a page as an opaque cursor"""
+        position = json_util.dumps([document.get(sort_field), document['_id']])
+        return base64.urlsafe_b64encode(position.encode()).decode()
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        """Decode a cursor from encode_cursor into (sort value, _id)
+        
+        Raises ValueError if the cursor was not produced by encode_cursor.
+        """
+        try:
+            value, last_id = json_util.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except Exception:
+            raise ValueError('Invalid cursor')
+        if not isinstance(last_id, (ObjectId, str)):
+            raise ValueError('Invalid cursor')
+        return value, last_id
+    
+    @staticmethod
+    def keyset_query(query, sort_field, after=None):
+        """Restrict a query to the documents that follow a cursor"""
+        if not after:
+            return query
+        value, last_id = BaseModel.decode_cursor(after)
+        if value is None:
+            # Documents without the sort field sort last, by _id alone
+            position = {sort_field: None, '_id': {'$lt': last_id}}
+        else:
+            position = {'$or': [
+                {sort_field: {'$lt': value}},
+                {sort_field: value, '_id': {'$lt': last_id}},
+                {sort_field: None}
+            ]}
+        return {'$and': [query, position]} if query else position
+    
+    @classmethod
+    def find_page(cls, db, query=None, limit=None, after=None, sort_field='created_at', view='full'):
+        """Find one page of documents, newest first
+        
+        Returns (documents, next_cursor); next_cursor is None on the last page.
+        Raises ValueError for a malformed after cursor.
+        """
+        limit = BaseModel.page_size(limit)
+        documents = list(db[cls.collection_name].find(
+            BaseModel.keyset_query(query or {}, sort_field, after), cls.projection(view)
+        ).sort([(sort_field, -1), ('_id', -1)]).limit(limit + 1))
+        
+        next_cursor = None
+        if len(documents) > limit:
+            documents = documents[:limit]
+            next_cursor = BaseModel.encode_cursor(documents[-1], sort_field)
+        return cls.serialize_list(documents), next_cursor
+    
     @staticmethod
     def serialize_id(document):
         """Convert ObjectId to string for JSON serialization"""
@@ -26,11 +163,16 @@ class BaseModel:
 class Admin(BaseModel):
     """Admin model for authentication and admin users"""
     collection_name = 'admins'
+    views = {
+        'dashboard_row': SECRET_FIELDS,
+        'full': None
+    }
     
     @staticmethod
     def create(db, email, password, name=None):
         """Create a new admin user"""
         admin = {
+            '_id': ObjectId(),
             'email': email,
             'password': generate_password_hash(password),
             'name': name or email.split('@')[0],
@@ -39,8 +181,12 @@ class Admin(BaseModel):
             'updated_at': datetime.utcnow(),
             'is_active': True
         }
-        result = db[Admin.collection_name].insert_one(admin)
-        admin['_id'] = result.inserted_id
+        Identity.register(db, admin['_id'], email, 'admin')
+        try:
+            db[Admin.collection_name].insert_one(admin)
+        except Exception:
+            Identity.remove(db, admin['_id'])
+            raise
         return Admin.serialize_id(admin)
     
     @staticmethod
@@ -126,10 +272,62 @@ class Admin(BaseModel):
         )
         
         return result.modified_count > 0
+    
+    @staticmethod
+    def get_dashboard_stats(db):
+        """Get the doctor, patient and complaint counts for the admin dashboard
+        
+        One pipeline: a $facet over doctors, with patients and complaints
+        joined in through $unionWith, so each collection is read once.
+        """
+        month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        
+        def count(match=None):
+            return ([{'$match': match}] if match else []) + [{'$count': 'count'}]
+        
+        pipeline = [
+            {'$project': {'verificationStatus': 1, 'created_at': 1}},
+            {'$facet': {
+                'totalDoctors': count(),
+                'pendingVerifications': count({'verificationStatus': 'admin_pending'}),
+                'newDoctorsThisMonth': count({'created_at': {'$gte': month_start}})
+            }},
+            {'$unionWith': {'coll': Patient.collection_name, 'pipeline': [
+                {'$project': {'created_at': 1}},
+                {'$facet': {
+                    'totalPatients': count(),
+                    'newPatientsThisMonth': count({'created_at': {'$gte': month_start}})
+                }}
+            ]}},
+            {'$unionWith': {'coll': Complaint.collection_name, 'pipeline': [
+                {'$project': {'status': 1, 'severity': 1}},
+                {'$facet': {
+                    'totalComplaints': count(),
+                    'newComplaints': count({'status': 'new'}),
+                    'highPriorityComplaints': count({'severity': 'high', 'status': {'$ne': 'resolved'}})
+                }}
+            ]}}
+        ]
+        
+        stats = {}
+        for facets in db[Doctor.collection_name].aggregate(pipeline):
+            for name, result in facets.items():
+                stats[name] = result[0]['count'] if result else 0
+        return stats
 
 class Doctor(BaseModel):
     """Doctor model"""
     collection_name = 'doctors'
+    views = {
+        # Fields the patient-facing doctor list and booking pages render
+        'public_card': {
+            'name': 1, 'first_name': 1, 'last_name': 1, 'specialty': 1, 'experience_years': 1,
+            'consultationFee': 1, 'bio': 1, 'verificationStatus': 1, 'profile_picture': 1,
+            'qualifications': 1, 'languages': 1, 'rating': 1, 'reviewCount': 1
+        },
+        'dashboard_row': SECRET_FIELDS,
+        'full': None
+    }
     
     @staticmethod
     def generate_otp():
@@ -140,6 +338,7 @@ class Doctor(BaseModel):
     def create_registration(db, data):
         """Create a new doctor registration with email verification"""
         doctor = {
+            '_id': ObjectId(),
             'user': data.get('email'),  # Use email as unique user identifier
             'email': data.get('email'),
             'password': generate_password_hash(data.get('password')),
@@ -154,8 +353,13 @@ class Doctor(BaseModel):
             'updated_at': datetime.utcnow(),
             'is_active': False
         }
-        result = db[Doctor.collection_name].insert_one(doctor)
-        doctor['_id'] = result.inserted_id
+        Identity.register(db, doctor['_id'], doctor['email'], 'doctor')
+        try:
+            db[Doctor.collection_name].insert_one(doctor)
+        except Exception:
+            Identity.remove(db, doctor['_id'])
+            raise
+        event_bus.publish(Doctor.collection_name, 'insert', doctor['_id'], doctor)
         return Doctor.serialize_id(doctor)
     
     @staticmethod
@@ -183,6 +387,7 @@ class Doctor(BaseModel):
         )
         
         if result.modified_count > 0:
+            event_bus.publish(Doctor.collection_name, 'update', doctor_id, profile_update, fields=profile_update)
             return Doctor.find_by_id(db, doctor_id)
         return None
     
@@ -321,6 +526,7 @@ class Doctor(BaseModel):
     def create(db, data):
         """Create a new doctor (legacy method for backward compatibility)"""
         doctor = {
+            '_id': ObjectId(),
             'name': data.get('name'),
             'email': data.get('email'),
             'phone': data.get('phone'),
@@ -336,15 +542,20 @@ class Doctor(BaseModel):
             'updated_at': datetime.utcnow(),
             'is_active': True
         }
-        result = db[Doctor.collection_name].insert_one(doctor)
-        doctor['_id'] = result.inserted_id
+        Identity.register(db, doctor['_id'], doctor['email'], 'doctor')
+        try:
+            db[Doctor.collection_name].insert_one(doctor)
+        except Exception:
+            Identity.remove(db, doctor['_id'])
+            raise
+        event_bus.publish(Doctor.collection_name, 'insert', doctor['_id'], doctor)
         return Doctor.serialize_id(doctor)
     
     @staticmethod
-    def find_all(db, filters=None):
+    def find_all(db, filters=None, view='dashboard_row'):
         """Find all doctors with optional filters"""
         query = filters or {}
-        doctors = list(db[Doctor.collection_name].find(query))
+        doctors = list(db[Doctor.collection_name].find(query, Doctor.projection(view)))
         return Doctor.serialize_list(doctors)
     
     @staticmethod
@@ -366,17 +577,30 @@ class Doctor(BaseModel):
                 }
             }
         )
+        # Approved doctors become searchable, rejected ones drop out
+        FreeWindow.refresh_doctor(db, doctor_id)
+        if result.modified_count > 0:
+            event_bus.publish(Doctor.collection_name, 'update', doctor_id, {'verificationStatus': status},
+                              fields=('verificationStatus', 'updated_at'))
         return result.modified_count > 0
     
     @staticmethod
     def delete(db, doctor_id):
         """Delete a doctor"""
         result = db[Doctor.collection_name].delete_one({'_id': ObjectId(doctor_id)})
+        FreeWindow.refresh_doctor(db, doctor_id)
+        Identity.remove(db, doctor_id)
+        if result.deleted_count > 0:
+            event_bus.publish(Doctor.collection_name, 'delete', doctor_id)
         return result.deleted_count > 0
 
 class Patient(BaseModel):
     """Patient model"""
     collection_name = 'patients'
+    views = {
+        'dashboard_row': SECRET_FIELDS,
+        'full': None
+    }
     
     @staticmethod
     def generate_otp():
@@ -390,6 +614,7 @@ class Patient(BaseModel):
         full_name = f"{data.get('firstName', '')} {data.get('lastName', '')}".strip()
         
         patient = {
+            '_id': ObjectId(),
             'firstName': data.get('firstName'),
             'lastName': data.get('lastName'),
             'name': full_name,
@@ -408,14 +633,18 @@ class Patient(BaseModel):
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow()
         }
-        result = db[Patient.collection_name].insert_one(patient)
-        patient['_id'] = result.inserted_id
+        Identity.register(db, patient['_id'], patient['email'], 'patient')
+        try:
+            db[Patient.collection_name].insert_one(patient)
+        except Exception:
+            Identity.remove(db, patient['_id'])
+            raise
         return Patient.serialize_id(patient)
     
     @staticmethod
-    def find_all(db):
+    def find_all(db, view='dashboard_row'):
         """Find all patients"""
-        patients = list(db[Patient.collection_name].find())
+        patients = list(db[Patient.collection_name].find({}, Patient.projection(view)))
         return Patient.serialize_list(patients)
     
     @staticmethod
@@ -572,6 +801,118 @@ class Patient(BaseModel):
         )
         return result.modified_count > 0
 
+class Identity(BaseModel):
+    """Email index across admins, doctors and patients
+    
+    One document per user account, sharing the account's _id:
+    {_id, email, role, collection}. The unique email index makes an email
+    belong to at most one account, and auth resolves an email to its home
+    collection with one indexed lookup instead of trying every collection.
+    The model create/delete paths keep it in sync. Users created before it
+    existed are found in their home collection on a miss and indexed on the
+    way; the `backfill-identities` command indexes them all in bulk.
+    """
+    collection_name = 'identities'
+    
+    # Order login tried the home collections in before identities existed
+    legacy_roles = ('admin', 'doctor', 'patient')
+    
+    @staticmethod
+    def home_model(role):
+        """Get the model class storing users of a role"""
+        return {'admin': Admin, 'doctor': Doctor, 'patient': Patient}[role]
+    
+    @staticmethod
+    def register(db, user_id, email, role):
+        """Claim an email for a user before the user document is written
+        
+        Raises EmailAlreadyRegisteredError if another account owns the email.
+        Users without an email (legacy doctor records) are not indexed.
+        """
+        if not email:
+            return None
+        # Also catches accounts from before identities existed that are not indexed yet
+        owner = Identity.find_by_email(db, email)
+        if owner:
+            if owner['_id'] != ObjectId(user_id):
+                raise EmailAlreadyRegisteredError(email)
+            return owner
+        try:
+            return Identity.index(db, user_id, email, role)
+        except DuplicateKeyError:
+            raise EmailAlreadyRegisteredError(email)
+    
+    @staticmethod
+    def index(db, user_id, email, role):
+        """Write the identity of a user; raises DuplicateKeyError if the email or id is taken"""
+        identity = {
+            '_id': ObjectId(user_id),
+            'email': email,
+            'role': role,
+            'collection': Identity.home_model(role).collection_name,
+            'created_at': datetime.utcnow()
+        }
+        db[Identity.collection_name].insert_one(identity)
+        return identity
+    
+    @staticmethod
+    def adopt_legacy(db, query):
+        """Find an unindexed user matching query in the home collections and index them
+        
+        Returns the identity, or None if no account matches.
+        """
+        for role in Identity.legacy_roles:
+            user = db[Identity.home_model(role).collection_name].find_one(query, {'email': 1})
+            if not user or not user.get('email'):
+                continue
+            try:
+                return Identity.index(db, user['_id'], user['email'], role)
+            except DuplicateKeyError:
+                # Indexed meanwhile by a concurrent lookup, or another account owns the email
+                indexed = db[Identity.collection_name].find_one({'_id': user['_id']})
+                if indexed or '_id' in query:
+                    return indexed
+                return db[Identity.collection_name].find_one({'email': user['email']})
+        return None
+    
+    @staticmethod
+    def remove(db, user_id):
+        """Release the email of a deleted user"""
+        result = db[Identity.collection_name].delete_one({'_id': ObjectId(user_id)})
+        return result.deleted_count > 0
+    
+    @staticmethod
+    def find_by_email(db, email):
+        """Find the identity owning an email, indexing a legacy account on a miss"""
+        if not email:
+            return None
+        identity = db[Identity.collection_name].find_one({'email': email})
+        return identity or Identity.adopt_legacy(db, {'email': email})
+    
+    @staticmethod
+    def find_by_id(db, user_id):
+        """Find the identity of a user id, indexing a legacy account on a miss"""
+        try:
+            user_id = ObjectId(user_id)
+        except Exception:
+            return None
+        identity = db[Identity.collection_name].find_one({'_id': user_id})
+        return identity or Identity.adopt_legacy(db, {'_id': user_id})
+    
+    @staticmethod
+    def find_user(db, email):
+        """Resolve an email to (role, user) from the user's home collection
+        
+        Returns (None, None) if no account owns the email.
+        """
+        identity = Identity.find_by_email(db, email)
+        if not identity:
+            return None, None
+        user = db[identity['collection']].find_one({'_id': identity['_id']})
+        if not user:
+            return None, None
+        return identity['role'], Identity.serialize_id(user)
+
 class Complaint(BaseModel):
     """Complaint model"""
     collection_name = 'complaints'
@@ -623,9 +964,10 @@ class Notification(BaseModel):
     collection_name = 'notifications'
     
     @staticmethod
-    def create(db, data):
-        """Create a new notification"""
-        notification = {
+    def build(data):
+        """Build a notification document, with its _id assigned up front"""
+        return {
+            '_id': ObjectId(),
             'title': data.get('title'),
             'message': data.get('message'),
             'type': data.get('type', 'info'),
@@ -636,9 +978,54 @@ class Notification(BaseModel):
             'time': datetime.utcnow().strftime('%H:%M'),
             'created_at': datetime.utcnow()
         }
-        result = db[Notification.collection_name].insert_one(notification)
-        notification['_id'] = result.inserted_id
-        return Notification.serialize_id(notification)
+    
+    @staticmethod
+    def create(db, data):
+        """Create a new notification
+        
+        Inside a request the notification is buffered and written together
+        with the request's other notifications by `flush_buffer` when the
+        request ends; elsewhere it is inserted immediately.
+        """
+        notification = Notification.build(data)
+        if has_request_context():
+            if 'notification_buffer' not in g:
+                g.notification_buffer = []
+            g.notification_buffer.append((db, notification))
+        else:
+            Notification.collection(db, 'fire_and_forget').insert_one(notification)
+            realtime.push_notifications([notification])
+        return Notification.serialize_id(dict(notification))
+    
+    @staticmethod
+    def create_many(db, items):
+        """Create several notifications with one insert (for jobs and batch callers)"""
+        notifications = [Notification.build(data) for data in items]
+        if notifications:
+            Notification.collection(db, 'fire_and_forget').insert_many(notifications, ordered=False)
+            realtime.push_notifications(notifications)
+        return Notification.serialize_list([dict(notification) for notification in notifications])
+    
+    @staticmethod
+    def flush_buffer():
+        """Write the notifications buffered by the current request in one insert per database"""
+        buffered = g.pop('notification_buffer', None)
+        if not buffered:
+            return 0
+        
+        by_database = {}
+        for db, notification in buffered:
+            by_database.setdefault(id(db), (db, []))[1].append(notification)
+        
+        written = 0
+        for db, notifications in by_database.values():
+            try:
+                Notification.collection(db, 'fire_and_forget').insert_many(notifications, ordered=False)
+                written += len(notifications)
+                realtime.push_notifications(notifications)
+            except Exception as e:
+                print(f"Error writing {len(notifications)} buffered notifications: {e}")
+        return written
     
     @staticmethod
     def find_admin_notifications(db):
@@ -651,7 +1038,7 @@ class Notification(BaseModel):
     @staticmethod
     def mark_as_read(db, notification_id):
         """Mark notification as read"""
-        result = db[Notification.collection_name].update_one(
+        result = Notification.collection(db, 'standard').update_one(
             {'_id': ObjectId(notification_id)},
             {'$set': {'read': True}}
         )
@@ -660,7 +1047,7 @@ class Notification(BaseModel):
     @staticmethod
     def mark_all_as_read(db, user_id='admin'):
         """Mark all notifications as read for a user"""
-        result = db[Notification.collection_name].update_many(
+        result = Notification.collection(db, 'standard').update_many(
             {'userId': user_id, 'read': False},
             {'$set': {'read': True}}
         )
@@ -669,10 +1056,45 @@ class Notification(BaseModel):
 class Appointment(BaseModel):
     """Appointment model"""
     collection_name = 'appointments'
+    views = {
+        'dashboard_row': {'medical_history': 0},
+        'full': None
+    }
+    
+    @staticmethod
+    def create_indexes(db):
+        """Create range indexes on the canonical appointment start time"""
+        collection = db[Appointment.collection_name]
+        collection.create_index([('doctor_id', 1), ('appointment_start', 1)])
+        collection.create_index([('patient_id', 1), ('appointment_start', 1)])
+        collection.create_index([('doctor_id', 1), ('status', 1), ('appointment_start', 1)])
+        collection.create_index([('patient_id', 1), ('status', 1), ('appointment_start', 1)])
+        collection.create_index([('status', 1), ('appointment_start', 1)])
+        collection.create_index([('appointment_start', -1)])
+        collection.create_index([('created_at', -1), ('_id', -1)])
+        collection.create_index([('patient_id', 1), ('appointment_start', -1), ('_id', -1)])
+    
+    @staticmethod
+    def canonical_times(appointment_date, duration_minutes=None):
+        """Get the normalized UTC (start, end) datetimes for an appointment_date value"""
+        start = DoctorAvailability.parse_slot_datetime(appointment_date)
+        if not start:
+            return None, None
+        return start, start + timedelta(minutes=duration_minutes or DoctorAvailability.slot_duration_minutes)
     
     @staticmethod
     def create(db, data):
-        """Create a new appointment"""
+        """Create a new appointment, reserving its slot first if it is active
+        
+        Raises SlotAlreadyBookedError if another active appointment overlaps the slot.
+        A hold_id from SlotReservation.hold is converted into the booking when
+        it is still valid, and the appointment takes the hold's id.
+        """
+        # Length comes from the request, else the doctor's duration for the consultation type
+        duration_minutes = data.get('duration_minutes') or DoctorAvailability.get_slot_duration(
+            db, data.get('doctor_id'), data.get('consultation_type', 'video')
+        )
+        appointment_start, appointment_end = Appointment.canonical_times(data.get('appointment_date'), duration_minutes)
         appointment = {
             'patient_id': data.get('patient_id'),
             'patient_name': data.get('patient_name'),
@@ -680,7 +1102,10 @@ class Appointment(BaseModel):
             'patient_email': data.get('patient_email', ''),
             'doctor_id': data.get('doctor_id'),
             'doctor_name': data.get('doctor_name'),
-            'appointment_date': data.get('appointment_date'),  # ISO datetime string
+            'appointment_date': data.get('appointment_date'),  # ISO datetime string as sent by the client
+            'appointment_start': appointment_start,  # Normalized UTC datetime
+            'appointment_end': appointment_end,
+            'duration_minutes': duration_minutes,
             'status': data.get('status', 'pending'),  # pending, confirmed, completed, cancelled
             'reason': data.get('reason', ''),
             'notes': data.get('notes', ''),
@@ -694,61 +1119,137 @@ class Appointment(BaseModel):
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow()
         }
-        result = db[Appointment.collection_name].insert_one(appointment)
-        appointment['_id'] = result.inserted_id
+        
+        # Claim every 15-minute cell of the slot against the unique reservation
+        # index before writing the appointment itself
+        appointment['_id'] = ObjectId()
+        reserved = appointment['status'] in DoctorAvailability.active_statuses and appointment_start is not None
+        if reserved:
+            hold_id = data.get('hold_id')
+            if hold_id and SlotReservation.convert_hold(
+                db, hold_id, appointment['patient_id'], appointment['doctor_id'], appointment_start, appointment_end
+            ):
+                appointment['_id'] = ObjectId(hold_id)
+            else:
+                SlotReservation.claim(db, appointment['doctor_id'], appointment_start, appointment_end, appointment['_id'])
+        
+        try:
+            Appointment.collection(db, 'financial').insert_one(appointment)
+        except Exception:
+            if reserved:
+                SlotReservation.release(db, appointment['_id'])
+            raise
+        
+        if reserved:
+            try:
+                SlotOccupancy.update_cells(db, appointment['doctor_id'], appointment_start, appointment_end, occupied=True)
+            except Exception as e:
+                # The appointment is stored; the rebuild commands repair the derived data
+                print(f"Error updating slot occupancy: {e}")
+        
+        try:
+            StatsCounter.record_appointment(db, appointment['doctor_id'], appointment['patient_id'], appointment['status'])
+        except Exception as e:
+            print(f"Error updating appointment counters: {e}")
+        realtime.push_appointment_update(
+            appointment['_id'], appointment['status'], appointment['doctor_id'], appointment['patient_id'],
+            appointment.get('appointment_start')
+        )
         return Appointment.serialize_id(appointment)
     
     @staticmethod
-    def find_all(db):
+    def find_all(db, view='dashboard_row'):
         """Find all appointments"""
-        appointments = list(db[Appointment.collection_name].find().sort('appointment_date', -1))
+        appointments = list(db[Appointment.collection_name].find(
+            {}, Appointment.projection(view)
+        ).sort('appointment_start', -1))
         return Appointment.serialize_list(appointments)
     
     @staticmethod
-    def find_by_doctor_id(db, doctor_id):
+    def find_by_doctor_id(db, doctor_id, view='dashboard_row'):
         """Find all appointments for a specific doctor"""
         appointments = list(db[Appointment.collection_name].find({
             'doctor_id': doctor_id
-        }).sort('appointment_date', -1))
+        }, Appointment.projection(view)).sort('appointment_start', -1))
         return Appointment.serialize_list(appointments)
     
     @staticmethod
-    def find_pending_by_doctor_id(db, doctor_id):
+    def find_pending_by_doctor_id(db, doctor_id, view='dashboard_row'):
         """Find pending appointments for a specific doctor"""
         appointments = list(db[Appointment.collection_name].find({
             'doctor_id': doctor_id,
             'status': 'pending'
-        }).sort('appointment_date', 1))
+        }, Appointment.projection(view)).sort('appointment_start', 1))
         return Appointment.serialize_list(appointments)
     
     @staticmethod
-    def find_today_by_doctor_id(db, doctor_id):
+    def find_today_by_doctor_id(db, doctor_id, view='dashboard_row'):
         """Find today's appointments for a specific doctor"""
         today = datetime.utcnow().date()
         start_of_day = datetime.combine(today, datetime.min.time())
-        end_of_day = datetime.combine(today, datetime.max.time())
+        end_of_day = start_of_day + timedelta(days=1)
         
         appointments = list(db[Appointment.collection_name].find({
             'doctor_id': doctor_id,
             'status': {'$in': ['confirmed', 'completed']},
-            'appointment_date': {
-                '$gte': start_of_day.isoformat(),
-                '$lte': end_of_day.isoformat()
+            'appointment_start': {
+                '$gte': start_of_day,
+                '$lt': end_of_day
             }
-        }).sort('appointment_date', 1))
+        }, Appointment.projection(view)).sort('appointment_start', 1))
         return Appointment.serialize_list(appointments)
-    
+
+    @staticmethod
+    def find_reminders_due(db, start_after, start_until):
+        """Find confirmed appointments starting in (start_after, start_until] that were not reminded yet"""
+        return list(db[Appointment.collection_name].find({
+            'status': 'confirmed',
+            'appointment_start': {'$gt': start_after, '$lte': start_until},
+            'reminder_sent': {'$ne': True}
+        }, {'appointment_start': 1}))
+
     @staticmethod
-    def find_by_patient_id(db, patient_id):
+    def claim_reminder(db, appointment_id, now=None):
+        """Mark a confirmed appointment that has not started as reminded
+
+        Returns the appointment to the one caller that claims it and None to
+        everyone else, so each appointment is reminded once however many
+        workers try. Majority-acknowledged, so a failover cannot roll the
+        claim back and let it be claimed twice.
+        """
+        now = now or datetime.utcnow()
+        return Appointment.collection(db, 'financial').find_one_and_update(
+            {
+                '_id': ObjectId(appointment_id),
+                'status': 'confirmed',
+                'appointment_start': {'$gt': now},
+                'reminder_sent': {'$ne': True}
+            },
+            {'$set': {'reminder_sent': True, 'reminder_sent_at': now}},
+            projection={
+                'doctor_id': 1, 'patient_id': 1, 'doctor_name': 1, 'patient_name': 1,
+                'appointment_date': 1, 'appointment_start': 1, 'consultation_type': 1
+            },
+            return_document=ReturnDocument.AFTER
+        )
+
+    @staticmethod
+    def find_by_patient_id(db, patient_id, view='dashboard_row'):
         """Find all appointments for a specific patient"""
         appointments = list(db[Appointment.collection_name].find({
             'patient_id': patient_id
-        }).sort('appointment_date', -1))
+        }, Appointment.projection(view)).sort('appointment_start', -1))
         return Appointment.serialize_list(appointments)
     
     @staticmethod
-    def update_status(db, appointment_id, status, rejection_reason=None):
-        """Update appointment status and rejection reason if provided"""
+    def update_status(db, appointment_id, status, rejection_reason=None, session=None):
+        """Update appointment status and rejection reason if provided
+        
+        Returns the appointment's status, doctor, patient and times as they
+        were before the update, or False. With a session the update joins the
+        caller's transaction, errors are raised so the transaction can retry
+        or abort, and the real-time push is left to the caller after commit.
+        """
         try:
             update_data = {
                 'status': status,
@@ -758,50 +1259,153 @@ class Appointment(BaseModel):
             if rejection_reason is not None:
                 update_data['rejection_reason'] = rejection_reason
             
-            result = db[Appointment.collection_name].update_one(
+            previous = Appointment.collection(db, 'financial').find_one_and_update(
                 {'_id': ObjectId(appointment_id)},
-                {'$set': update_data}
+                {'$set': update_data},
+                projection={'status': 1, 'doctor_id': 1, 'patient_id': 1, 'appointment_start': 1, 'appointment_end': 1},
+                return_document=ReturnDocument.BEFORE,
+                session=session
             )
-            return result.modified_count > 0
+            if not previous:
+                return False
+            
+            StatsCounter.move_appointment(
+                db, previous['doctor_id'], previous.get('patient_id'), previous.get('status'), status, session=session
+            )
+            
+            # Cancelled, declined or completed appointments no longer hold their slot
+            was_active = previous.get('status') in DoctorAvailability.active_statuses
+            if was_active and status not in DoctorAvailability.active_statuses:
+                SlotReservation.release(db, appointment_id, session=session)
+                if previous.get('appointment_start'):
+                    SlotOccupancy.update_cells(
+                        db, previous['doctor_id'], previous['appointment_start'],
+                        previous['appointment_end'], occupied=False, session=session
+                    )
+            
+            if session is None:
+                realtime.push_appointment_update(
+                    appointment_id, status, previous['doctor_id'], previous.get('patient_id'), previous.get('appointment_start')
+                )
+            return previous
         except Exception as e:
+            if session is not None:
+                raise
             print(f"Error updating appointment status: {str(e)}")
             return False
     
     @staticmethod
     def get_doctor_patients_count(db, doctor_id):
         """Get total number of unique patients for a doctor"""
+        return StatsCounter.get_doctor(db, doctor_id)['unique_patients']
+    
+    @staticmethod
+    def get_doctor_patients(db, doctor_id, limit=None, after=None):
+        """Get one page of patients who have had appointments with a doctor
+        
+        Patients are ordered by their latest appointment and fetched with a
+        single $in query. Returns (patients, next_cursor) like
+        BaseModel.find_page; a malformed cursor raises ValueError.
+        """
+        limit = BaseModel.page_size(limit)
         pipeline = [
             {'$match': {'doctor_id': doctor_id}},
-            {'$group': {'_id': '$patient_id'}},
-            {'$count': 'total_patients'}
+            {'$group': {'_id': '$patient_id', 'last_appointment': {'$max': '$created_at'}}},
+            {'$match': BaseModel.keyset_query({}, 'last_appointment', after)},
+            {'$sort': {'last_appointment': -1, '_id': -1}},
+            {'$limit': limit + 1}
         ]
-        result = list(db[Appointment.collection_name].aggregate(pipeline))
-        return result[0]['total_patients'] if result else 0
-    
-    @staticmethod
-    def get_doctor_patients(db, doctor_id):
-        """Get patients who have had appointments with a doctor"""
+        
         try:
-            pipeline = [
-                {'$match': {'doctor_id': doctor_id}},
-                {'$group': {'_id': '$patient_id', 'last_appointment': {'$max': '$created_at'}}},
-                {'$sort': {'last_appointment': -1}}
-            ]
-            
             appointments = list(db[Appointment.collection_name].aggregate(pipeline))
-            patients = []
+            next_cursor = None
+            if len(appointments) > limit:
+                appointments = appointments[:limit]
+                next_cursor = BaseModel.encode_cursor(appointments[-1], 'last_appointment')
             
+            patient_ids = [ObjectId(appointment['_id']) for appointment in appointments if ObjectId.is_valid(appointment['_id'])]
+            patients_by_id = {
+                str(patient['_id']): patient
+                for patient in db[Patient.collection_name].find(
+                    {'_id': {'$in': patient_ids}}, Patient.projection('dashboard_row')
+                )
+            }
+            
+            patients = []
             for appointment in appointments:
-                patient = Patient.find_by_id(db, appointment['_id'])
+                patient = patients_by_id.get(appointment['_id'])
                 if patient:
                     patient['last_appointment'] = appointment['last_appointment']
-                    patients.append(patient)
+                    patients.append(Patient.serialize_id(patient))
             
-            return patients
+            return patients, next_cursor
         except Exception as e:
             print(f"Error getting doctor patients: {e}")
-            return []
+            return [], None
 
+    @staticmethod
+    def find_consultation_history(db, limit=None, after=None):
+        """Find one page of appointments joined with their payment, doctor and patient
+        
+        Runs as a single aggregation instead of three lookups per appointment.
+        Returns (appointments, next_cursor) like BaseModel.find_page; each
+        appointment carries `payment` (or None), `doctor_name` and `patient_name`.
+        """
+        limit = BaseModel.page_size(limit)
+        history_fields = ['created_at', 'appointment_date', 'consultation_type', 'status', 'reason', 'notes']
+        
+        def object_id(field):
+            # doctor_id/patient_id are stored as strings; bad ids join nothing
+            return {'$convert': {'input': f'${field}', 'to': 'objectId', 'onError': None, 'onNull': None}}
+        
+        pipeline = [
+            {'$match': BaseModel.keyset_query({}, 'created_at', after)},
+            {'$sort': {'created_at': -1, '_id': -1}},
+            {'$limit': limit + 1},
+            {'$project': {
+                **{field: 1 for field in history_fields},
+                'appointment_key': {'$toString': '$_id'},
+                'doctor_key': object_id('doctor_id'),
+                'patient_key': object_id('patient_id')
+            }},
+            {'$lookup': {
+                'from': Payment.collection_name,
+                'localField': 'appointment_key',
+                'foreignField': 'appointment_id',
+                'pipeline': [
+                    {'$project': {'payment_status': 1, 'amount': 1, 'created_at': 1, 'payment_method': 1, 'transaction_id': 1}}
+                ],
+                'as': 'payments'
+            }},
+            {'$lookup': {
+                'from': Doctor.collection_name,
+                'localField': 'doctor_key',
+                'foreignField': '_id',
+                'pipeline': [{'$project': {'name': 1}}],
+                'as': 'doctors'
+            }},
+            {'$lookup': {
+                'from': Patient.collection_name,
+                'localField': 'patient_key',
+                'foreignField': '_id',
+                'pipeline': [{'$project': {'name': 1}}],
+                'as': 'patients'
+            }},
+            {'$project': {
+                **{field: 1 for field in history_fields},
+                'payment': {'$arrayElemAt': ['$payments', 0]},
+                'doctor_name': {'$arrayElemAt': ['$doctors.name', 0]},
+                'patient_name': {'$arrayElemAt': ['$patients.name', 0]}
+            }}
+        ]
+        appointments = list(db[Appointment.collection_name].aggregate(pipeline))
+        
+        next_cursor = None
+        if len(appointments) > limit:
+            appointments = appointments[:limit]
+            next_cursor = BaseModel.encode_cursor(appointments[-1], 'created_at')
+        return Appointment.serialize_list(appointments), next_cursor
+    
     @staticmethod
     def find_overdue_appointments(db, cutoff_time):
         """Find appointments that are overdue for completion"""
@@ -810,7 +1414,7 @@ class Appointment(BaseModel):
             # and haven't been completed yet
             overdue_appointments = list(db[Appointment.collection_name].find({
                 'status': 'confirmed',
-                'appointment_date': {'$lt': cutoff_time.isoformat()},
+                'appointment_start': {'$lt': cutoff_time},
                 '$or': [
                     {'consultation_completed': {'$exists': False}},
                     {'consultation_completed': False}
@@ -875,7 +1479,7 @@ class Appointment(BaseModel):
     def approve_for_release(db, payment_id):
         """Approve payment for release (sets admin_approved flag)"""
         try:
-            result = db[Payment.collection_name].update_one(
+            result = Payment.collection(db, 'financial').update_one(
                 {'_id': ObjectId(payment_id)},
                 {
                     '$set': {
@@ -909,46 +1513,71 @@ class User(BaseModel):
         users = []
         
         # Get all admins
-        admins = list(db['admins'].find())
+        admins = list(db['admins'].find({}, Admin.projection('dashboard_row')))
         for admin in admins:
             admin['role'] = 'admin'
             users.append(admin)
         
         # Get all doctors
-        doctors = list(db['doctors'].find())
+        doctors = list(db['doctors'].find({}, Doctor.projection('dashboard_row')))
         for doctor in doctors:
             doctor['role'] = 'doctor'
             users.append(doctor)
         
         # Get all patients
-        patients = list(db['patients'].find())
+        patients = list(db['patients'].find({}, Patient.projection('dashboard_row')))
         for patient in patients:
             patient['role'] = 'patient'
             users.append(patient)
         
         return User.serialize_list(users)
     
+    @staticmethod
+    def find_users_page(db, limit=None, after=None):
+        """Find one page of users from all collections, newest first
+        
+        Returns (users, next_cursor) like BaseModel.find_page.
+        """
+        limit = BaseModel.page_size(limit)
+        query = BaseModel.keyset_query({}, 'created_at', after)
+        
+        # Take a full page from each collection, then merge them in page order
+        users = []
+        for model, role in ((Admin, 'admin'), (Doctor, 'doctor'), (Patient, 'patient')):
+            for user in db[model.collection_name].find(
+                query, model.projection('dashboard_row')
+            ).sort([('created_at', -1), ('_id', -1)]).limit(limit + 1):
+                user['role'] = role
+                users.append(user)
+        users.sort(
+            key=lambda user: (user.get('created_at') is not None, user.get('created_at') or datetime.min, user['_id']),
+            reverse=True
+        )
+        
+        next_cursor = None
+        if len(users) > limit:
+            users = users[:limit]
+            next_cursor = BaseModel.encode_cursor(users[-1], 'created_at')
+        return User.serialize_list(users), next_cursor
+    
     @staticmethod
     def update_user_status(db, user_id, status):
-        """Update user status in appropriate collection"""
-        # Try to find the user in each collection
-        collections = ['admins', 'doctors', 'patients']
+        """Update user status in the user's home collection"""
+        identity = Identity.find_by_id(db, user_id)
+        if not identity:
+            return False
         
-        for collection in collections:
-            result = db[collection].update_one(
-                {'_id': ObjectId(user_id)},
-                {
-                    '$set': {
-                        'status': status,
-                        'is_active': status == 'active',
-                        'updated_at': datetime.utcnow()
-                    }
+        result = db[identity['collection']].update_one(
+            {'_id': identity['_id']},
+            {
+                '$set': {
+                    'status': status,
+                    'is_active': status == 'active',
+                    'updated_at': datetime.utcnow()
                 }
-            )
-            if result.modified_count > 0:
-                return True
-        
-        return False
+            }
+        )
+        return result.modified_count > 0
 
 class SystemSettings(BaseModel):
     """System settings model"""
@@ -999,7 +1628,10 @@ class SystemSettings(BaseModel):
 class DoctorAvailability(BaseModel):
     """Doctor availability model for managing weekly schedules"""
     collection_name = 'doctor_availability'
-    
+    slot_duration_minutes = 30  # Used when neither the doctor nor the system settings set a duration
+    max_duration_minutes = 240
+    active_statuses = ['confirmed', 'pending']
+
     @staticmethod
     def create_default_availability():
         """Create default availability structure"""
@@ -1015,8 +1647,63 @@ class DoctorAvailability(BaseModel):
         return availability
     
     @staticmethod
-    def create_or_update(db, doctor_id, availability_data):
-        """Create or update doctor's weekly availability"""
+    def validate_durations(durations):
+        """Check slot durations, returning (is_valid, message)
+        
+        Durations must be whole multiples of the 15-minute occupancy cell so
+        slots of different lengths never share a partly booked cell.
+        """
+        consultation_durations = durations.get('consultation_durations') or {}
+        if not isinstance(consultation_durations, dict):
+            return False, "consultation_durations must map consultation types to minutes"
+        
+        values = list(consultation_durations.values())
+        if durations.get('slot_duration_minutes') is not None:
+            values.append(durations['slot_duration_minutes'])
+        
+        for value in values:
+            if not isinstance(value, int) or isinstance(value, bool):
+                return False, "Durations must be whole numbers of minutes"
+            if value <= 0 or value > DoctorAvailability.max_duration_minutes or value % SlotOccupancy.cell_minutes:
+                return False, (f"Durations must be multiples of {SlotOccupancy.cell_minutes} minutes "
+                               f"up to {DoctorAvailability.max_duration_minutes}")
+        return True, "Durations are valid"
+    
+    @staticmethod
+    def resolve_duration(db, availability, consultation_type=None):
+        """Get the slot length in minutes for a consultation type from an availability document
+        
+        Falls back from the doctor's per-type duration to the doctor's default,
+        then SystemSettings.appointmentDuration, then slot_duration_minutes.
+        """
+        availability = availability or {}
+        consultation_durations = availability.get('consultation_durations') or {}
+        if consultation_type and consultation_durations.get(consultation_type):
+            return consultation_durations[consultation_type]
+        if availability.get('slot_duration_minutes'):
+            return availability['slot_duration_minutes']
+        
+        settings = db[SystemSettings.collection_name].find_one({}, {'appointmentDuration': 1}) or {}
+        duration = settings.get('appointmentDuration')
+        if isinstance(duration, int) and duration > 0 and duration % SlotOccupancy.cell_minutes == 0:
+            return duration
+        return DoctorAvailability.slot_duration_minutes
+    
+    @staticmethod
+    def get_slot_duration(db, doctor_id, consultation_type=None):
+        """Get a doctor's slot length in minutes for a consultation type"""
+        availability = db[DoctorAvailability.collection_name].find_one(
+            {'doctor_id': doctor_id}, {'slot_duration_minutes': 1, 'consultation_durations': 1}
+        )
+        return DoctorAvailability.resolve_duration(db, availability, consultation_type)
+    
+    @staticmethod
+    def create_or_update(db, doctor_id, availability_data, durations=None):
+        """Create or update doctor's weekly availability
+        
+        durations may set slot_duration_minutes and consultation_durations
+        (e.g. {'video': 30, 'phone': 15}); validate them with validate_durations.
+        """
         # Validate the data structure
         days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
         
@@ -1034,6 +1721,9 @@ class DoctorAvailability(BaseModel):
             'weekly_availability': availability_data,
             'updated_at': datetime.utcnow()
         }
+        for field in ['slot_duration_minutes', 'consultation_durations']:
+            if durations and durations.get(field) is not None:
+                availability_doc[field] = durations[field]
         
         # Upsert the availability (create if not exists, update if exists)
         result = db[DoctorAvailability.collection_name].update_one(
@@ -1045,22 +1735,55 @@ class DoctorAvailability(BaseModel):
             upsert=True
         )
         
+        # Open windows follow the new schedule
+        try:
+            FreeWindow.refresh_doctor(db, doctor_id)
+        except Exception as e:
+            print(f"Error refreshing free windows: {e}")
+        
         # Return the updated document
         updated_doc = db[DoctorAvailability.collection_name].find_one({'doctor_id': doctor_id})
+        if updated_doc:
+            event_bus.publish(DoctorAvailability.collection_name, 'update', updated_doc['_id'], updated_doc,
+                              fields=availability_doc)
         return DoctorAvailability.serialize_id(updated_doc) if updated_doc else None
     
     @staticmethod
     def find_by_doctor_id(db, doctor_id):
-        """Find availability by doctor ID"""
+        """Find availability by doctor ID
+        
+        Doctors who never saved a schedule get an in-memory default (no days
+        available); nothing is written until they update their availability.
+        """
         availability = db[DoctorAvailability.collection_name].find_one({'doctor_id': doctor_id})
         
         if not availability:
-            # Create default availability if none exists
-            default_availability = DoctorAvailability.create_default_availability()
-            return DoctorAvailability.create_or_update(db, doctor_id, default_availability)
+            return {
+                'id': None,
+                'doctor_id': doctor_id,
+                'weekly_availability': DoctorAvailability.create_default_availability(),
+                'is_default': True
+            }
         
         return DoctorAvailability.serialize_id(availability)
     
+    @staticmethod
+    def default_availability_query():
+        """Query matching availability documents that reads generated, not doctors
+        
+        Reads used to upsert exactly {doctor_id, weekly_availability:
+        default, created_at, updated_at}, with both timestamps from the same
+        write. A doctor who saved a schedule later has a newer updated_at or
+        other fields, and is not matched even if every day is unavailable.
+        """
+        return {
+            'weekly_availability': DoctorAvailability.create_default_availability(),
+            '$expr': {'$and': [
+                {'$eq': [{'$size': {'$objectToArray': '$$ROOT'}}, 5]},
+                {'$lte': [{'$abs': {'$subtract': ['$updated_at', '$created_at']}}, 1000]}
+            ]}
+        }
+    
     @staticmethod
     def get_available_slots_for_day(db, doctor_id, day_of_week):
         """Get available time slots for a specific day of the week"""
@@ -1077,240 +1800,174 @@ class DoctorAvailability(BaseModel):
         return day_availability.get('time_slots', [])
     
     @staticmethod
-    def get_available_slots_for_date(db, doctor_id, date):
+    def get_available_slots_for_date(db, doctor_id, date, consultation_type=None):
         """Get available time slots for a specific date with booking status"""
         try:
             # Parse date and get day of week
             date_obj = datetime.strptime(date, '%Y-%m-%d')
             day_of_week = date_obj.strftime('%A').lower()
             
-            # Get current time for filtering past slots on current day
-            now = datetime.utcnow()
-            current_date = now.date()
-            current_time = now.time()
-            is_today = date_obj.date() == current_date
-            
             # Get doctor's time slots for that day
-            day_slots = DoctorAvailability.get_available_slots_for_day(db, doctor_id, day_of_week)
+            availability = DoctorAvailability.find_by_doctor_id(db, doctor_id) or {}
+            day_availability = availability.get('weekly_availability', {}).get(day_of_week, {})
+            day_slots = day_availability.get('time_slots', []) if day_availability.get('is_available', False) else []
             
             if not day_slots:
                 return []
             
-            # Generate 30-minute slots from the available time ranges
-            available_slots = []
-            
-            for slot_range in day_slots:
-                start_time = slot_range.get('start_time', '')
-                end_time = slot_range.get('end_time', '')
-                
-                if not start_time or not end_time:
-                    continue
-                
-                # Parse start and end times
-                start_hour, start_minute = map(int, start_time.split(':'))
-                end_hour, end_minute = map(int, end_time.split(':'))
-                
-                # Generate 30-minute slots
-                current_hour, current_minute = start_hour, start_minute
-                
-                while (current_hour < end_hour) or (current_hour == end_hour and current_minute < end_minute):
-                    slot_time = f"{current_hour:02d}:{current_minute:02d}"
-                    slot_datetime = f"{date}T{slot_time}:00"
-                    
-                    # Skip past slots if this is today
-                    if is_today:
-                        slot_time_obj = datetime.strptime(slot_time, '%H:%M').time()
-                        # Add buffer time (e.g., 1 hour) to allow booking preparation
-                        buffer_minutes = 60
-                        slot_with_buffer = datetime.combine(current_date, slot_time_obj)
-                        current_with_buffer = datetime.combine(current_date, current_time) + timedelta(minutes=buffer_minutes)
-                        
-                        if slot_with_buffer <= current_with_buffer:
-                            # Skip this slot - it's too soon or has passed
-                            current_minute += 30
-                            if current_minute >= 60:
-                                current_minute = 0
-                                current_hour += 1
-                            continue
-                    
-                    # Check if this slot is already booked
-                    is_booked = DoctorAvailability.is_slot_booked(db, doctor_id, slot_datetime)
-                    
-                    available_slots.append({
-                        'time': slot_time,
-                        'datetime': slot_datetime,
-                        'is_available': not is_booked,
-                        'status': 'booked' if is_booked else 'available',
-                        'is_past': is_today and slot_time_obj < current_time if is_today else False
-                    })
-                    
-                    # Move to next 30-minute slot
-                    current_minute += 30
-                    if current_minute >= 60:
-                        current_minute = 0
-                        current_hour += 1
+            # Load the day's occupancy bitmap and checkout holds and test
+            # each slot against them instead of scanning appointments
+            occupied = SlotOccupancy.find_day_masks(db, doctor_id, [date], include_holds=True).get(date, 0)
+            duration_minutes = DoctorAvailability.resolve_duration(db, availability, consultation_type)
             
-            return available_slots
+            return DoctorAvailability.generate_day_slots(date, day_slots, occupied, duration_minutes)
             
         except Exception as e:
             print(f"Error getting available slots for date: {e}")
             return []
     
     @staticmethod
-    def is_slot_booked(db, doctor_id, slot_datetime):
-        """Check if a specific time slot is already booked"""
-        try:
-            # Enable debug logging in development
-            debug_mode = os.getenv('FLASK_ENV') == 'development'
-            
-            # Normalize the slot datetime string to a consistent format
-            if isinstance(slot_datetime, str):
-                # Remove any timezone indicators and microseconds
-                slot_datetime_clean = slot_datetime.replace('Z', '').replace('T', ' ')
-                if '.' in slot_datetime_clean:
-                    slot_datetime_clean = slot_datetime_clean.split('.')[0]
-                
-                # Ensure we have a consistent format: YYYY-MM-DD HH:MM:SS
-                if ' ' not in slot_datetime_clean:
-                    slot_datetime_clean = slot_datetime_clean.replace('T', ' ')
-                
-                # Add seconds if not present
-                if len(slot_datetime_clean.split(' ')[1].split(':')) == 2:
-                    slot_datetime_clean += ':00'
-                    
-                try:
-                    slot_dt = datetime.fromisoformat(slot_datetime_clean)
-                except ValueError as e:
-                    if debug_mode:
-                        print(f"Error parsing slot datetime '{slot_datetime}': {e}")
-                    return False
-            else:
-                slot_dt = slot_datetime
-            
-            # Create the exact appointment datetime string to match against database
-            appointment_datetime_iso = slot_dt.isoformat()
-            
-            if debug_mode:
-                print(f"Checking slot booking for doctor {doctor_id} at {appointment_datetime_iso}")
-            
-            # Query for exact match first - appointments starting at this exact time
-            exact_match_query = {
-                'doctor_id': doctor_id,
-                'appointment_date': appointment_datetime_iso,
-                'status': {'$in': ['confirmed', 'pending']}
-            }
-            
-            exact_match = db[Appointment.collection_name].find_one(exact_match_query)
-            
-            if exact_match:
-                if debug_mode:
-                    print(f"Exact match found: appointment {exact_match.get('_id')} at {exact_match.get('appointment_date')}")
-                return True
-            
-            # Also check for ISO format variations that might be stored differently
-            iso_variations = [
-                appointment_datetime_iso,
-                slot_dt.strftime('%Y-%m-%dT%H:%M:%S'),
-                slot_dt.strftime('%Y-%m-%d %H:%M:%S'),
-                f"{slot_dt.strftime('%Y-%m-%dT%H:%M:%S')}.000Z",
-                f"{slot_dt.strftime('%Y-%m-%dT%H:%M:%S')}Z"
-            ]
-            
-            for iso_format in iso_variations:
-                variation_query = {
-                    'doctor_id': doctor_id,
-                    'appointment_date': iso_format,
-                    'status': {'$in': ['confirmed', 'pending']}
-                }
-                
-                match = db[Appointment.collection_name].find_one(variation_query)
-                if match:
-                    if debug_mode:
-                        print(f"Match found with format '{iso_format}': appointment {match.get('_id')}")
-                    return True
-            
-            # If no exact matches, check for potential overlapping appointments
-            # Get all appointments for this doctor on this date
-            date_only = slot_dt.date().isoformat()
-            
-            # Build a more flexible query to catch different datetime formats
-            date_regex_pattern = f"^{date_only}"
+    def get_available_slots_for_range(db, doctor_id, start_date, end_date, consultation_type=None):
+        """Get time slots with booking status for every date from start_date to end_date (inclusive)
+        
+        Reads the weekly availability once and the occupancy bitmaps and
+        holds of the whole window in one query each.
+        """
+        start_obj = datetime.strptime(start_date, '%Y-%m-%d')
+        end_obj = datetime.strptime(end_date, '%Y-%m-%d')
+        dates = [
+            (start_obj + timedelta(days=offset)).strftime('%Y-%m-%d')
+            for offset in range((end_obj - start_obj).days + 1)
+        ]
+        
+        availability = DoctorAvailability.find_by_doctor_id(db, doctor_id) or {}
+        occupied = SlotOccupancy.find_day_masks(db, doctor_id, dates, include_holds=True)
+        duration_minutes = DoctorAvailability.resolve_duration(db, availability, consultation_type)
+        
+        return DoctorAvailability.build_range_slots(
+            availability.get('weekly_availability', {}), occupied, dates, duration_minutes
+        )
+    
+    @staticmethod
+    def build_range_slots(weekly_availability, occupied, dates, duration_minutes=None):
+        """Generate slots for each date from a weekly schedule and a {date: mask} occupancy map"""
+        days = []
+        for date in dates:
+            day_of_week = datetime.strptime(date, '%Y-%m-%d').strftime('%A').lower()
+            day_availability = weekly_availability.get(day_of_week, {})
+            day_slots = day_availability.get('time_slots', []) if day_availability.get('is_available', False) else []
             
-            appointments_today = list(db[Appointment.collection_name].find({
-                'doctor_id': doctor_id,
-                'status': {'$in': ['confirmed', 'pending']},
-                'appointment_date': {'$regex': date_regex_pattern}
-            }))
+            days.append({
+                'date': date,
+                'day_of_week': day_of_week,
+                'available_slots': DoctorAvailability.generate_day_slots(
+                    date, day_slots, occupied.get(date, 0), duration_minutes
+                ) if day_slots else []
+            })
+        
+        return days
+    
+    @staticmethod
+    def generate_day_slots(date, day_slots, occupied, duration_minutes=None):
+        """Generate back-to-back slots for a date from its time ranges and occupancy bitmap"""
+        date_obj = datetime.strptime(date, '%Y-%m-%d')
+        duration_minutes = duration_minutes or DoctorAvailability.slot_duration_minutes
+        slot_length = timedelta(minutes=duration_minutes)
+        
+        # Get current time for filtering past slots on current day
+        now = datetime.utcnow()
+        is_today = date_obj.date() == now.date()
+        # Add buffer time (e.g., 1 hour) to allow booking preparation
+        earliest_start = now + timedelta(minutes=60)
+        
+        available_slots = []
+        
+        for slot_range in day_slots:
+            start_time = slot_range.get('start_time', '')
+            end_time = slot_range.get('end_time', '')
             
-            if debug_mode:
-                print(f"Found {len(appointments_today)} appointments for doctor {doctor_id} on {date_only}")
-                for apt in appointments_today:
-                    print(f"  - Appointment {apt.get('_id')}: {apt.get('appointment_date')} (status: {apt.get('status')})")
+            if not start_time or not end_time:
+                continue
             
-            # Check each appointment for time overlap
-            slot_start = slot_dt
-            slot_end = slot_dt + timedelta(minutes=30)
+            # Parse start and end times
+            start_hour, start_minute = map(int, start_time.split(':'))
+            end_hour, end_minute = map(int, end_time.split(':'))
+            slot_start = date_obj.replace(hour=start_hour, minute=start_minute)
+            range_end = date_obj.replace(hour=end_hour, minute=end_minute)
             
-            for appointment in appointments_today:
-                try:
-                    apt_datetime_str = appointment['appointment_date']
-                    
-                    # Try to parse the appointment datetime
-                    apt_dt = None
-                    
-                    # Try different parsing approaches
-                    for parse_format in [
-                        '%Y-%m-%dT%H:%M:%S',
-                        '%Y-%m-%d %H:%M:%S',
-                        '%Y-%m-%dT%H:%M:%S.%f',
-                        '%Y-%m-%dT%H:%M:%SZ',
-                        '%Y-%m-%dT%H:%M:%S.%fZ'
-                    ]:
-                        try:
-                            # Clean the datetime string first
-                            clean_apt_datetime = apt_datetime_str.replace('Z', '')
-                            if '.' in clean_apt_datetime and 'T' in clean_apt_datetime:
-                                clean_apt_datetime = clean_apt_datetime.split('.')[0]
-                            
-                            apt_dt = datetime.strptime(clean_apt_datetime, parse_format.replace('.%f', ''))
-                            break
-                        except ValueError:
-                            continue
-                    
-                    if not apt_dt:
-                        # Try fromisoformat as last resort
-                        try:
-                            clean_datetime = apt_datetime_str.replace('Z', '').replace('T', ' ')
-                            if '.' in clean_datetime:
-                                clean_datetime = clean_datetime.split('.')[0]
-                            apt_dt = datetime.fromisoformat(clean_datetime)
-                        except ValueError:
-                            if debug_mode:
-                                print(f"Could not parse appointment datetime: {apt_datetime_str}")
-                            continue
-                    
-                    # Check for overlap (30-minute appointment slots)
-                    apt_start = apt_dt
-                    apt_end = apt_dt + timedelta(minutes=30)
-                    
-                    # Check if the times overlap
-                    if (slot_start < apt_end and slot_end > apt_start):
-                        if debug_mode:
-                            print(f"Time overlap detected:")
-                            print(f"  Requested slot: {slot_start} - {slot_end}")
-                            print(f"  Existing appointment: {apt_start} - {apt_end}")
-                            print(f"  Appointment ID: {appointment.get('_id')}")
-                        return True
-                        
-                except Exception as e:
-                    if debug_mode:
-                        print(f"Error processing appointment {appointment.get('_id')}: {e}")
+            # Every slot must fit inside the range
+            while slot_start + slot_length <= range_end:
+                # Skip slots that are too soon or have passed if this is today
+                if is_today and slot_start <= earliest_start:
+                    slot_start += slot_length
                     continue
+                
+                # Check if this slot overlaps an existing appointment
+                slot_mask = SlotOccupancy.cell_masks(slot_start, slot_start + slot_length).get(date, 0)
+                is_booked = bool(occupied & slot_mask)
+                
+                available_slots.append({
+                    'time': slot_start.strftime('%H:%M'),
+                    'datetime': slot_start.strftime('%Y-%m-%dT%H:%M:%S'),
+                    'duration_minutes': duration_minutes,
+                    'is_available': not is_booked,
+                    'status': 'booked' if is_booked else 'available',
+                    'is_past': False
+                })
+                
+                slot_start += slot_length
+        
+        return available_slots
+    
+    @staticmethod
+    def parse_slot_datetime(value):
+        """Parse a slot or appointment datetime into a naive UTC datetime"""
+        if isinstance(value, datetime):
+            parsed = value
+        elif isinstance(value, str) and value:
+            # Accept every format clients have sent, e.g. 2025-06-01T09:00,
+            # 2025-06-01 09:00:00, 2025-06-01T09:00:00.000Z or with a +05:30 offset
+            match = re.match(
+                r'^(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}(?::\d{2})?)(?:\.\d+)?(Z|[+-]\d{2}:?\d{2})?$',
+                value.strip()
+            )
+            if not match:
+                return None
+            date_part, time_part, offset = match.groups()
+            if len(time_part) == 5:
+                time_part += ':00'
+            try:
+                parsed = datetime.strptime(f"{date_part} {time_part}", '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                return None
+            if offset and offset != 'Z':
+                sign = 1 if offset[0] == '+' else -1
+                hours, minutes = int(offset[1:3]), int(offset[-2:])
+                parsed -= sign * timedelta(hours=hours, minutes=minutes)
+        else:
+            return None
+        
+        # Timezone-aware values are converted to UTC; naive values are already UTC
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed.replace(microsecond=0)
+    
+    @staticmethod
+    def is_slot_booked(db, doctor_id, slot_datetime, duration_minutes=None):
+        """Check if a specific time slot is already booked
+        
+        duration_minutes defaults to the doctor's slot duration.
+        """
+        try:
+            slot_dt = DoctorAvailability.parse_slot_datetime(slot_datetime)
+            if not slot_dt:
+                if os.getenv('FLASK_ENV') == 'development':
+                    print(f"Error parsing slot datetime '{slot_datetime}'")
+                return False
             
-            if debug_mode:
-                print(f"No conflicts found for slot {appointment_datetime_iso}")
-            
-            return False
+            duration_minutes = duration_minutes or DoctorAvailability.get_slot_duration(db, doctor_id)
+            slot_end = slot_dt + timedelta(minutes=duration_minutes)
+            return not SlotOccupancy.is_free(db, doctor_id, slot_dt, slot_end)
             
         except Exception as e:
             print(f"Error in is_slot_booked: {e}")
@@ -1318,39 +1975,31 @@ class DoctorAvailability(BaseModel):
             return False
     
     @staticmethod
-    def book_slot(db, doctor_id, slot_datetime, appointment_id):
+    def book_slot(db, doctor_id, slot_datetime, appointment_id, duration_minutes=None):
         """Book a specific time slot for an appointment"""
+        duration_minutes = duration_minutes or DoctorAvailability.get_slot_duration(db, doctor_id)
+        
+        # Verify slot is not already booked
+        if DoctorAvailability.is_slot_booked(db, doctor_id, slot_datetime, duration_minutes):
+            return False, "Time slot is already booked"
+        
+        return DoctorAvailability.is_within_availability(db, doctor_id, slot_datetime, duration_minutes)
+    
+    @staticmethod
+    def is_within_availability(db, doctor_id, slot_datetime, duration_minutes=None):
+        """Check that a slot falls inside the doctor's weekly schedule (without checking bookings)
+        
+        With duration_minutes the whole slot must fit in one time range,
+        otherwise only its start is checked.
+        """
         try:
-            # Verify slot is not already booked
-            if DoctorAvailability.is_slot_booked(db, doctor_id, slot_datetime):
-                return False, "Time slot is already booked"
-            
-            # Verify the slot is within doctor's availability
             # Parse the slot datetime to extract date and time components
-            if isinstance(slot_datetime, str):
-                # Handle different datetime formats
-                slot_datetime_clean = slot_datetime.replace('Z', '').replace('T', ' ')
-                if '.' in slot_datetime_clean:
-                    slot_datetime_clean = slot_datetime_clean.split('.')[0]
-                
-                # Ensure consistent format
-                if 'T' in slot_datetime:
-                    date_part, time_part = slot_datetime.split('T')
-                    time_part = time_part.split('.')[0].split('Z')[0]  # Remove microseconds and timezone
-                else:
-                    date_part, time_part = slot_datetime_clean.split(' ')
-                
-                # Extract just HH:MM from the time part
-                time_components = time_part.split(':')
-                requested_time = f"{time_components[0]}:{time_components[1]}"
-            else:
-                # If it's already a datetime object
-                date_part = slot_datetime.strftime('%Y-%m-%d')
-                requested_time = slot_datetime.strftime('%H:%M')
+            slot_dt = DoctorAvailability.parse_slot_datetime(slot_datetime)
+            if not slot_dt:
+                return False, f"Invalid slot datetime: {slot_datetime}"
             
-            # Get day of week from date
-            date_obj = datetime.strptime(date_part, '%Y-%m-%d')
-            day_of_week = date_obj.strftime('%A').lower()
+            requested_time = slot_dt.strftime('%H:%M')
+            day_of_week = slot_dt.strftime('%A').lower()
             
             # Get doctor's availability for that day
             day_slots = DoctorAvailability.get_available_slots_for_day(db, doctor_id, day_of_week)
@@ -1377,7 +2026,8 @@ class DoctorAvailability(BaseModel):
                 requested_minutes = time_to_minutes(requested_time)
                 
                 # Check if requested time is within the range (inclusive start, exclusive end)
-                if start_minutes <= requested_minutes < end_minutes:
+                requested_end_minutes = requested_minutes + (duration_minutes or 1)
+                if start_minutes <= requested_minutes and requested_end_minutes <= end_minutes:
                     slot_in_range = True
                     break
             
@@ -1422,9 +2072,742 @@ class DoctorAvailability(BaseModel):
         availabilities = list(db[DoctorAvailability.collection_name].find())
         return DoctorAvailability.serialize_list(availabilities)
 
+class SlotReservation(BaseModel):
+    """Slot reservations guaranteeing active appointments of a doctor never overlap
+    
+    An appointment reserves every 15-minute cell it covers, so bookings of
+    different lengths still collide; slot_start is the start of the cell.
+    Booking reservations exist only while the appointment is pending or
+    confirmed. Hold reservations (kind 'hold') keep a slot for a patient
+    during checkout and carry an expires_at that the TTL index purges.
+    The unique (doctor_id, slot_start) index makes each cell claimable once.
+    """
+    collection_name = 'slot_reservations'
+    hold_minutes = int(os.getenv('SLOT_HOLD_MINUTES', '10'))
+    
+    @staticmethod
+    def create_indexes(db):
+        """Create the unique slot index, the appointment and patient hold lookup indexes and the hold TTL index"""
+        collection = db[SlotReservation.collection_name]
+        collection.create_index([('doctor_id', 1), ('slot_start', 1)], unique=True)
+        collection.create_index([('appointment_id', 1)])
+        # A new hold replaces the patient's previous one; only holds are indexed
+        collection.create_index(
+            [('patient_id', 1), ('kind', 1)],
+            partialFilterExpression={'kind': 'hold'}
+        )
+        collection.create_index([('expires_at', 1)], expireAfterSeconds=0)
+    
+    @staticmethod
+    def cell_documents(doctor_id, start, end, appointment_id):
+        """Build one reservation document per 15-minute cell covered by [start, end)"""
+        cell_length = timedelta(minutes=SlotOccupancy.cell_minutes)
+        cell_start = start.replace(minute=start.minute - start.minute % SlotOccupancy.cell_minutes, second=0)
+        documents = []
+        while cell_start < end:
+            documents.append({
+                'doctor_id': doctor_id,
+                'slot_start': cell_start,
+                'slot_end': cell_start + cell_length,
+                'appointment_id': ObjectId(appointment_id),
+                'kind': 'booking',
+                'created_at': datetime.utcnow()
+            })
+            cell_start += cell_length
+        return documents
+    
+    @staticmethod
+    def insert_cells(db, documents, doctor_id, slot_start, slot_end):
+        """Insert reservation cells, raising SlotAlreadyBookedError if any cell is taken"""
+        appointment_id = documents[0]['appointment_id']
+        
+        # Cells are claimed in time order, so of two overlapping bookings the
+        # one that wins the first shared cell wins them all
+        for attempt in range(2):
+            try:
+                db[SlotReservation.collection_name].insert_many(documents, ordered=True)
+                return
+            except BulkWriteError as e:
+                SlotReservation.release(db, appointment_id)
+                if any(error['code'] != 11000 for error in e.details['writeErrors']):
+                    raise
+            
+            # The TTL monitor only runs once a minute; clear holds that have
+            # already expired on this slot and try once more
+            result = db[SlotReservation.collection_name].delete_many({
+                'doctor_id': doctor_id,
+                'slot_start': {'$gte': documents[0]['slot_start'], '$lt': slot_end},
+                'kind': 'hold',
+                'expires_at': {'$lte': datetime.utcnow()}
+            })
+            if result.deleted_count == 0:
+                break
+        
+        raise SlotAlreadyBookedError(f"Slot {slot_start.isoformat()} is already booked for doctor {doctor_id}")
+    
+    @staticmethod
+    def claim(db, doctor_id, slot_start, slot_end, appointment_id):
+        """Reserve a slot for an appointment, raising SlotAlreadyBookedError if any part is taken"""
+        SlotReservation.insert_cells(
+            db, SlotReservation.cell_documents(doctor_id, slot_start, slot_end, appointment_id),
+            doctor_id, slot_start, slot_end
+        )
+    
+    @staticmethod
+    def hold(db, doctor_id, slot_start, slot_end, patient_id):
+        """Hold a slot for a patient for hold_minutes, raising SlotAlreadyBookedError if it is taken
+        
+        A patient keeps at most one hold; placing a new one releases the old.
+        Returns the hold id, which becomes the appointment id on conversion.
+        """
+        db[SlotReservation.collection_name].delete_many({'patient_id': patient_id, 'kind': 'hold'})
+        
+        hold_id = ObjectId()
+        expires_at = datetime.utcnow() + timedelta(minutes=SlotReservation.hold_minutes)
+        documents = SlotReservation.cell_documents(doctor_id, slot_start, slot_end, hold_id)
+        for document in documents:
+            document.update({'kind': 'hold', 'patient_id': patient_id, 'expires_at': expires_at})
+        
+        SlotReservation.insert_cells(db, documents, doctor_id, slot_start, slot_end)
+        return {'hold_id': str(hold_id), 'expires_at': expires_at}
+    
+    @staticmethod
+    def convert_hold(db, hold_id, patient_id, doctor_id, slot_start, slot_end):
+        """Turn a patient's unexpired hold on exactly this slot into a booking reservation
+        
+        Returns False, releasing the hold, if it expired or covers a different slot.
+        """
+        if not ObjectId.is_valid(hold_id):
+            return False
+        
+        cells = SlotReservation.cell_documents(doctor_id, slot_start, slot_end, hold_id)
+        result = db[SlotReservation.collection_name].update_many(
+            {
+                'appointment_id': ObjectId(hold_id),
+                'kind': 'hold',
+                'patient_id': patient_id,
+                'doctor_id': doctor_id,
+                'slot_start': {'$gte': cells[0]['slot_start'], '$lt': slot_end},
+                'expires_at': {'$gt': datetime.utcnow()}
+            },
+            {'$set': {'kind': 'booking'}, '$unset': {'expires_at': ''}}
+        )
+        if result.modified_count == len(cells):
+            return True
+        
+        # Drop the patient's hold, including any cells converted above
+        db[SlotReservation.collection_name].delete_many({'appointment_id': ObjectId(hold_id), 'patient_id': patient_id})
+        return False
+    
+    @staticmethod
+    def release_hold(db, hold_id, patient_id):
+        """Release a patient's hold before it expires"""
+        result = db[SlotReservation.collection_name].delete_many({
+            'appointment_id': ObjectId(hold_id),
+            'kind': 'hold',
+            'patient_id': patient_id
+        })
+        return result.deleted_count > 0
+    
+    @staticmethod
+    def find_hold_masks(db, doctor_id, dates):
+        """Get {date: mask} of cells under unexpired holds for a doctor on the given dates"""
+        dates = sorted(dates)
+        if not dates:
+            return {}
+        
+        first_day = datetime.strptime(dates[0], '%Y-%m-%d')
+        last_day = datetime.strptime(dates[-1], '%Y-%m-%d') + timedelta(days=1)
+        holds = db[SlotReservation.collection_name].find({
+            'doctor_id': doctor_id,
+            'slot_start': {'$gte': first_day, '$lt': last_day},
+            'kind': 'hold',
+            'expires_at': {'$gt': datetime.utcnow()}
+        }, {'slot_start': 1, 'slot_end': 1})
+        
+        masks = {}
+        for hold in holds:
+            for date, mask in SlotOccupancy.cell_masks(hold['slot_start'], hold['slot_end']).items():
+                masks[date] = masks.get(date, 0) | mask
+        return masks
+    
+    @staticmethod
+    def release(db, appointment_id, session=None):
+        """Release the slot held by an appointment"""
+        result = db[SlotReservation.collection_name].delete_many({'appointment_id': ObjectId(appointment_id)}, session=session)
+        return result.deleted_count > 0
+
+class SlotOccupancy(BaseModel):
+    """Per-doctor, per-day occupancy bitmaps of active appointments
+    
+    Each (doctor_id, date) document divides the UTC day into 96 cells of
+    15 minutes. Cells 0-47 (00:00-11:45) are stored in `am` and cells 48-95
+    in `pm`, so each half fits a 64-bit integer that $bit updates in place.
+    A set bit means an active appointment covers that cell. Appointment.create
+    and Appointment.update_status keep the bitmaps current; the
+    rebuild-slot-occupancy command regenerates them from the appointments.
+    Every change also sets `windows_dirty`, so the day's free windows are
+    rebuilt in the background (FreeWindow.refresh_dirty).
+    """
+    collection_name = 'slot_occupancy'
+    cell_minutes = 15
+    half_day_cells = 48
+    half_day_mask = (1 << 48) - 1
+    
+    @staticmethod
+    def create_indexes(db):
+        """Create the unique (doctor_id, date) index and the index of days with stale windows"""
+        collection = db[SlotOccupancy.collection_name]
+        collection.create_index([('doctor_id', 1), ('date', 1)], unique=True)
+        collection.create_index([('windows_dirty', 1)], partialFilterExpression={'windows_dirty': True})
+    
+    @staticmethod
+    def cell_masks(start, end):
+        """Get {date: mask} with a bit set for every 15-minute cell that [start, end) touches"""
+        cell_seconds = SlotOccupancy.cell_minutes * 60
+        masks = {}
+        current = start
+        while current < end:
+            day_start = datetime.combine(current.date(), datetime.min.time())
+            day_end = min(end, day_start + timedelta(days=1))
+            first_cell = int((current - day_start).total_seconds()) // cell_seconds
+            last_cell = -(-int((day_end - day_start).total_seconds()) // cell_seconds)
+            masks[day_start.strftime('%Y-%m-%d')] = ((1 << last_cell) - 1) ^ ((1 << first_cell) - 1)
+            current = day_end
+        return masks
+    
+    @staticmethod
+    def to_day_mask(document):
+        """Combine the am/pm halves of a bitmap document into one 96-bit mask"""
+        if not document:
+            return 0
+        return int(document.get('am', 0)) | (int(document.get('pm', 0)) << SlotOccupancy.half_day_cells)
+    
+    @staticmethod
+    def update_cells(db, doctor_id, start, end, occupied, session=None):
+        """Set (occupied=True) or clear the cells covered by [start, end) for a doctor"""
+        half = SlotOccupancy.half_day_mask
+        for date, mask in SlotOccupancy.cell_masks(start, end).items():
+            am, pm = mask & half, mask >> SlotOccupancy.half_day_cells
+            if occupied:
+                bits = {'am': {'or': Int64(am)}, 'pm': {'or': Int64(pm)}}
+            else:
+                bits = {'am': {'and': Int64(half ^ am)}, 'pm': {'and': Int64(half ^ pm)}}
+            db[SlotOccupancy.collection_name].update_one(
+                {'doctor_id': doctor_id, 'date': date},
+                {'$bit': bits, '$set': {'updated_at': datetime.utcnow(), 'windows_dirty': True}},
+                upsert=True,
+                session=session
+            )
+    
+    @staticmethod
+    def find_day_masks(db, doctor_id, dates, include_holds=False):
+        """Get {date: mask} of occupied cells for a doctor on the given dates in one query
+        
+        include_holds also marks cells under checkout holds, at the cost of a
+        second query.
+        """
+        dates = list(dates)
+        documents = db[SlotOccupancy.collection_name].find(
+            {'doctor_id': doctor_id, 'date': {'$in': dates}},
+            {'date': 1, 'am': 1, 'pm': 1}
+        )
+        masks = {document['date']: SlotOccupancy.to_day_mask(document) for document in documents}
+        
+        if include_holds:
+            for date, mask in SlotReservation.find_hold_masks(db, doctor_id, dates).items():
+                masks[date] = masks.get(date, 0) | mask
+        return masks
+    
+    @staticmethod
+    def is_free(db, doctor_id, start, end):
+        """Check that no active appointment or hold covers any part of [start, end)"""
+        masks = SlotOccupancy.cell_masks(start, end)
+        occupied = SlotOccupancy.find_day_masks(db, doctor_id, masks.keys(), include_holds=True)
+        return not any(occupied.get(date, 0) & mask for date, mask in masks.items())
+    
+    @staticmethod
+    def rebuild(db, doctor_id=None, batch_size=1000):
+        """Regenerate the bitmaps from active appointments, returning the number written
+        
+        Run it during a write freeze, or per doctor while that doctor takes
+        no bookings: the rebuilt masks replace the stored ones with $set, so
+        a booking or cancellation made while the appointments are being read
+        can be lost. Day bitmaps written after the rebuild started are never
+        deleted as stale.
+        """
+        # Taken before the scan, so bitmaps written meanwhile count as fresh
+        rebuilt_at = datetime.utcnow()
+        query = {
+            'status': {'$in': DoctorAvailability.active_statuses},
+            'appointment_start': {'$ne': None}
+        }
+        if doctor_id:
+            query['doctor_id'] = doctor_id
+        
+        day_masks = {}
+        appointments = db[Appointment.collection_name].find(
+            query, {'doctor_id': 1, 'appointment_start': 1, 'appointment_end': 1}
+        )
+        for appointment in appointments:
+            cells = SlotOccupancy.cell_masks(appointment['appointment_start'], appointment['appointment_end'])
+            for date, mask in cells.items():
+                key = (appointment['doctor_id'], date)
+                day_masks[key] = day_masks.get(key, 0) | mask
+        
+        collection = db[SlotOccupancy.collection_name]
+        updates = [
+            UpdateOne(
+                {'doctor_id': key[0], 'date': key[1]},
+                {'$set': {
+                    'am': Int64(mask & SlotOccupancy.half_day_mask),
+                    'pm': Int64(mask >> SlotOccupancy.half_day_cells),
+                    'updated_at': rebuilt_at
+                }},
+                upsert=True
+            )
+            for key, mask in day_masks.items()
+        ]
+        for i in range(0, len(updates), batch_size):
+            collection.bulk_write(updates[i:i + batch_size], ordered=False)
+        
+        # Bitmaps not touched by this rebuild have no active appointments left
+        stale_query = {'updated_at': {'$lt': rebuilt_at}}
+        if doctor_id:
+            stale_query['doctor_id'] = doctor_id
+        collection.delete_many(stale_query)
+        
+        return len(day_masks)
+
+class FreeWindow(BaseModel):
+    """Precomputed free windows of approved doctors for next-available searches
+    
+    A window is a run of consecutive open slots on one day, e.g. 09:00-11:30,
+    stored with the doctor's name and specialty so a search never has to
+    look up doctors one by one. Windows cover the next `horizon_days` days
+    and are rebuilt for a doctor when their schedule or profile change, and
+    in the background (refresh_dirty) for days whose bookings change. The refresh-free-windows command rebuilds all of them and moves
+    the horizon forward, so it should run daily.
+    
+    Concurrent bookings refresh the same days at once. Every refresh first
+    takes the next version of each day it rebuilds (one counter per doctor
+    and day in `free_window_versions`), then reads the schedule and
+    bitmaps, and keeps its windows only while that version is the day's
+    latest. Whichever refresh read last therefore wins, and a day never
+    ends up with two refreshes' windows.
+    """
+    collection_name = 'free_windows'
+    versions_collection_name = 'free_window_versions'
+    horizon_days = 28
+    
+    @staticmethod
+    def create_indexes(db):
+        """Create the search indexes and the per-doctor refresh index"""
+        collection = db[FreeWindow.collection_name]
+        collection.create_index([('specialty_key', 1), ('start', 1)])
+        collection.create_index([('start', 1)])
+        collection.create_index([('doctor_id', 1), ('date', 1)])
+    
+    @staticmethod
+    def horizon_dates():
+        """Get the dates (YYYY-MM-DD) covered by the window index, starting today"""
+        today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        return [(today + timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(FreeWindow.horizon_days)]
+    
+    @staticmethod
+    def build_windows(doctor, weekly_availability, occupied, dates, duration_minutes):
+        """Merge a doctor's open slots on the given dates into free windows"""
+        slot_length = timedelta(minutes=duration_minutes)
+        specialty = doctor.get('specialty') or ''
+        windows = []
+        
+        for day in DoctorAvailability.build_range_slots(weekly_availability, occupied, dates, duration_minutes):
+            current = None
+            for slot in day['available_slots']:
+                if not slot['is_available']:
+                    current = None
+                    continue
+                
+                slot_start = datetime.strptime(slot['datetime'], '%Y-%m-%dT%H:%M:%S')
+                if current and current['end'] == slot_start:
+                    current['end'] = slot_start + slot_length
+                else:
+                    current = {
+                        'doctor_id': doctor['id'],
+                        'doctor_name': doctor.get('name', 'Unknown'),
+                        'specialty': specialty,
+                        'specialty_key': specialty.strip().lower(),
+                        'date': day['date'],
+                        'start': slot_start,
+                        'end': slot_start + slot_length,
+                        'slot_minutes': duration_minutes
+                    }
+                    windows.append(current)
+        
+        return windows
+    
+    @staticmethod
+    def claim_days(db, doctor_id, dates):
+        """Take the next version of each of a doctor's days, returning {date: version}
+        
+        Must run before reading what the windows are built from.
+        """
+        days = db[FreeWindow.versions_collection_name].find_one_and_update(
+            {'_id': doctor_id},
+            {'$inc': {f"days.{date}": 1 for date in dates}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )['days']
+        
+        # Days that left the horizon are never refreshed again
+        today = FreeWindow.horizon_dates()[0]
+        expired = [date for date in days if date < today]
+        if expired:
+            db[FreeWindow.versions_collection_name].update_one(
+                {'_id': doctor_id}, {'$unset': {f"days.{date}": '' for date in expired}}
+            )
+        return {date: days[date] for date in dates}
+    
+    @staticmethod
+    def write_windows(db, claims, windows):
+        """Replace the windows of the claimed days, {doctor_id: {date: version}}
+        
+        Windows of earlier versions are deleted. A refresh that claimed a day
+        after this one may already have written it, in which case this
+        refresh's windows for that day are deleted again.
+        """
+        collection = db[FreeWindow.collection_name]
+        for window in windows:
+            window['version'] = claims[window['doctor_id']][window['date']]
+        
+        collection.delete_many({'$or': [
+            {'doctor_id': doctor_id, 'date': date, 'version': {'$not': {'$gte': version}}}
+            for doctor_id, versions in claims.items() for date, version in versions.items()
+        ]})
+        if windows:
+            collection.insert_many(windows)
+        
+        superseded = []
+        for latest in db[FreeWindow.versions_collection_name].find({'_id': {'$in': list(claims)}}):
+            for date, version in claims[latest['_id']].items():
+                if latest['days'].get(date, 0) > version:
+                    superseded.append({'doctor_id': latest['_id'], 'date': date, 'version': version})
+        if superseded:
+            collection.delete_many({'$or': superseded})
+    
+    @staticmethod
+    def refresh_doctor(db, doctor_id, dates=None):
+        """Rebuild a doctor's windows, for the given dates or the whole horizon"""
+        horizon = FreeWindow.horizon_dates()
+        dates = [date for date in dates if date in horizon] if dates is not None else horizon
+        if not dates:
+            return 0
+        
+        claims = {doctor_id: FreeWindow.claim_days(db, doctor_id, dates)}
+        doctor = Doctor.find_by_id(db, doctor_id) if ObjectId.is_valid(doctor_id) else None
+        if not doctor or doctor.get('verificationStatus') != 'approved':
+            # Claiming every day makes refreshes still in flight drop their windows
+            FreeWindow.claim_days(db, doctor_id, horizon)
+            db[FreeWindow.collection_name].delete_many({'doctor_id': doctor_id})
+            return 0
+        
+        availability = db[DoctorAvailability.collection_name].find_one({'doctor_id': doctor_id}) or {}
+        occupied = SlotOccupancy.find_day_masks(db, doctor_id, dates)
+        windows = FreeWindow.build_windows(
+            doctor, availability.get('weekly_availability', {}), occupied, dates,
+            DoctorAvailability.resolve_duration(db, availability)
+        )
+        
+        FreeWindow.write_windows(db, claims, windows)
+        return len(windows)
+    
+    @staticmethod
+    def refresh_dirty(db, limit=500):
+        """Rebuild the windows of days whose occupancy changed, returning the number of days
+        
+        Each day is claimed by clearing its flag before its windows are
+        rebuilt, so workers running this together never rebuild the same
+        change twice, and a booking made meanwhile flags the day again.
+        """
+        occupancy = db[SlotOccupancy.collection_name]
+        dirty = {}
+        for _ in range(limit):
+            day = occupancy.find_one_and_update(
+                {'windows_dirty': True}, {'$unset': {'windows_dirty': ''}}, projection={'doctor_id': 1, 'date': 1}
+            )
+            if not day:
+                break
+            dirty.setdefault(day['doctor_id'], []).append(day['date'])
+        
+        for doctor_id, dates in dirty.items():
+            try:
+                FreeWindow.refresh_doctor(db, doctor_id, dates)
+            except Exception:
+                # Flag the days again so the next run retries them
+                occupancy.update_many(
+                    {'doctor_id': doctor_id, 'date': {'$in': dates}}, {'$set': {'windows_dirty': True}}
+                )
+                raise
+        return sum(len(dates) for dates in dirty.values())
+    
+    @staticmethod
+    def refresh_all(db, batch_size=200):
+        """Rebuild the windows of every approved doctor, returning the number written"""
+        horizon = FreeWindow.horizon_dates()
+        collection = db[FreeWindow.collection_name]
+        doctors = Doctor.serialize_list(list(db[Doctor.collection_name].find(
+            {'verificationStatus': 'approved'}, {'name': 1, 'specialty': 1}
+        )))
+        
+        # Doctors without their own duration share the system default
+        default_duration = DoctorAvailability.resolve_duration(db, None)
+        
+        total = 0
+        for i in range(0, len(doctors), batch_size):
+            batch = doctors[i:i + batch_size]
+            doctor_ids = [doctor['id'] for doctor in batch]
+            claims = {doctor_id: FreeWindow.claim_days(db, doctor_id, horizon) for doctor_id in doctor_ids}
+            
+            # One query each for the batch's schedules and occupancy bitmaps
+            availabilities = {
+                availability['doctor_id']: availability
+                for availability in db[DoctorAvailability.collection_name].find({'doctor_id': {'$in': doctor_ids}})
+            }
+            occupied = {}
+            for document in db[SlotOccupancy.collection_name].find(
+                {'doctor_id': {'$in': doctor_ids}, 'date': {'$in': horizon}},
+                {'doctor_id': 1, 'date': 1, 'am': 1, 'pm': 1}
+            ):
+                occupied.setdefault(document['doctor_id'], {})[document['date']] = SlotOccupancy.to_day_mask(document)
+            
+            windows = []
+            for doctor in batch:
+                availability = availabilities.get(doctor['id'], {})
+                windows.extend(FreeWindow.build_windows(
+                    doctor, availability.get('weekly_availability', {}), occupied.get(doctor['id'], {}), horizon,
+                    availability.get('slot_duration_minutes') or default_duration
+                ))
+            
+            FreeWindow.write_windows(db, claims, windows)
+            total += len(windows)
+        
+        # Days before the horizon are over
+        collection.delete_many({'start': {'$lt': datetime.strptime(horizon[0], '%Y-%m-%d')}})
+        # Doctors who are no longer approved drop out; refresh_doctor rechecks in case they were just approved
+        approved = {doctor['id'] for doctor in doctors}
+        for doctor_id in collection.distinct('doctor_id'):
+            if doctor_id not in approved:
+                FreeWindow.refresh_doctor(db, doctor_id)
+        return total
+    
+    @staticmethod
+    def find_earliest(db, after, specialty=None, limit=5):
+        """Find the earliest open slot at or after a time for up to `limit` doctors
+        
+        Scans windows in start order and stops once no later window can beat
+        the slots already found.
+        """
+        # Windows never span days, so any window containing `after` starts within a day of it
+        query = {
+            'start': {'$gte': after - timedelta(days=1)},
+            'end': {'$gt': after}
+        }
+        if specialty:
+            query['specialty_key'] = specialty.strip().lower()
+        
+        best = {}
+        cursor = db[FreeWindow.collection_name].find(query, {'_id': 0}).sort('start', 1)
+        for window in cursor:
+            if len(best) >= limit:
+                cutoff = sorted(result['slot_start'] for result in best.values())[limit - 1]
+                if window['start'] >= cutoff:
+                    break
+            
+            # First slot boundary of the window at or after `after`
+            slot_length = timedelta(minutes=window.get('slot_minutes') or DoctorAvailability.slot_duration_minutes)
+            if window['start'] >= after:
+                slot_start = window['start']
+            else:
+                slot_start = window['start'] + (-(-(after - window['start']) // slot_length)) * slot_length
+            if slot_start + slot_length > window['end']:
+                continue
+            
+            current = best.get(window['doctor_id'])
+            if not current or slot_start < current['slot_start']:
+                best[window['doctor_id']] = {
+                    'doctor_id': window['doctor_id'],
+                    'doctor_name': window['doctor_name'],
+                    'specialty': window['specialty'],
+                    'slot_start': slot_start,
+                    'window_end': window['end']
+                }
+        cursor.close()
+        
+        results = sorted(best.values(), key=lambda result: result['slot_start'])[:limit]
+        return [{
+            'doctor_id': result['doctor_id'],
+            'doctor_name': result['doctor_name'],
+            'specialty': result['specialty'],
+            'slot_datetime': result['slot_start'].strftime('%Y-%m-%dT%H:%M:%S'),
+            'window_end': result['window_end'].strftime('%Y-%m-%dT%H:%M:%S')
+        } for result in results]
+
+class StatsCounter(BaseModel):
+    """Materialized per-doctor and per-patient counters behind the stats endpoints
+    
+    `counters` holds one document per doctor ('doctor:<id>') with
+    unique_patients, appointments by status and payments by payment_status
+    ({'count', 'amount'}), and one per patient ('patient:<id>') with
+    appointments by status. `doctor_patients` keeps an appointment count per
+    (doctor, patient) pair so unique_patients changes only when a pair
+    appears or disappears. Appointment and Payment writes update them
+    incrementally; rebuild() regenerates them from the source collections.
+    """
+    collection_name = 'counters'
+    pairs_collection_name = 'doctor_patients'
+    
+    @staticmethod
+    def doctor_key(doctor_id):
+        return f"doctor:{doctor_id}"
+    
+    @staticmethod
+    def patient_key(patient_id):
+        return f"patient:{patient_id}"
+    
+    @staticmethod
+    def increment(db, key, increments, session=None):
+        """Apply $inc increments to one counter document, creating it if needed"""
+        StatsCounter.collection(db, 'standard').update_one(
+            {'_id': key},
+            {'$inc': increments, '$set': {'updated_at': datetime.utcnow()}},
+            upsert=True,
+            session=session
+        )
+    
+    @staticmethod
+    def record_appointment(db, doctor_id, patient_id, status, delta=1):
+        """Count an appointment in (delta=1) or out of (delta=-1) the counters"""
+        StatsCounter.increment(db, StatsCounter.doctor_key(doctor_id), {f'appointments.{status}': delta})
+        StatsCounter.increment(db, StatsCounter.patient_key(patient_id), {f'appointments.{status}': delta})
+        
+        pairs = db[StatsCounter.pairs_collection_name].with_options(write_concern=CONCERN_PROFILES['standard'][0])
+        pair = pairs.find_one_and_update(
+            {'_id': f"{doctor_id}:{patient_id}"},
+            {'$inc': {'appointments': delta}, '$setOnInsert': {'doctor_id': doctor_id, 'patient_id': patient_id}},
+            upsert=delta > 0,
+            return_document=ReturnDocument.AFTER
+        )
+        if not pair:
+            return
+        if delta > 0 and pair['appointments'] == delta:
+            StatsCounter.increment(db, StatsCounter.doctor_key(doctor_id), {'unique_patients': 1})
+        elif delta < 0 and pair['appointments'] <= 0:
+            if pairs.delete_one({'_id': pair['_id'], 'appointments': {'$lte': 0}}).deleted_count:
+                StatsCounter.increment(db, StatsCounter.doctor_key(doctor_id), {'unique_patients': -1})
+    
+    @staticmethod
+    def move_appointment(db, doctor_id, patient_id, old_status, new_status, session=None):
+        """Move an appointment between status counters"""
+        if old_status == new_status:
+            return
+        increments = {f'appointments.{old_status}': -1, f'appointments.{new_status}': 1}
+        StatsCounter.increment(db, StatsCounter.doctor_key(doctor_id), increments, session=session)
+        StatsCounter.increment(db, StatsCounter.patient_key(patient_id), increments, session=session)
+    
+    @staticmethod
+    def record_payment(db, doctor_id, payment_status, amount, delta=1, session=None):
+        """Count a payment in (delta=1) or out of (delta=-1) its doctor's earnings"""
+        StatsCounter.increment(db, StatsCounter.doctor_key(doctor_id), {
+            f'payments.{payment_status}.count': delta,
+            f'payments.{payment_status}.amount': delta * (amount or 0)
+        }, session=session)
+    
+    @staticmethod
+    def move_payment(db, doctor_id, old_status, new_status, amount, session=None):
+        """Move a payment between payment_status counters"""
+        if old_status == new_status:
+            return
+        StatsCounter.record_payment(db, doctor_id, old_status, amount, delta=-1, session=session)
+        StatsCounter.record_payment(db, doctor_id, new_status, amount, session=session)
+    
+    @staticmethod
+    def get_doctor(db, doctor_id):
+        """Get a doctor's counters (empty counters if none were recorded)"""
+        counters = db[StatsCounter.collection_name].find_one({'_id': StatsCounter.doctor_key(doctor_id)}) or {}
+        return {
+            'unique_patients': counters.get('unique_patients', 0),
+            'appointments': counters.get('appointments', {}),
+            'payments': counters.get('payments', {})
+        }
+    
+    @staticmethod
+    def get_patient(db, patient_id):
+        """Get a patient's appointment counts by status"""
+        counters = db[StatsCounter.collection_name].find_one({'_id': StatsCounter.patient_key(patient_id)}) or {}
+        return counters.get('appointments', {})
+    
+    @staticmethod
+    def rebuild(db, batch_size=1000):
+        """Regenerate all counters from appointments and payments, returning the number written"""
+        rebuilt_at = datetime.utcnow()
+        counters = {}
+        
+        def counter(key):
+            return counters.setdefault(key, {'unique_patients': 0, 'appointments': {}, 'payments': {}})
+        
+        pair_counts = {}
+        for group in db[Appointment.collection_name].aggregate([
+            {'$group': {
+                '_id': {'doctor_id': '$doctor_id', 'patient_id': '$patient_id', 'status': '$status'},
+                'count': {'$sum': 1}
+            }}
+        ]):
+            doctor_id, patient_id, status = group['_id'].get('doctor_id'), group['_id'].get('patient_id'), group['_id'].get('status')
+            for key in (StatsCounter.doctor_key(doctor_id), StatsCounter.patient_key(patient_id)):
+                appointments = counter(key)['appointments']
+                appointments[str(status)] = appointments.get(str(status), 0) + group['count']
+            pair_counts[(doctor_id, patient_id)] = pair_counts.get((doctor_id, patient_id), 0) + group['count']
+        for doctor_id, patient_id in pair_counts:
+            counter(StatsCounter.doctor_key(doctor_id))['unique_patients'] += 1
+        
+        for group in db[Payment.collection_name].aggregate([
+            {'$group': {
+                '_id': {'doctor_id': '$doctor_id', 'payment_status': '$payment_status'},
+                'count': {'$sum': 1},
+                'amount': {'$sum': '$amount'}
+            }}
+        ]):
+            counter(StatsCounter.doctor_key(group['_id'].get('doctor_id')))['payments'][str(group['_id'].get('payment_status'))] = {
+                'count': group['count'],
+                'amount': group['amount']
+            }
+        
+        def write(collection, documents):
+            updates = [
+                ReplaceOne({'_id': _id}, {**document, 'updated_at': rebuilt_at}, upsert=True)
+                for _id, document in documents.items()
+            ]
+            for i in range(0, len(updates), batch_size):
+                collection.bulk_write(updates[i:i + batch_size], ordered=False)
+            # Documents not touched by this rebuild have nothing left to count
+            collection.delete_many({'updated_at': {'$lt': rebuilt_at}})
+        
+        write(db[StatsCounter.collection_name], counters)
+        write(db[StatsCounter.pairs_collection_name], {
+            f"{doctor_id}:{patient_id}": {'doctor_id': doctor_id, 'patient_id': patient_id, 'appointments': count}
+            for (doctor_id, patient_id), count in pair_counts.items()
+        })
+        return len(counters)
+
 class Payment(BaseModel):
     """Payment model for appointment payments"""
     collection_name = 'payments'
+    # Fields real-time payment updates carry
+    push_fields = {'doctor_id': 1, 'patient_id': 1, 'appointment_id': 1, 'status': 1, 'payment_status': 1, 'amount': 1}
+    views = {
+        'dashboard_row': {'payment_data': 0},
+        'full': None
+    }
     
     @staticmethod
     def create(db, data):
@@ -1451,50 +2834,95 @@ class Payment(BaseModel):
             'created_at': datetime.utcnow(),
             'updated_at': datetime.utcnow()
         }
-        result = db[Payment.collection_name].insert_one(payment)
+        result = Payment.collection(db, 'financial').insert_one(payment)
         payment['_id'] = result.inserted_id
+        
+        try:
+            StatsCounter.record_payment(db, payment['doctor_id'], payment['payment_status'], payment['amount'])
+        except Exception as e:
+            print(f"Error updating payment counters: {e}")
+        realtime.push_payment_update(payment)
         return Payment.serialize_id(payment)
     
     @staticmethod
-    def find_all(db, filters=None):
+    def find_all(db, filters=None, view='dashboard_row'):
         """Find all payments with optional filters"""
         query = filters or {}
-        payments = list(db[Payment.collection_name].find(query).sort('created_at', -1))
+        payments = list(db[Payment.collection_name].find(query, Payment.projection(view)).sort('created_at', -1))
         return Payment.serialize_list(payments)
     
     @staticmethod
-    def find_by_id(db, payment_id):
+    def find_by_id(db, payment_id, view='full'):
         """Find payment by ID"""
         try:
-            payment = db[Payment.collection_name].find_one({'_id': ObjectId(payment_id)})
+            payment = Payment.collection(db, 'financial').find_one({'_id': ObjectId(payment_id)}, Payment.projection(view))
             return Payment.serialize_id(payment) if payment else None
         except:
             return None
     
     @staticmethod
-    def find_by_appointment_id(db, appointment_id):
+    def find_by_appointment_id(db, appointment_id, view='full', session=None):
         """Find payment by appointment ID"""
-        payment = db[Payment.collection_name].find_one({'appointment_id': appointment_id})
+        payment = Payment.collection(db, 'financial').find_one(
+            {'appointment_id': appointment_id}, Payment.projection(view), session=session
+        )
         return Payment.serialize_id(payment) if payment else None
     
     @staticmethod
-    def find_by_patient_id(db, patient_id):
+    def find_by_patient_id(db, patient_id, view='dashboard_row'):
         """Find all payments for a specific patient"""
         payments = list(db[Payment.collection_name].find({
             'patient_id': patient_id
-        }).sort('created_at', -1))
+        }, Payment.projection(view)).sort('created_at', -1))
         return Payment.serialize_list(payments)
     
     @staticmethod
-    def find_by_doctor_id(db, doctor_id):
+    def find_by_doctor_id(db, doctor_id, view='dashboard_row'):
         """Find all payments for a specific doctor"""
         payments = list(db[Payment.collection_name].find({
             'doctor_id': doctor_id
-        }).sort('created_at', -1))
+        }, Payment.projection(view)).sort('created_at', -1))
         return Payment.serialize_list(payments)
     
     @staticmethod
-    def update_status(db, payment_id, status, transaction_id=None):
+    def find_doctor_history(db, doctor_id, limit=None, after=None):
+        """Find one page of a doctor's payments with their appointment details
+        
+        Joins the appointments in the same aggregation instead of one lookup
+        per payment. Returns (payments, next_cursor) like BaseModel.find_page.
+        """
+        limit = BaseModel.page_size(limit)
+        pipeline = [
+            {'$match': BaseModel.keyset_query({'doctor_id': doctor_id}, 'created_at', after)},
+            {'$sort': {'created_at': -1, '_id': -1}},
+            {'$limit': limit + 1},
+            {'$project': Payment.projection('dashboard_row')},
+            {'$addFields': {
+                'appointment_key': {'$convert': {'input': '$appointment_id', 'to': 'objectId', 'onError': None, 'onNull': None}}
+            }},
+            {'$lookup': {
+                'from': Appointment.collection_name,
+                'localField': 'appointment_key',
+                'foreignField': '_id',
+                'pipeline': [{'$project': {
+                    '_id': 0, 'appointment_date': 1, 'consultation_type': 1, 'status': 1,
+                    'reason': 1, 'patient_name': 1, 'patient_email': 1
+                }}],
+                'as': 'appointments'
+            }},
+            {'$addFields': {'appointment_details': {'$arrayElemAt': ['$appointments', 0]}}},
+            {'$project': {'appointment_key': 0, 'appointments': 0}}
+        ]
+        payments = list(db[Payment.collection_name].aggregate(pipeline))
+        
+        next_cursor = None
+        if len(payments) > limit:
+            payments = payments[:limit]
+            next_cursor = BaseModel.encode_cursor(payments[-1], 'created_at')
+        return Payment.serialize_list(payments), next_cursor
+    
+    @staticmethod
+    def update_status(db, payment_id, status, transaction_id=None, session=None):
         """Update payment status"""
         update_data = {
             'status': status,
@@ -1503,16 +2931,21 @@ class Payment(BaseModel):
         if transaction_id:
             update_data['transaction_id'] = transaction_id
             
-        result = db[Payment.collection_name].update_one(
+        payment = Payment.collection(db, 'financial').find_one_and_update(
             {'_id': ObjectId(payment_id)},
-            {'$set': update_data}
+            {'$set': update_data},
+            projection=Payment.push_fields,
+            return_document=ReturnDocument.AFTER,
+            session=session
         )
-        return result.modified_count > 0
+        if payment and session is None:
+            realtime.push_payment_update(payment)
+        return payment is not None
     
     @staticmethod
     def approve_payment(db, payment_id, admin_id, admin_name):
         """Admin approves payment for release to doctor"""
-        result = db[Payment.collection_name].update_one(
+        previous = Payment.collection(db, 'financial').find_one_and_update(
             {'_id': ObjectId(payment_id)},
             {
                 '$set': {
@@ -1522,14 +2955,21 @@ class Payment(BaseModel):
                     'approved_at': datetime.utcnow(),
                     'updated_at': datetime.utcnow()
                 }
-            }
+            },
+            projection=Payment.push_fields,
+            return_document=ReturnDocument.BEFORE
         )
-        return result.modified_count > 0
+        if not previous:
+            return False
+        
+        StatsCounter.move_payment(db, previous.get('doctor_id'), previous.get('payment_status'), 'approved', previous.get('amount'))
+        realtime.push_payment_update(dict(previous, payment_status='approved'))
+        return True
     
     @staticmethod
-    def release_payment(db, payment_id):
+    def release_payment(db, payment_id, session=None):
         """Release payment to doctor"""
-        result = db[Payment.collection_name].update_one(
+        previous = Payment.collection(db, 'financial').find_one_and_update(
             {'_id': ObjectId(payment_id)},
             {
                 '$set': {
@@ -1537,14 +2977,25 @@ class Payment(BaseModel):
                     'release_date': datetime.utcnow(),
                     'updated_at': datetime.utcnow()
                 }
-            }
+            },
+            projection=Payment.push_fields,
+            return_document=ReturnDocument.BEFORE,
+            session=session
         )
-        return result.modified_count > 0
+        if not previous:
+            return False
+        
+        StatsCounter.move_payment(
+            db, previous.get('doctor_id'), previous.get('payment_status'), 'released', previous.get('amount'), session=session
+        )
+        if session is None:
+            realtime.push_payment_update(dict(previous, payment_status='released'))
+        return True
     
     @staticmethod
-    def cancel_payment(db, payment_id, reason=''):
+    def cancel_payment(db, payment_id, reason='', session=None):
         """Cancel payment and initiate refund"""
-        result = db[Payment.collection_name].update_one(
+        previous = Payment.collection(db, 'financial').find_one_and_update(
             {'_id': ObjectId(payment_id)},
             {
                 '$set': {
@@ -1553,54 +3004,143 @@ class Payment(BaseModel):
                     'cancellation_reason': reason,
                     'updated_at': datetime.utcnow()
                 }
-            }
+            },
+            projection=Payment.push_fields,
+            return_document=ReturnDocument.BEFORE,
+            session=session
         )
-        return result.modified_count > 0
+        if not previous:
+            return False
+        
+        StatsCounter.move_payment(
+            db, previous.get('doctor_id'), previous.get('payment_status'), 'cancelled', previous.get('amount'), session=session
+        )
+        if session is None:
+            realtime.push_payment_update(dict(previous, payment_status='cancelled', status='refunded'))
+        return True
+    
+    @staticmethod
+    def confirm_checkout(db, payment_id, appointment_id, transaction_id):
+        """Mark a payment completed and confirm its appointment in one transaction
+        
+        Returns whether the appointment was confirmed.
+        """
+        def confirm(session):
+            payment = Payment.collection(db, 'financial').find_one_and_update(
+                {'_id': ObjectId(payment_id)},
+                {'$set': {'status': 'completed', 'transaction_id': transaction_id, 'updated_at': datetime.utcnow()}},
+                projection=Payment.push_fields,
+                return_document=ReturnDocument.AFTER,
+                session=session
+            )
+            confirmed = Appointment.update_status(db, appointment_id, 'confirmed', session=session)
+            return payment, confirmed, session is not None
+        
+        payment, confirmed, in_transaction = BaseModel.run_transaction(db, confirm)
+        if payment:
+            realtime.push_payment_update(payment)
+        # Without a transaction update_status has pushed the confirmation itself
+        if payment and confirmed and in_transaction:
+            realtime.push_appointment_update(
+                appointment_id, 'confirmed', payment['doctor_id'], payment['patient_id'], confirmed.get('appointment_start')
+            )
+        return confirmed
+    
+    @staticmethod
+    def settle_consultation(db, appointment, held_only=False):
+        """Complete an appointment and approve and release its payment in one transaction
+        
+        held_only skips payments that are no longer on hold. Returns
+        {'completed', 'payment', 'released'}; payment is the payment as it was
+        before settling, or None.
+        """
+        def settle(session):
+            outcome = {'completed': False, 'payment': None, 'released': False}
+            outcome['completed'] = Appointment.update_status(db, appointment['id'], 'completed', session=session)
+            if not outcome['completed']:
+                return outcome, session is not None
+            
+            payment = Payment.find_by_appointment_id(db, appointment['id'], session=session)
+            if payment and (not held_only or payment['payment_status'] == 'hold'):
+                outcome['payment'] = payment
+                Payment.approve_for_release(db, payment['id'], session=session)
+                outcome['released'] = Payment.release_payment(db, payment['id'], session=session)
+            return outcome, session is not None
+        
+        outcome, in_transaction = BaseModel.run_transaction(db, settle)
+        # Without a transaction the model methods have pushed already
+        if outcome['completed'] and in_transaction:
+            realtime.push_appointment_update(
+                appointment['id'], 'completed', appointment['doctor_id'], appointment['patient_id'], appointment.get('appointment_start')
+            )
+        if outcome['released'] and in_transaction:
+            realtime.push_payment_update(dict(outcome['payment'], payment_status='released'))
+        return outcome
+    
+    @staticmethod
+    def refund_missed_consultation(db, appointment, reason):
+        """Cancel the held payment of an appointment and cancel the appointment in one transaction
+        
+        Only completed payments still on hold are refunded. Returns the
+        payment as it was before the refund, or None if nothing was refunded.
+        """
+        def refund(session):
+            payment = Payment.find_by_appointment_id(db, appointment['id'], session=session)
+            if not payment or payment['status'] != 'completed' or payment['payment_status'] != 'hold':
+                return None, session is not None
+            if not Payment.cancel_payment(db, payment['id'], reason, session=session):
+                return None, session is not None
+            Appointment.update_status(db, appointment['id'], 'cancelled', session=session)
+            return payment, session is not None
+        
+        payment, in_transaction = BaseModel.run_transaction(db, refund)
+        # Without a transaction the model methods have pushed already
+        if payment and in_transaction:
+            realtime.push_appointment_update(
+                appointment['id'], 'cancelled', appointment['doctor_id'], appointment['patient_id'], appointment.get('appointment_start')
+            )
+            realtime.push_payment_update(dict(payment, payment_status='cancelled', status='refunded'))
+        return payment
     
     @staticmethod
     def get_payment_statistics(db):
         """Get payment statistics for admin dashboard"""
         try:
-            total_payments = db[Payment.collection_name].count_documents({})
-            completed_payments = db[Payment.collection_name].count_documents({'status': 'completed'})
-            pending_payments = db[Payment.collection_name].count_documents({'status': 'processing'})
-            failed_payments = db[Payment.collection_name].count_documents({'status': 'failed'})
-            
-            # Calculate total revenue
-            pipeline = [
-                {'$match': {'status': 'completed'}},
-                {'$group': {'_id': None, 'total_revenue': {'$sum': '$amount'}}}
-            ]
-            revenue_result = list(db[Payment.collection_name].aggregate(pipeline))
-            total_revenue = revenue_result[0]['total_revenue'] if revenue_result else 0
-            
-            # Calculate revenue this month
             start_of_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
             
-            monthly_pipeline = [
-                {'$match': {'status': 'completed', 'created_at': {'$gte': start_of_month}}},
-                {'$group': {'_id': None, 'monthly_revenue': {'$sum': '$amount'}}}
+            # Counts and revenue per status, plus this month's revenue, in one pass
+            pipeline = [
+                {'$project': {'status': 1, 'amount': 1, 'created_at': 1}},
+                {'$facet': {
+                    'by_status': [
+                        {'$group': {'_id': '$status', 'count': {'$sum': 1}, 'revenue': {'$sum': '$amount'}}}
+                    ],
+                    'monthly': [
+                        {'$match': {'status': 'completed', 'created_at': {'$gte': start_of_month}}},
+                        {'$group': {'_id': None, 'monthly_revenue': {'$sum': '$amount'}}}
+                    ]
+                }}
             ]
-            monthly_result = list(db[Payment.collection_name].aggregate(monthly_pipeline))
-            monthly_revenue = monthly_result[0]['monthly_revenue'] if monthly_result else 0
+            result = list(db[Payment.collection_name].aggregate(pipeline))[0]
+            by_status = {group['_id']: group for group in result['by_status']}
             
             return {
-                'total_payments': total_payments,
-                'completed_payments': completed_payments,
-                'pending_payments': pending_payments,
-                'failed_payments': failed_payments,
-                'total_revenue': total_revenue,
-                'monthly_revenue': monthly_revenue
+                'total_payments': sum(group['count'] for group in by_status.values()),
+                'completed_payments': by_status.get('completed', {}).get('count', 0),
+                'pending_payments': by_status.get('processing', {}).get('count', 0),
+                'failed_payments': by_status.get('failed', {}).get('count', 0),
+                'total_revenue': by_status.get('completed', {}).get('revenue', 0),
+                'monthly_revenue': result['monthly'][0]['monthly_revenue'] if result['monthly'] else 0
             }
         except Exception as e:
             print(f"Error getting payment statistics: {e}")
             return {}
     
     @staticmethod
-    def approve_for_release(db, payment_id):
+    def approve_for_release(db, payment_id, session=None):
         """Approve payment for release (sets admin_approved flag)"""
         try:
-            result = db[Payment.collection_name].update_one(
+            result = Payment.collection(db, 'financial').update_one(
                 {'_id': ObjectId(payment_id)},
                 {
                     '$set': {
@@ -1608,10 +3148,13 @@ class Payment(BaseModel):
                         'approved_at': datetime.utcnow(),
                         'updated_at': datetime.utcnow()
                     }
-                }
+                },
+                session=session
             )
             return result.modified_count > 0
         except Exception as e:
+            if session is not None:
+                raise
             print(f"Error approving payment for release: {e}")
             return False
 
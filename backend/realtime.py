@@ -0,0 +1,126 @@
+"""
+Real-time push channel for dashboards (Flask-SocketIO).
+
+Clients connect with their JWT (`auth: {token}`) and are placed in rooms:
+`user:<id>` for their own events and `admins` for admin accounts. The
+backend pushes
+    appointment_update  {appointment_id, status, doctor_id, patient_id}
+    payment_update      {payment_id, appointment_id, status, payment_status, doctor_id, patient_id}
+    notification        the notification document
+to the doctor, patient and admins an event concerns, so dashboards refresh
+when something changes instead of polling.
+
+The models announce changes with the push_* helpers, which publish them on
+the event bus (`events.py`). Every worker's bus delivers every change,
+whichever worker made it, to `push_event`, which emits to the clients
+connected to that worker. Emitting is a no-op until `init_realtime` has
+bound the server to the app (e.g. in CLI commands).
+"""
+
+import logging
+import jwt
+from flask import current_app, request
+from flask_socketio import SocketIO, join_room
+from events import event_bus
+
+logger = logging.getLogger(__name__)
+
+socketio = SocketIO()
+
+ADMIN_ROOM = 'admins'
+
+def user_room(user_id):
+    """Room of one doctor or patient"""
+    return f"user:{user_id}"
+
+def init_realtime(app, cors_origins):
+    """Bind the Socket.IO server to the app and emit bus events to its clients"""
+    socketio.init_app(app, cors_allowed_origins=cors_origins, async_mode='threading')
+    event_bus.subscribe(('appointments', 'payments', 'notifications'), push_event)
+
+@socketio.on('connect')
+def handle_connect(auth=None):
+    """Authenticate the connection with the same JWT as the REST API"""
+    token = (auth or {}).get('token') or request.args.get('token')
+    if not token:
+        return False
+    try:
+        user = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=['HS256'])
+    except jwt.InvalidTokenError:
+        return False
+
+    if user.get('role') == 'admin':
+        join_room(ADMIN_ROOM)
+    else:
+        join_room(user_room(user.get('id')))
+    logger.info(f"Realtime client connected: {user.get('id')} ({user.get('role')})")
+
+def push(event, data, user_ids=(), admins=False):
+    """Push an event to the given users and optionally to admins
+
+    Never raises: real-time delivery is best effort and clients resync on
+    reconnect.
+    """
+    if socketio.server is None:
+        return
+    rooms = [user_room(user_id) for user_id in user_ids if user_id and user_id != 'admin']
+    if admins or 'admin' in user_ids:
+        rooms.append(ADMIN_ROOM)
+    if not rooms:
+        return
+    try:
+        socketio.emit(event, data, to=rooms)
+    except Exception as e:
+        logger.warning(f"Failed to push {event}: {e}")
+
+def push_event(event):
+    """Emit a bus event to the clients of this worker it concerns"""
+    document = event['document']
+    if document is None:
+        # Deletes and resyncs: clients refetch on their next change or reconnect
+        return
+    fields = event['fields']
+    if event['collection'] == 'appointments':
+        if fields is None or 'status' in fields:
+            push('appointment_update', {
+                'appointment_id': event['id'],
+                'status': document.get('status'),
+                'doctor_id': document.get('doctor_id'),
+                'patient_id': document.get('patient_id')
+            }, user_ids=(document.get('doctor_id'), document.get('patient_id')), admins=True)
+    elif event['collection'] == 'payments':
+        if fields is None or {'status', 'payment_status'} & set(fields):
+            push('payment_update', {
+                'payment_id': event['id'],
+                'appointment_id': document.get('appointment_id'),
+                'status': document.get('status'),
+                'payment_status': document.get('payment_status'),
+                'doctor_id': document.get('doctor_id'),
+                'patient_id': document.get('patient_id')
+            }, user_ids=(document.get('doctor_id'), document.get('patient_id')), admins=True)
+    elif event['collection'] == 'notifications' and event['operation'] == 'insert':
+        data = dict(document, id=event['id'])
+        data['created_at'] = data['created_at'].isoformat() if data.get('created_at') else None
+        push('notification', data, user_ids=(document.get('userId'),))
+
+def push_appointment_update(appointment_id, status, doctor_id, patient_id, appointment_start=None):
+    """Announce that an appointment changed status
+
+    The start time rides along so subscribers such as the reminder scheduler
+    need not look the appointment up.
+    """
+    event_bus.publish('appointments', 'update', appointment_id, {
+        'status': status,
+        'doctor_id': doctor_id,
+        'patient_id': patient_id,
+        'appointment_start': appointment_start
+    }, fields=('status',))
+
+def push_payment_update(payment):
+    """Announce that a payment changed"""
+    event_bus.publish('payments', 'update', payment.get('id') or payment.get('_id'), payment)
+
+def push_notifications(notifications):
+    """Announce newly written notifications"""
+    for notification in notifications:
+        event_bus.publish('notifications', 'insert', notification.get('id') or notification.get('_id'), notification)
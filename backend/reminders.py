@@ -0,0 +1,282 @@
+"""
+Appointment reminders from an in-memory time wheel.
+
+Each worker keeps the confirmed appointments of the next REMINDER_HORIZON_HOURS
+in a hashed time wheel, keyed by when their reminder is due
+(REMINDER_LEAD_MINUTES before they start). The wheel is loaded with one
+query when the worker starts, extended with one query per half horizon, and
+kept current from the event bus: bookings, confirmations, cancellations and
+deletions schedule or drop entries without touching the database.
+
+A background thread advances the wheel every REMINDER_TICK_SECONDS and
+reminds the doctor and patient of each due appointment, as in-app
+notifications (pushed over Socket.IO like every notification) and, when
+REMINDER_CHANNELS includes email, by email. Every worker holds the same
+entries; `Appointment.claim_reminder` lets exactly one of them send each
+reminder, and marks it so a restart does not send it again.
+"""
+
+import os
+import threading
+import logging
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo.errors import PyMongoError
+from models import Appointment, Doctor, Patient, Notification
+from email_utils import send_appointment_reminder_email
+
+logger = logging.getLogger(__name__)
+
+REMINDER_LEAD_MINUTES = int(os.getenv('REMINDER_LEAD_MINUTES', '15'))
+REMINDER_TICK_SECONDS = int(os.getenv('REMINDER_TICK_SECONDS', '30'))
+REMINDER_HORIZON_HOURS = int(os.getenv('REMINDER_HORIZON_HOURS', '24'))
+REMINDER_CHANNELS = {channel.strip() for channel in os.getenv('REMINDER_CHANNELS', 'in_app').split(',') if channel.strip()}
+
+EPOCH = datetime(1970, 1, 1)
+
+# Appointment fields that decide whether and when a reminder is due
+SCHEDULE_FIELDS = {'status', 'appointment_start', 'appointment_date'}
+
+class TimeWheel:
+    """Hashed time wheel: O(1) schedule and cancel, one slot visited per tick
+
+    Entries hash into slots by their due tick; an entry due more than one
+    revolution ahead stays in its slot until the wheel reaches its tick.
+    Not thread-safe; the scheduler holds its lock around every call.
+    """
+
+    def __init__(self, tick_seconds, slot_count, now):
+        self.tick_seconds = tick_seconds
+        self.slots = [{} for _ in range(slot_count)]
+        self._slot_of = {}
+        self._tick = self.to_tick(now)
+
+    def to_tick(self, when):
+        return int((when - EPOCH).total_seconds() // self.tick_seconds)
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def __contains__(self, key):
+        return key in self._slot_of
+
+    def schedule(self, key, due, payload=None):
+        """Add or move an entry; one already due fires on the next advance"""
+        self.cancel(key)
+        tick = max(self.to_tick(due), self._tick + 1)
+        slot = tick % len(self.slots)
+        self.slots[slot][key] = (tick, payload)
+        self._slot_of[key] = slot
+
+    def cancel(self, key):
+        """Drop an entry; returns whether it was scheduled"""
+        slot = self._slot_of.pop(key, None)
+        if slot is None:
+            return False
+        del self.slots[slot][key]
+        return True
+
+    def advance(self, now):
+        """Move the wheel to now and return the (key, payload) entries that became due"""
+        target = self.to_tick(now)
+        due = []
+        # After a stall longer than one revolution, visiting each slot once is enough
+        steps = min(target - self._tick, len(self.slots))
+        for tick in range(self._tick + 1, self._tick + steps + 1):
+            slot = self.slots[tick % len(self.slots)]
+            for key, (entry_tick, payload) in list(slot.items()):
+                if entry_tick <= target:
+                    del slot[key]
+                    del self._slot_of[key]
+                    due.append((key, payload))
+        self._tick = max(self._tick, target)
+        return due
+
+class ReminderScheduler:
+    """Keeps the time wheel of upcoming reminders and sends them as they fall due"""
+
+    def __init__(self):
+        self.wheel = None
+        self._db = None
+        self._app = None
+        self._pid = None
+        self._loaded_until = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        # Guards the wheel, which the sweep thread and event subscribers share
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self, db, app=None):
+        """Load the wheel and start the sweep thread in this process; a no-op once started
+
+        app provides the context emails are sent in.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            now = datetime.utcnow()
+            self._pid = os.getpid()
+            self._db = db
+            self._app = app
+            self._stopped.clear()
+            self.wheel = TimeWheel(
+                REMINDER_TICK_SECONDS, REMINDER_HORIZON_HOURS * 3600 // REMINDER_TICK_SECONDS, now
+            )
+            self._loaded_until = now
+            try:
+                self._extend(now)
+            except PyMongoError as e:
+                logger.error(f"Reminder scheduler not started, cannot load appointments: {e}")
+                self._pid = None
+                return
+            self._thread = threading.Thread(target=self._run, name='reminders', daemon=True)
+            self._thread.start()
+            logger.info(f"Reminder scheduler tracking {len(self.wheel)} appointments in process {self._pid}")
+
+    def stop(self, timeout=None):
+        """Stop sweeping (tests and shutdown)"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+        self._pid = None
+
+    def track(self, appointment_id, appointment_start):
+        """Schedule the reminder of a confirmed appointment, if it starts within the loaded horizon"""
+        if appointment_start is None or appointment_start > self._loaded_until:
+            # Outside the horizon: the next extension loads it
+            self.untrack(appointment_id)
+            return
+        with self._lock:
+            self.wheel.schedule(str(appointment_id), appointment_start - timedelta(minutes=REMINDER_LEAD_MINUTES))
+
+    def untrack(self, appointment_id):
+        with self._lock:
+            self.wheel.cancel(str(appointment_id))
+
+    def handle_event(self, event):
+        """Keep the wheel current from appointment changes (event bus subscriber)"""
+        if self.wheel is None or self._pid != os.getpid():
+            return
+        if event['operation'] == 'resync':
+            self._reload()
+            return
+        if event['collection'] != Appointment.collection_name:
+            return
+        fields = event['fields']
+        if fields is not None and not SCHEDULE_FIELDS & set(fields):
+            # e.g. the reminder_sent mark a sweep just set
+            return
+
+        document = event['document']
+        if document is None or document.get('status') != 'confirmed':
+            self.untrack(event['id'])
+            return
+        appointment_start = document.get('appointment_start')
+        if appointment_start is None and 'appointment_start' not in document:
+            # Announcements from before the start time was included
+            appointment = self._db[Appointment.collection_name].find_one(
+                {'_id': ObjectId(event['id'])}, {'appointment_start': 1}
+            )
+            appointment_start = appointment.get('appointment_start') if appointment else None
+        self.track(event['id'], appointment_start)
+
+    def sweep(self, now=None):
+        """Send the reminders that are due; returns how many appointments were reminded"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            due = self.wheel.advance(now)
+        if self._loaded_until - now < timedelta(hours=REMINDER_HORIZON_HOURS) / 2:
+            self._extend(now)
+
+        claimed = []
+        for appointment_id, _ in due:
+            appointment = Appointment.claim_reminder(self._db, appointment_id, now)
+            if appointment:
+                claimed.append(appointment)
+        if not claimed:
+            return 0
+
+        if 'in_app' in REMINDER_CHANNELS:
+            Notification.create_many(self._db, [
+                notification for appointment in claimed for notification in self.notifications_for(appointment)
+            ])
+        if 'email' in REMINDER_CHANNELS:
+            for appointment in claimed:
+                self.email(appointment)
+        return len(claimed)
+
+    @staticmethod
+    def notifications_for(appointment):
+        """The reminders of one appointment, for its doctor and its patient"""
+        related = {'type': 'appointment', 'id': str(appointment['_id'])}
+        return [
+            {
+                'title': 'Consultation Starting Soon',
+                'message': f"Your consultation with {appointment.get('patient_name') or 'your patient'} "
+                           f"starts in {REMINDER_LEAD_MINUTES} minutes.",
+                'type': 'appointment_reminder',
+                'userId': appointment['doctor_id'],
+                'relatedTo': related
+            },
+            {
+                'title': 'Consultation Starting Soon',
+                'message': f"Your consultation with Dr. {appointment.get('doctor_name') or 'your doctor'} "
+                           f"starts in {REMINDER_LEAD_MINUTES} minutes.",
+                'type': 'appointment_reminder',
+                'userId': appointment['patient_id'],
+                'relatedTo': related
+            }
+        ]
+
+    def email(self, appointment):
+        """Email the reminder to the doctor and the patient"""
+        doctor = Doctor.find_by_id(self._db, appointment['doctor_id'])
+        patient = Patient.find_by_id(self._db, appointment['patient_id'])
+        consultation_type = appointment.get('consultation_type') or 'video'
+        if doctor and doctor.get('email'):
+            send_appointment_reminder_email(
+                doctor['email'], f"Dr. {doctor.get('name', '')}".strip(), appointment.get('patient_name') or 'your patient',
+                appointment.get('appointment_date'), consultation_type, REMINDER_LEAD_MINUTES
+            )
+        if patient and patient.get('email'):
+            send_appointment_reminder_email(
+                patient['email'], patient.get('name', ''), f"Dr. {appointment.get('doctor_name') or ''}".strip(),
+                appointment.get('appointment_date'), consultation_type, REMINDER_LEAD_MINUTES
+            )
+
+    def _extend(self, now):
+        """Load the appointments between the loaded horizon and now + REMINDER_HORIZON_HOURS"""
+        until = now + timedelta(hours=REMINDER_HORIZON_HOURS)
+        appointments = Appointment.find_reminders_due(self._db, max(self._loaded_until, now), until)
+        with self._lock:
+            self._loaded_until = until
+            for appointment in appointments:
+                self.wheel.schedule(
+                    str(appointment['_id']), appointment['appointment_start'] - timedelta(minutes=REMINDER_LEAD_MINUTES)
+                )
+
+    def _reload(self):
+        """Rebuild the wheel after the event bus may have missed changes"""
+        now = datetime.utcnow()
+        with self._lock:
+            self.wheel = TimeWheel(REMINDER_TICK_SECONDS, len(self.wheel.slots), now)
+            self._loaded_until = now
+        self._extend(now)
+
+    def _run(self):
+        while not self._stopped.wait(REMINDER_TICK_SECONDS):
+            try:
+                if self._app is not None:
+                    with self._app.app_context():
+                        self.sweep()
+                else:
+                    self.sweep()
+            except Exception as e:
+                logger.error(f"Reminder sweep failed: {e}")
+
+# One scheduler per process, started with the first request
+reminder_scheduler = ReminderScheduler()
@@ -2,11 +2,13 @@ from flask import Blueprint, request, jsonify, current_app, send_file
 from functools import wraps
 import jwt
 from datetime import datetime, timedelta
-from models import Admin, Doctor, Patient, Complaint, Notification, Appointment, User, SystemSettings, DoctorAvailability, Payment
+from models import Admin, Doctor, Patient, Complaint, Notification, Appointment, User, SystemSettings, DoctorAvailability, Payment, SlotReservation, SlotOccupancy, FreeWindow, StatsCounter, Identity, SlotAlreadyBookedError, EmailAlreadyRegisteredError
 from bson import ObjectId
 from email_utils import send_otp_email, send_welcome_email, send_doctor_otp_email, send_doctor_profile_submission_email, send_doctor_verification_result_email, send_password_reset_email, send_password_reset_confirmation_email
 import logging
 import os
+from cache import dashboard_cache
+from events import event_bus
 from werkzeug.utils import secure_filename
 
 logger = logging.getLogger(__name__)
@@ -43,6 +45,17 @@ def get_db():
     """Get database instance from current app"""
     return current_app.config['DATABASE']
 
+def get_page_args():
+    """Get the limit and after cursor query parameters of a paginated list"""
+    return request.args.get('limit', type=int), request.args.get('after')
+
+def paginated_response(items, next_cursor):
+    """Return a JSON array page with the next page cursor in the X-Next-Cursor header"""
+    response = jsonify(items)
+    if next_cursor:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response, 200
+
 def token_required(f):
     """Decorator to require authentication token with improved error handling"""
     @wraps(f)
@@ -158,13 +171,11 @@ def register():
         
         db = get_db()
         
-        # Check if patient already exists
-        existing_patient = Patient.find_by_email(db, data['email'])
-        if existing_patient:
+        # Create new patient; the email must not belong to any account yet
+        try:
+            patient = Patient.create(db, data)
+        except EmailAlreadyRegisteredError:
             return jsonify({'error': 'Email already registered'}), 400
-        
-        # Create new patient
-        patient = Patient.create(db, data)
         logger.info(f"Patient created with ID: {patient['id']}")
         
         # Send OTP email
@@ -208,13 +219,11 @@ def register_doctor_auth():
         
         db = get_db()
         
-        # Check if doctor already exists
-        existing_doctor = Doctor.find_by_email(db, data['email'])
-        if existing_doctor:
+        # Create new doctor registration; the email must not belong to any account yet
+        try:
+            doctor = Doctor.create_registration(db, data)
+        except EmailAlreadyRegisteredError:
             return jsonify({'error': 'Email already registered'}), 400
-        
-        # Create new doctor registration
-        doctor = Doctor.create_registration(db, data)
         logger.info(f"Doctor created with ID: {doctor['id']}")
         
         # Send OTP email
@@ -349,64 +358,61 @@ def login():
     
     db = get_db()
     
-    # Check if user is admin
-    admin = Admin.find_by_email(db, email)
-    if admin and Admin.verify_password(admin, password):
-        token = Admin.generate_token(admin)
+    # One indexed lookup finds the account and its home collection
+    role, user = Identity.find_user(db, email)
+    
+    if role == 'admin' and Admin.verify_password(user, password):
+        token = Admin.generate_token(user)
         return jsonify({
             'access_token': token,
             'user': {
-                'id': admin['id'],
-                'email': admin['email'],
-                'name': admin['name'],
+                'id': user['id'],
+                'email': user['email'],
+                'name': user['name'],
                 'role': 'admin'
             }
         }), 200
     
-    # Check if user is doctor
-    doctor = Doctor.find_by_email(db, email)
-    if doctor:
+    if role == 'doctor':
         # Check if email is verified
-        if not doctor.get('emailVerified', False):
+        if not user.get('emailVerified', False):
             return jsonify({
                 'message': 'Please verify your email before logging in',
                 'requires_verification': True,
-                'user_id': doctor['id']
+                'user_id': user['id']
             }), 403
         
-        if Doctor.verify_password(doctor, password):
-            token = Doctor.generate_token(doctor)
+        if Doctor.verify_password(user, password):
+            token = Doctor.generate_token(user)
             return jsonify({
                 'access_token': token,
                 'user': {
-                    'id': doctor['id'],
-                    'email': doctor['email'],
-                    'name': doctor.get('name', 'Doctor'),
+                    'id': user['id'],
+                    'email': user['email'],
+                    'name': user.get('name', 'Doctor'),
                     'role': 'doctor',
-                    'verificationStatus': doctor.get('verificationStatus', 'pending'),
-                    'profileCompleted': doctor.get('profileCompleted', False)
+                    'verificationStatus': user.get('verificationStatus', 'pending'),
+                    'profileCompleted': user.get('profileCompleted', False)
                 }
             }), 200
     
-    # Check if user is patient
-    patient = Patient.find_by_email(db, email)
-    if patient:
+    if role == 'patient':
         # Check if email is verified
-        if not patient.get('emailVerified', False):
+        if not user.get('emailVerified', False):
             return jsonify({
                 'message': 'Please verify your email before logging in',
                 'requires_verification': True,
-                'user_id': patient['id']
+                'user_id': user['id']
             }), 403
         
-        if Patient.verify_password(patient, password):
-            token = Patient.generate_token(patient)
+        if Patient.verify_password(user, password):
+            token = Patient.generate_token(user)
             return jsonify({
                 'access_token': token,
                 'user': {
-                    'id': patient['id'],
-                    'email': patient['email'],
-                    'name': patient['name'],
+                    'id': user['id'],
+                    'email': user['email'],
+                    'name': user['name'],
                     'role': 'patient'
                 }
             }), 200
@@ -425,23 +431,12 @@ def forgot_password():
         
         db = get_db()
         user = None
-        user_role = None
         
         # Check which type of user this email belongs to
-        admin = Admin.find_by_email(db, email)
-        if admin:
-            user = Admin.create_password_reset_request(db, email)
-            user_role = 'admin'
-        else:
-            doctor = Doctor.find_by_email(db, email)
-            if doctor:
-                user = Doctor.create_password_reset_request(db, email)
-                user_role = 'doctor'
-            else:
-                patient = Patient.find_by_email(db, email)
-                if patient:
-                    user = Patient.create_password_reset_request(db, email)
-                    user_role = 'patient'
+        identity = Identity.find_by_email(db, email)
+        user_role = identity['role'] if identity else None
+        if user_role:
+            user = Identity.home_model(user_role).create_password_reset_request(db, email)
         
         # Always return success message for security (don't reveal if email exists)
         response_data = {
@@ -489,24 +484,15 @@ def reset_password():
         user_role = None
         user_name = None
         
-        # Try to reset password for each user type
-        admin = Admin.verify_reset_token(db, email, reset_token)
-        if admin:
-            reset_successful = Admin.reset_password(db, email, reset_token, new_password)
-            user_role = 'admin'
-            user_name = admin.get('name', '')
-        else:
-            doctor = Doctor.verify_reset_token(db, email, reset_token)
-            if doctor:
-                reset_successful = Doctor.reset_password(db, email, reset_token, new_password)
-                user_role = 'doctor'
-                user_name = doctor.get('name', '')
-            else:
-                patient = Patient.verify_reset_token(db, email, reset_token)
-                if patient:
-                    reset_successful = Patient.reset_password(db, email, reset_token, new_password)
-                    user_role = 'patient'
-                    user_name = patient.get('name', '')
+        # Reset the password in the collection the email belongs to
+        identity = Identity.find_by_email(db, email)
+        if identity:
+            model = Identity.home_model(identity['role'])
+            user = model.verify_reset_token(db, email, reset_token)
+            if user:
+                reset_successful = model.reset_password(db, email, reset_token, new_password)
+                user_role = identity['role']
+                user_name = user.get('name', '')
         
         if not reset_successful:
             return jsonify({'error': 'Invalid or expired reset token'}), 400
@@ -543,24 +529,14 @@ def verify_reset_token():
         
         db = get_db()
         
-        # Check if token is valid for any user type
+        # Check the token in the collection the email belongs to
         valid_token = False
         user_role = None
         
-        admin = Admin.verify_reset_token(db, email, reset_token)
-        if admin:
+        identity = Identity.find_by_email(db, email)
+        if identity and Identity.home_model(identity['role']).verify_reset_token(db, email, reset_token):
             valid_token = True
-            user_role = 'admin'
-        else:
-            doctor = Doctor.verify_reset_token(db, email, reset_token)
-            if doctor:
-                valid_token = True
-                user_role = 'doctor'
-            else:
-                patient = Patient.verify_reset_token(db, email, reset_token)
-                if patient:
-                    valid_token = True
-                    user_role = 'patient'
+            user_role = identity['role']
         
         if valid_token:
             return jsonify({
@@ -612,26 +588,18 @@ def refresh_token():
                 
             db = get_db()
             
-            # Verify user still exists and is active
-            if user_role == 'admin':
-                user = Admin.find_by_email(db, user_email)
-            elif user_role == 'doctor':
-                user = Doctor.find_by_email(db, user_email)
-            elif user_role == 'patient':
-                user = Patient.find_by_email(db, user_email)
-            else:
+            if user_role not in ('admin', 'doctor', 'patient'):
                 return jsonify({'error': 'Invalid user role'}), 401
             
+            # Verify user still exists in the role's collection
+            model = Identity.home_model(user_role)
+            user = model.find_by_email(db, user_email)
+            
             if not user:
                 return jsonify({'error': 'User no longer exists'}), 401
             
             # Generate new token
-            if user_role == 'admin':
-                new_token = Admin.generate_token(user)
-            elif user_role == 'doctor':
-                new_token = Doctor.generate_token(user)
-            elif user_role == 'patient':
-                new_token = Patient.generate_token(user)
+            new_token = model.generate_token(user)
             
             return jsonify({
                 'access_token': new_token,
@@ -676,29 +644,9 @@ def get_dashboard_stats(current_user):
     """Get admin dashboard statistics"""
     db = get_db()
     
-    # Get counts from database
-    total_doctors = db.doctors.count_documents({})
-    pending_verifications = db.doctors.count_documents({'verificationStatus': 'admin_pending'})
-    total_patients = db.patients.count_documents({})
-    total_complaints = db.complaints.count_documents({})
-    new_complaints = db.complaints.count_documents({'status': 'new'})
-    high_priority_complaints = db.complaints.count_documents({'severity': 'high', 'status': {'$ne': 'resolved'}})
-    
-    # Calculate monthly stats
-    current_month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    new_doctors_this_month = db.doctors.count_documents({'created_at': {'$gte': current_month_start}})
-    new_patients_this_month = db.patients.count_documents({'created_at': {'$gte': current_month_start}})
-    
-    return jsonify({
-        'totalDoctors': total_doctors,
-        'pendingVerifications': pending_verifications,
-        'totalPatients': total_patients,
-        'totalComplaints': total_complaints,
-        'newComplaints': new_complaints,
-        'newDoctorsThisMonth': new_doctors_this_month,
-        'newPatientsThisMonth': new_patients_this_month,
-        'highPriorityComplaints': high_priority_complaints
-    }), 200
+    # Concurrent dashboard loads share one aggregation for a few seconds
+    stats = dashboard_cache.get_or_compute('admin_dashboard_stats', lambda: Admin.get_dashboard_stats(db))
+    return jsonify(stats), 200
 
 @admin_bp.route('/profile', methods=['GET'])
 @admin_required
@@ -716,10 +664,14 @@ def get_admin_profile(current_user):
 @admin_bp.route('/doctors', methods=['GET'])
 @admin_required
 def get_all_doctors(current_user):
-    """Get all doctors for admin"""
+    """Get all doctors for admin, one page at a time"""
     db = get_db()
-    doctors = Doctor.find_all(db)
-    return jsonify(doctors), 200
+    limit, after = get_page_args()
+    try:
+        doctors, next_cursor = Doctor.find_page(db, limit=limit, after=after, view='dashboard_row')
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    return paginated_response(doctors, next_cursor)
 
 @admin_bp.route('/doctors/pending-verification', methods=['GET'])
 @admin_required
@@ -835,10 +787,14 @@ def update_patient_status(current_user, patient_id):
 @admin_bp.route('/complaints', methods=['GET'])
 @admin_required
 def get_all_complaints(current_user):
-    """Get all complaints"""
+    """Get all complaints, one page at a time"""
     db = get_db()
-    complaints = Complaint.find_all(db)
-    return jsonify(complaints), 200
+    limit, after = get_page_args()
+    try:
+        complaints, next_cursor = Complaint.find_page(db, limit=limit, after=after)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    return paginated_response(complaints, next_cursor)
 
 @admin_bp.route('/complaints/<complaint_id>/status', methods=['PUT'])
 @admin_required
@@ -875,10 +831,14 @@ def update_complaint_status(current_user, complaint_id):
 @admin_bp.route('/users', methods=['GET'])
 @admin_required
 def get_all_users(current_user):
-    """Get all users across all roles"""
+    """Get all users across all roles, one page at a time"""
     db = get_db()
-    users = User.find_all_users(db)
-    return jsonify(users), 200
+    limit, after = get_page_args()
+    try:
+        users, next_cursor = User.find_users_page(db, limit=limit, after=after)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    return paginated_response(users, next_cursor)
 
 @admin_bp.route('/users/<user_id>/status', methods=['PUT'])
 @admin_required
@@ -902,36 +862,36 @@ def update_user_status(current_user, user_id):
 @admin_bp.route('/appointments', methods=['GET'])
 @admin_required
 def get_all_appointments(current_user):
-    """Get all appointments"""
+    """Get all appointments, one page at a time"""
     db = get_db()
-    appointments = Appointment.find_all(db)
-    return jsonify(appointments), 200
+    limit, after = get_page_args()
+    try:
+        appointments, next_cursor = Appointment.find_page(db, limit=limit, after=after, view='dashboard_row')
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    return paginated_response(appointments, next_cursor)
 
 # Consultation History Management Routes
 @admin_bp.route('/consultations/history', methods=['GET'])
 @admin_required
 def get_consultation_history(current_user):
-    """Get consultation history with payment status for admin dashboard"""
+    """Get consultation history with payment status for admin dashboard, one page at a time"""
     try:
         db = get_db()
         
-        # Get all appointments with extended information
-        appointments = list(db.appointments.find({}).sort('created_at', -1))
+        # Get one page of appointments joined with payment, doctor and patient
+        limit, after = get_page_args()
+        appointments, next_cursor = Appointment.find_consultation_history(db, limit=limit, after=after)
         consultation_history = []
         
         for appointment in appointments:
-            # Get payment information for this appointment
-            payment = Payment.find_by_appointment_id(db, appointment.get('_id'))
-            
-            # Get doctor and patient names
-            doctor = Doctor.find_by_id(db, appointment.get('doctor_id'))
-            patient = Patient.find_by_id(db, appointment.get('patient_id'))
+            payment = appointment.get('payment')
             
             # Format consultation data
             consultation = {
-                'id': str(appointment['_id']),
-                'patientName': patient.get('name', 'Unknown Patient') if patient else 'Unknown Patient',
-                'doctorName': doctor.get('name', 'Unknown Doctor') if doctor else 'Unknown Doctor',
+                'id': appointment['id'],
+                'patientName': appointment.get('patient_name') or 'Unknown Patient',
+                'doctorName': appointment.get('doctor_name') or 'Unknown Doctor',
                 'appointmentDate': appointment.get('appointment_date', '').split('T')[0] if appointment.get('appointment_date') else '',
                 'appointmentTime': appointment.get('appointment_date', '').split('T')[1][:5] if appointment.get('appointment_date') and 'T' in appointment.get('appointment_date', '') else '',
                 'consultationType': appointment.get('consultation_type', 'video'),
@@ -947,8 +907,10 @@ def get_consultation_history(current_user):
             
             consultation_history.append(consultation)
         
-        return jsonify(consultation_history), 200
+        return paginated_response(consultation_history, next_cursor)
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Get consultation history error: {str(e)}")
         return jsonify({'error': 'Failed to get consultation history'}), 500
@@ -957,10 +919,14 @@ def get_consultation_history(current_user):
 @admin_bp.route('/notifications', methods=['GET'])
 @admin_required
 def get_notifications(current_user):
-    """Get admin notifications"""
+    """Get admin notifications, one page at a time"""
     db = get_db()
-    notifications = Notification.find_admin_notifications(db)
-    return jsonify(notifications), 200
+    limit, after = get_page_args()
+    try:
+        notifications, next_cursor = Notification.find_page(db, {'userId': 'admin'}, limit=limit, after=after)
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+    return paginated_response(notifications, next_cursor)
 
 @admin_bp.route('/notifications/<notification_id>/read', methods=['PUT'])
 @admin_required
@@ -1014,7 +980,7 @@ def update_system_settings(current_user):
 def get_approved_doctors():
     """Get all approved doctors (public endpoint)"""
     db = get_db()
-    doctors = Doctor.find_all(db, filters={'verificationStatus': 'approved'})
+    doctors = Doctor.find_all(db, filters={'verificationStatus': 'approved'}, view='public_card')
     return jsonify(doctors), 200
 
 @api_bp.route('/doctors/<doctor_id>/availability', methods=['GET'])
@@ -1064,7 +1030,8 @@ def get_doctor_availability_for_date(doctor_id, date):
         available_slots = DoctorAvailability.get_available_slots_for_date(
             db, 
             doctor_id, 
-            date
+            date,
+            request.args.get('consultation_type')
         )
         
         return jsonify({
@@ -1083,6 +1050,96 @@ def get_doctor_availability_for_date(doctor_id, date):
         logger.error(f"Get doctor availability for date error: {str(e)}")
         return jsonify({'error': 'Failed to fetch availability for the specified date'}), 500
 
+# Longest window the availability calendar returns in one response
+MAX_AVAILABILITY_RANGE_DAYS = 28
+
+@api_bp.route('/doctors/<doctor_id>/availability/range', methods=['GET'])
+def get_doctor_availability_for_range(doctor_id):
+    """Get doctor's time slots for every date in a window (public endpoint)
+    
+    Query params: from and to (YYYY-MM-DD, inclusive), defaulting to the
+    next 14 days starting today, and consultation_type for the slot length.
+    """
+    try:
+        db = get_db()
+        
+        # Verify doctor exists and is approved
+        doctor = Doctor.find_by_id(db, doctor_id)
+        if not doctor or doctor.get('verificationStatus') != 'approved':
+            return jsonify({'error': 'Doctor not found or not available'}), 404
+        
+        try:
+            from_date = request.args.get('from') or datetime.utcnow().strftime('%Y-%m-%d')
+            from_obj = datetime.strptime(from_date, '%Y-%m-%d')
+            to_date = request.args.get('to') or (from_obj + timedelta(days=13)).strftime('%Y-%m-%d')
+            to_obj = datetime.strptime(to_date, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'error': 'Invalid date format. Use YYYY-MM-DD'}), 400
+        
+        if to_obj < from_obj:
+            return jsonify({'error': "'to' must not be before 'from'"}), 400
+        
+        if (to_obj - from_obj).days + 1 > MAX_AVAILABILITY_RANGE_DAYS:
+            return jsonify({'error': f'Date range cannot exceed {MAX_AVAILABILITY_RANGE_DAYS} days'}), 400
+        
+        days = DoctorAvailability.get_available_slots_for_range(
+            db, doctor_id, from_date, to_date, request.args.get('consultation_type')
+        )
+        for day in days:
+            day['total_slots'] = len(day['available_slots'])
+            day['available_count'] = len([slot for slot in day['available_slots'] if slot['is_available']])
+            day['booked_count'] = day['total_slots'] - day['available_count']
+        
+        return jsonify({
+            'doctor_id': doctor_id,
+            'doctor_name': doctor.get('name', 'Unknown'),
+            'from': from_date,
+            'to': to_date,
+            'days': days,
+            'success': True
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Get doctor availability for range error: {str(e)}")
+        return jsonify({'error': 'Failed to fetch availability for the specified range'}), 500
+
+@api_bp.route('/doctors/next-available', methods=['GET'])
+def get_next_available_doctors():
+    """Find the doctors with the earliest open slots (public endpoint)
+    
+    Query params: specialty (optional), after (ISO datetime, defaults to
+    now) and limit (default 5, max 20).
+    """
+    try:
+        db = get_db()
+        
+        specialty = request.args.get('specialty')
+        after = datetime.utcnow()
+        if request.args.get('after'):
+            requested_after = DoctorAvailability.parse_slot_datetime(request.args.get('after'))
+            if not requested_after:
+                return jsonify({'error': 'Invalid after datetime. Use YYYY-MM-DDTHH:MM:SS'}), 400
+            after = max(after, requested_after)
+        
+        try:
+            limit = min(max(int(request.args.get('limit', 5)), 1), 20)
+        except ValueError:
+            return jsonify({'error': 'limit must be a number'}), 400
+        
+        results = FreeWindow.find_earliest(db, after, specialty=specialty, limit=limit)
+        
+        return jsonify({
+            'specialty': specialty,
+            'after': after.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': results,
+            'total': len(results),
+            'success': True
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Get next available doctors error: {str(e)}")
+        return jsonify({'error': 'Failed to search for available doctors'}), 500
+
 @api_bp.route('/doctors/<doctor_id>/slots/check', methods=['POST'])
 def check_slot_availability(doctor_id):
     """Check if a specific time slot is available for booking"""
@@ -1100,9 +1157,15 @@ def check_slot_availability(doctor_id):
         if not doctor or doctor.get('verificationStatus') != 'approved':
             return jsonify({'error': 'Doctor not found or not available'}), 404
         
-        # Check slot availability
-        is_available, message = DoctorAvailability.book_slot(db, doctor_id, slot_datetime, None)
-        is_booked = DoctorAvailability.is_slot_booked(db, doctor_id, slot_datetime)
+        # Check slot availability against the occupancy bitmap, then the schedule
+        duration_minutes = DoctorAvailability.get_slot_duration(db, doctor_id, data.get('consultation_type'))
+        is_booked = DoctorAvailability.is_slot_booked(db, doctor_id, slot_datetime, duration_minutes)
+        if is_booked:
+            is_available, message = False, "Time slot is already booked"
+        else:
+            is_available, message = DoctorAvailability.is_within_availability(
+                db, doctor_id, slot_datetime, duration_minutes
+            )
         
         return jsonify({
             'doctor_id': doctor_id,
@@ -1132,22 +1195,19 @@ def debug_doctor_slots(doctor_id):
         
         db = get_db()
         
-        # Get all appointments for this doctor on this date
-        day_start = f"{date}T00:00:00"
-        day_end = f"{date}T23:59:59"
+        # Get doctor availability for this date
+        date_obj = datetime.strptime(date, '%Y-%m-%d')
+        day_of_week = date_obj.strftime('%A').lower()
         
+        # Get all appointments for this doctor on this date
         appointments = list(db[Appointment.collection_name].find({
             'doctor_id': doctor_id,
-            'appointment_date': {
-                '$gte': day_start,
-                '$lte': day_end
+            'appointment_start': {
+                '$gte': date_obj,
+                '$lt': date_obj + timedelta(days=1)
             }
         }))
         
-        # Get doctor availability for this date
-        date_obj = datetime.strptime(date, '%Y-%m-%d')
-        day_of_week = date_obj.strftime('%A').lower()
-        
         day_slots = DoctorAvailability.get_available_slots_for_day(db, doctor_id, day_of_week)
         available_slots = DoctorAvailability.get_available_slots_for_date(db, doctor_id, date)
         
@@ -1189,26 +1249,26 @@ def validate_slot_booking(doctor_id):
             return jsonify({'error': 'Doctor not found or not available'}), 404
         
         # Detailed slot validation
-        is_booked = DoctorAvailability.is_slot_booked(db, doctor_id, slot_datetime)
-        is_available, availability_message = DoctorAvailability.book_slot(db, doctor_id, slot_datetime, None)
+        duration_minutes = DoctorAvailability.get_slot_duration(db, doctor_id, data.get('consultation_type'))
+        is_booked = DoctorAvailability.is_slot_booked(db, doctor_id, slot_datetime, duration_minutes)
+        if is_booked:
+            is_available, availability_message = False, "Time slot is already booked"
+        else:
+            is_available, availability_message = DoctorAvailability.is_within_availability(
+                db, doctor_id, slot_datetime, duration_minutes
+            )
         
         # Get all appointments for this doctor to help debug
         try:
             # Parse the requested slot datetime
-            if isinstance(slot_datetime, str):
-                slot_datetime_clean = slot_datetime.replace('Z', '').replace('T', ' ')
-                if '.' in slot_datetime_clean:
-                    slot_datetime_clean = slot_datetime_clean.split('.')[0]
-                if len(slot_datetime_clean.split(' ')[1].split(':')) == 2:
-                    slot_datetime_clean += ':00'
-                slot_dt = datetime.fromisoformat(slot_datetime_clean)
-            
+            slot_dt = DoctorAvailability.parse_slot_datetime(slot_datetime)
+            day_start = datetime.combine(slot_dt.date(), datetime.min.time())
             date_only = slot_dt.date().isoformat()
             
             # Get all appointments for this doctor on this date
             all_appointments = list(db[Appointment.collection_name].find({
                 'doctor_id': doctor_id,
-                'appointment_date': {'$regex': f'^{date_only}'}
+                'appointment_start': {'$gte': day_start, '$lt': day_start + timedelta(days=1)}
             }))
             
             confirmed_appointments = [apt for apt in all_appointments if apt.get('status') in ['confirmed', 'pending']]
@@ -1271,13 +1331,11 @@ def register_doctor():
         
         db = get_db()
         
-        # Check if doctor already exists
-        existing_doctor = Doctor.find_by_email(db, data['email'])
-        if existing_doctor:
+        # Create new doctor; the email must not belong to any account yet
+        try:
+            doctor = Doctor.create(db, data)
+        except EmailAlreadyRegisteredError:
             return jsonify({'error': 'Email already registered'}), 400
-        
-        # Create new doctor
-        doctor = Doctor.create(db, data)
         logger.info(f"Doctor created with ID: {doctor['id']}")
         
         # Send OTP email
@@ -1617,6 +1675,12 @@ def update_doctor_profile(current_user):
         )
         
         if result.modified_count > 0:
+            event_bus.publish(Doctor.collection_name, 'update', current_user['id'], update_data, fields=update_data)
+            
+            # Search results carry the doctor's name and specialty
+            if 'specialty' in update_data or 'name' in update_data:
+                FreeWindow.refresh_doctor(db, current_user['id'])
+            
             # Get updated doctor data
             updated_doctor = Doctor.find_by_id(db, current_user['id'])
             
@@ -1777,14 +1841,18 @@ def get_doctor_patients(current_user):
     try:
         db = get_db()
         
-        # Get patients who have had appointments with this doctor
-        patients = Appointment.get_doctor_patients(db, current_user['id'])
+        # Get one page of patients who have had appointments with this doctor
+        limit, after = get_page_args()
+        patients, next_cursor = Appointment.get_doctor_patients(db, current_user['id'], limit=limit, after=after)
         
         return jsonify({
             'patients': patients,
-            'count': len(patients)
+            'count': len(patients),
+            'next_cursor': next_cursor
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Get doctor patients error: {str(e)}")
         return jsonify({'error': 'Failed to fetch patients'}), 500
@@ -1864,13 +1932,23 @@ def update_doctor_availability(current_user):
         if not data or 'weekly_availability' not in data:
             return jsonify({'error': 'Weekly availability data is required'}), 400
         
+        # Optional slot lengths: a default and per consultation type
+        durations = {
+            'slot_duration_minutes': data.get('slot_duration_minutes'),
+            'consultation_durations': data.get('consultation_durations')
+        }
+        is_valid, message = DoctorAvailability.validate_durations(durations)
+        if not is_valid:
+            return jsonify({'error': message}), 400
+        
         db = get_db()
         
         # Update availability for this doctor
         availability = DoctorAvailability.create_or_update(
             db, 
             current_user['id'], 
-            data['weekly_availability']
+            data['weekly_availability'],
+            durations
         )
         
         if not availability:
@@ -2090,14 +2168,21 @@ def get_patient_appointments(current_user):
     try:
         db = get_db()
         
-        # Get appointments for this patient
-        appointments = Appointment.find_by_patient_id(db, current_user['id'])
+        # Get one page of appointments for this patient, latest slot first
+        limit, after = get_page_args()
+        appointments, next_cursor = Appointment.find_page(
+            db, {'patient_id': current_user['id']}, limit=limit, after=after,
+            sort_field='appointment_start', view='dashboard_row'
+        )
         
         return jsonify({
             'appointments': appointments,
-            'count': len(appointments)
+            'count': len(appointments),
+            'next_cursor': next_cursor
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Get patient appointments error: {str(e)}")
         return jsonify({'error': 'Failed to fetch appointments'}), 500
@@ -2113,7 +2198,7 @@ def get_upcoming_appointments(current_user):
         appointments = list(db[Appointment.collection_name].find({
             'patient_id': current_user['id'],
             'status': {'$in': ['pending', 'confirmed']}
-        }).sort('appointment_date', 1))
+        }).sort('appointment_start', 1))
         
         appointments = Appointment.serialize_list(appointments)
         
@@ -2137,7 +2222,7 @@ def get_completed_appointments(current_user):
         appointments = list(db[Appointment.collection_name].find({
             'patient_id': current_user['id'],
             'status': 'completed'
-        }).sort('appointment_date', -1))
+        }).sort('appointment_start', -1))
         
         appointments = Appointment.serialize_list(appointments)
         
@@ -2157,13 +2242,13 @@ def get_patient_stats(current_user):
     try:
         db = get_db()
         
-        # Get all appointments for this patient
-        appointments = Appointment.find_by_patient_id(db, current_user['id'])
+        # Read the patient's appointment counts by status
+        counts = StatsCounter.get_patient(db, current_user['id'])
         
         # Calculate stats
-        upcoming = len([apt for apt in appointments if apt['status'] in ['pending', 'confirmed']])
-        completed = len([apt for apt in appointments if apt['status'] == 'completed'])
-        total = len(appointments)
+        upcoming = counts.get('pending', 0) + counts.get('confirmed', 0)
+        completed = counts.get('completed', 0)
+        total = sum(counts.values())
         
         # Get patient profile for completion calculation
         patient = Patient.find_by_id(db, current_user['id'])
@@ -2270,6 +2355,73 @@ def update_patient_profile(current_user):
         logger.error(f"Update patient profile error: {str(e)}")
         return jsonify({'error': 'Profile update failed. Please try again.'}), 500
 
+# Slot Hold Routes
+@api_bp.route('/appointments/holds', methods=['POST'])
+@token_required
+def create_slot_hold(current_user):
+    """Hold a slot for the current patient while they complete checkout"""
+    try:
+        data = request.get_json() or {}
+        
+        for field in ['doctor_id', 'appointment_date']:
+            if not data.get(field):
+                return jsonify({'error': f'{field} is required'}), 400
+        
+        db = get_db()
+        
+        # Verify doctor exists and is approved
+        doctor = Doctor.find_by_id(db, data['doctor_id'])
+        if not doctor or doctor.get('verificationStatus') != 'approved':
+            return jsonify({'error': 'Doctor not found or not available'}), 404
+        
+        duration_minutes = DoctorAvailability.get_slot_duration(
+            db, data['doctor_id'], data.get('consultation_type', 'video')
+        )
+        is_within, message = DoctorAvailability.is_within_availability(
+            db, data['doctor_id'], data['appointment_date'], duration_minutes
+        )
+        if not is_within:
+            return jsonify({'error': 'Selected time slot is not available', 'message': message}), 400
+        
+        slot_start, slot_end = Appointment.canonical_times(data['appointment_date'], duration_minutes)
+        try:
+            hold = SlotReservation.hold(db, data['doctor_id'], slot_start, slot_end, current_user['id'])
+        except SlotAlreadyBookedError:
+            return jsonify({
+                'error': 'Selected time slot is already booked',
+                'message': 'Another patient has already booked or is booking this time slot',
+                'success': False
+            }), 409
+        
+        return jsonify({
+            'hold_id': hold['hold_id'],
+            'expires_at': hold['expires_at'].isoformat(),
+            'hold_minutes': SlotReservation.hold_minutes,
+            'success': True
+        }), 201
+        
+    except Exception as e:
+        logger.error(f"Create slot hold error: {str(e)}")
+        return jsonify({'error': 'Failed to hold time slot'}), 500
+
+@api_bp.route('/appointments/holds/<hold_id>', methods=['DELETE'])
+@token_required
+def release_slot_hold(current_user, hold_id):
+    """Release the current patient's slot hold"""
+    try:
+        if not ObjectId.is_valid(hold_id):
+            return jsonify({'error': 'Invalid hold ID'}), 400
+        
+        db = get_db()
+        if not SlotReservation.release_hold(db, hold_id, current_user['id']):
+            return jsonify({'error': 'Hold not found or already expired'}), 404
+        
+        return jsonify({'message': 'Slot hold released', 'success': True}), 200
+        
+    except Exception as e:
+        logger.error(f"Release slot hold error: {str(e)}")
+        return jsonify({'error': 'Failed to release slot hold'}), 500
+
 # Public Appointment Creation Route
 @api_bp.route('/appointments', methods=['POST'])
 @token_required
@@ -2307,27 +2459,23 @@ def create_appointment(current_user):
         # Log the validation process for debugging
         logger.info(f"Validating appointment slot for doctor {data['doctor_id']} at {appointment_datetime}")
         
-        # Check if the requested slot is available
+        # Check that the whole slot is within the doctor's schedule; whether
+        # it is free is decided atomically by the slot reservation on insert
         try:
-            is_slot_available, availability_message = DoctorAvailability.book_slot(
+            duration_minutes = DoctorAvailability.get_slot_duration(
+                db, data['doctor_id'], data.get('consultation_type', 'video')
+            )
+            is_slot_available, availability_message = DoctorAvailability.is_within_availability(
                 db, 
                 data['doctor_id'], 
-                appointment_datetime, 
-                None  # No appointment ID yet since we're just checking
+                appointment_datetime,
+                duration_minutes
             )
             logger.info(f"Slot availability check completed: {is_slot_available}, message: {availability_message}")
         except Exception as e:
             logger.error(f"Error checking slot availability: {e}")
             return jsonify({'error': 'Failed to validate appointment slot'}), 500
         
-        # Check if slot is already booked
-        try:
-            is_slot_booked = DoctorAvailability.is_slot_booked(db, data['doctor_id'], appointment_datetime)
-            logger.info(f"Slot booking check completed: {is_slot_booked}")
-        except Exception as e:
-            logger.error(f"Error checking if slot is booked: {e}")
-            return jsonify({'error': 'Failed to check slot booking status'}), 500
-        
         if not is_slot_available:
             return jsonify({
                 'error': 'Selected time slot is not available',
@@ -2335,43 +2483,10 @@ def create_appointment(current_user):
                 'suggestion': 'Please choose a different time slot within doctor\'s availability hours',
                 'validation_details': {
                     'within_availability': is_slot_available,
-                    'slot_booked': is_slot_booked,
                     'datetime_checked': appointment_datetime
                 }
             }), 400
         
-        if is_slot_booked:
-            # Get details about conflicting appointments for better error message
-            try:
-                slot_dt = datetime.fromisoformat(appointment_datetime.replace('Z', '').replace('T', ' ').split('.')[0])
-                date_only = slot_dt.date().isoformat()
-                
-                conflicting_appointments = list(db[Appointment.collection_name].find({
-                    'doctor_id': data['doctor_id'],
-                    'status': {'$in': ['confirmed', 'pending']},
-                    'appointment_date': {'$regex': f'^{date_only}'}
-                }))
-                
-                logger.info(f"Found {len(conflicting_appointments)} conflicting appointments for doctor {data['doctor_id']} on {date_only}")
-                for apt in conflicting_appointments:
-                    logger.info(f"  - Appointment {apt.get('_id')}: {apt.get('appointment_date')} (status: {apt.get('status')})")
-                
-            except Exception as e:
-                logger.error(f"Error getting conflicting appointment details: {e}")
-                conflicting_appointments = []
-            
-            return jsonify({
-                'error': 'Selected time slot is already booked',
-                'message': 'Another patient has already booked this time slot',
-                'suggestion': 'Please refresh the page and choose a different time slot',
-                'validation_details': {
-                    'within_availability': is_slot_available,
-                    'slot_booked': is_slot_booked,
-                    'datetime_checked': appointment_datetime,
-                    'conflicting_appointments_count': len(conflicting_appointments)
-                }
-            }), 409  # Conflict status code
-        
         # Create appointment data with enhanced fields
         appointment_data = {
             'patient_id': current_user['id'],
@@ -2381,6 +2496,7 @@ def create_appointment(current_user):
             'doctor_id': data['doctor_id'],
             'doctor_name': data.get('doctor_name', doctor.get('name', 'Unknown')),
             'appointment_date': data['appointment_date'],
+            'duration_minutes': duration_minutes,
             'status': 'pending',
             'reason': data['reason'],
             'notes': data.get('notes', ''),
@@ -2389,33 +2505,31 @@ def create_appointment(current_user):
             'preferred_language': data.get('preferred_language', 'English'),
             'medical_history': data.get('medical_history', ''),
             'report_complaint': data.get('report_complaint', ''),
-            'video_call_id': data.get('video_call_id', f"call_{int(datetime.utcnow().timestamp())}")
+            'video_call_id': data.get('video_call_id', f"call_{int(datetime.utcnow().timestamp())}"),
+            'hold_id': data.get('hold_id')  # Slot hold placed at checkout, if any
         }
         
         logger.info(f"Creating appointment with data: {appointment_data}")
         
-        # Create the appointment
+        # Create the appointment; the slot reservation insert succeeds only once
         try:
             appointment = Appointment.create(db, appointment_data)
             logger.info(f"Appointment created successfully with ID: {appointment.get('id')}")
+        except SlotAlreadyBookedError:
+            return jsonify({
+                'error': 'Selected time slot is already booked',
+                'message': 'Another patient has already booked this time slot',
+                'suggestion': 'Please refresh the page and choose a different time slot',
+                'validation_details': {
+                    'within_availability': is_slot_available,
+                    'slot_booked': True,
+                    'datetime_checked': appointment_datetime
+                }
+            }), 409  # Conflict status code
         except Exception as e:
             logger.error(f"Error creating appointment: {e}")
             return jsonify({'error': 'Failed to create appointment'}), 500
         
-        # Double-check that the slot is still available (race condition protection)
-        final_slot_check = DoctorAvailability.is_slot_booked(db, data['doctor_id'], appointment_datetime)
-        if final_slot_check:
-            # Another appointment was created in the meantime, delete this one
-            try:
-                db.appointments.delete_one({'_id': ObjectId(appointment['id'])})
-            except Exception as delete_error:
-                logger.error(f"Error deleting conflicted appointment: {delete_error}")
-            return jsonify({
-                'error': 'Time slot was booked by another patient while processing your request',
-                'message': 'Please refresh the page and choose a different time slot',
-                'suggestion': 'Try booking again with a different time'
-            }), 409
-        
         # Create notification for the doctor
         try:
             notification_message = f"Patient {appointment_data['patient_name']} has requested an appointment"
@@ -2535,6 +2649,8 @@ def test_create_appointment(current_user):
         try:
             appointment = Appointment.create(db, appointment_data)
             logger.info(f"Appointment model creation test passed: {appointment.get('id')}")
+        except SlotAlreadyBookedError:
+            return jsonify({'error': 'Selected time slot is already booked'}), 409
         except Exception as create_error:
             logger.error(f"Appointment model creation failed: {create_error}")
             return jsonify({'error': 'Failed to create appointment in database'}), 500
@@ -2619,11 +2735,8 @@ def process_payment(current_user):
         success = True  # In real implementation, check with payment gateway
         
         if success:
-            # Update payment status to completed
-            Payment.update_status(db, payment['id'], 'completed', transaction_id)
-            
-            # Update appointment status to confirmed (payment received)
-            Appointment.update_status(db, data['appointment_id'], 'confirmed')
+            # Complete the payment and confirm the appointment (payment received) together
+            Payment.confirm_checkout(db, payment['id'], data['appointment_id'], transaction_id)
             
             # Create notification for doctor
             Notification.create(db, {
@@ -2748,10 +2861,13 @@ def get_all_payments(current_user):
         if payment_status:
             filters['payment_status'] = payment_status
         
-        payments = Payment.find_all(db, filters)
+        limit, after = get_page_args()
+        payments, next_cursor = Payment.find_page(db, filters, limit=limit, after=after, view='dashboard_row')
         
-        return jsonify({'payments': payments}), 200
+        return jsonify({'payments': payments, 'next_cursor': next_cursor}), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Get all payments error: {str(e)}")
         return jsonify({'error': 'Failed to get payments'}), 500
@@ -2896,7 +3012,7 @@ def get_payment_statistics(current_user):
     """Get payment statistics for admin dashboard"""
     try:
         db = get_db()
-        stats = Payment.get_payment_statistics(db)
+        stats = dashboard_cache.get_or_compute('payment_statistics', lambda: Payment.get_payment_statistics(db))
         
         return jsonify(stats), 200
         
@@ -2973,15 +3089,13 @@ def complete_consultation(current_user, appointment_id):
         if appointment['doctor_id'] != current_user['id']:
             return jsonify({'error': 'Access denied'}), 403
         
-        # Update appointment status to completed
-        success = Appointment.update_status(db, appointment_id, 'completed')
+        # Complete the appointment and approve and release its payment as one unit
+        outcome = Payment.settle_consultation(db, appointment)
         
-        if success:
-            # Get payment for this appointment
-            payment = Payment.find_by_appointment_id(db, appointment_id)
-            
-            # Create notification for patient
-            Notification.create(db, {
+        if outcome['completed']:
+            payment = outcome['payment']
+            release_success = outcome['released']
+            notifications = [{
                 'title': 'Consultation Completed',
                 'message': f"Your consultation with Dr. {appointment.get('doctor_name')} has been completed",
                 'type': 'appointment',
@@ -2990,14 +3104,11 @@ def complete_consultation(current_user, appointment_id):
                     'type': 'appointment',
                     'id': appointment_id
                 }
-            })
+            }]
             
             if payment:
-                # Auto-approve payment for release (since consultation is completed)
-                Payment.approve_for_release(db, payment['id'])
-                
-                # Create notification for admin about auto-approved payment
-                Notification.create(db, {
+                # Payment auto-approved for release (since consultation is completed)
+                notifications.append({
                     'title': 'Payment Auto-Approved',
                     'message': f"Payment of ₹{payment['amount']} auto-approved for release after consultation completion",
                     'type': 'payment',
@@ -3008,12 +3119,9 @@ def complete_consultation(current_user, appointment_id):
                     }
                 })
                 
-                # Auto-release payment to doctor (immediate release after consultation completion)
-                release_success = Payment.release_payment(db, payment['id'])
-                
                 if release_success:
-                    # Create notification for doctor
-                    Notification.create(db, {
+                    # Payment released to doctor (immediate release after consultation completion)
+                    notifications.append({
                         'title': 'Payment Released',
                         'message': f"Payment of ₹{payment['amount']} has been automatically released to your account",
                         'type': 'payment',
@@ -3023,9 +3131,7 @@ def complete_consultation(current_user, appointment_id):
                             'id': payment['id']
                         }
                     })
-                    
-                    # Create notification for patient
-                    Notification.create(db, {
+                    notifications.append({
                         'title': 'Payment Processed',
                         'message': f"Payment of ₹{payment['amount']} has been released to Dr. {appointment.get('doctor_name')}",
                         'type': 'payment',
@@ -3036,6 +3142,8 @@ def complete_consultation(current_user, appointment_id):
                         }
                     })
             
+            Notification.create_many(db, notifications)
+            
             return jsonify({
                 'message': 'Consultation marked as completed',
                 'payment_status': 'released' if payment and release_success else 'pending'
@@ -3061,79 +3169,72 @@ def process_overdue_payments(current_user):
         
         overdue_appointments = Appointment.find_overdue_appointments(db, cutoff_time)
         processed_payments = []
+        notifications = []
         
         for appointment in overdue_appointments:
             # Check if doctor joined the consultation
             doctor_joined = appointment.get('doctor_joined', False)
             
             if not doctor_joined:
-                # Doctor didn't join, initiate refund
-                payment = Payment.find_by_appointment_id(db, appointment['id'])
-                if payment and payment['status'] == 'completed' and payment['payment_status'] == 'hold':
-                    # Cancel payment and initiate refund
-                    refund_success = Payment.cancel_payment(db, payment['id'], 'Doctor did not join consultation')
+                # Doctor didn't join: refund the held payment and cancel the appointment together
+                payment = Payment.refund_missed_consultation(db, appointment, 'Doctor did not join consultation')
+                
+                if payment:
+                    # Notify patient
+                    notifications.append({
+                        'title': 'Consultation Cancelled - Refund Initiated',
+                        'message': f"Dr. {appointment.get('doctor_name')} did not join the consultation. Full refund of ₹{payment['amount']} has been initiated.",
+                        'type': 'refund',
+                        'userId': appointment['patient_id'],
+                        'relatedTo': {
+                            'type': 'payment',
+                            'id': payment['id']
+                        }
+                    })
                     
-                    if refund_success:
-                        # Update appointment status
-                        Appointment.update_status(db, appointment['id'], 'cancelled')
-                        
-                        # Notify patient
-                        Notification.create(db, {
-                            'title': 'Consultation Cancelled - Refund Initiated',
-                            'message': f"Dr. {appointment.get('doctor_name')} did not join the consultation. Full refund of ₹{payment['amount']} has been initiated.",
-                            'type': 'refund',
-                            'userId': appointment['patient_id'],
-                            'relatedTo': {
-                                'type': 'payment',
-                                'id': payment['id']
-                            }
-                        })
-                        
-                        # Notify doctor (penalty)
-                        Notification.create(db, {
-                            'title': 'Missed Consultation - Payment Refunded',
-                            'message': f"You missed the consultation with {appointment.get('patient_name')}. Payment has been refunded to the patient.",
-                            'type': 'warning',
-                            'userId': appointment['doctor_id'],
-                            'relatedTo': {
-                                'type': 'appointment',
-                                'id': appointment['id']
-                            }
-                        })
-                        
-                        processed_payments.append({
-                            'appointment_id': appointment['id'],
-                            'action': 'refunded',
-                            'amount': payment['amount']
-                        })
+                    # Notify doctor (penalty)
+                    notifications.append({
+                        'title': 'Missed Consultation - Payment Refunded',
+                        'message': f"You missed the consultation with {appointment.get('patient_name')}. Payment has been refunded to the patient.",
+                        'type': 'warning',
+                        'userId': appointment['doctor_id'],
+                        'relatedTo': {
+                            'type': 'appointment',
+                            'id': appointment['id']
+                        }
+                    })
+                    
+                    processed_payments.append({
+                        'appointment_id': appointment['id'],
+                        'action': 'refunded',
+                        'amount': payment['amount']
+                    })
             else:
-                # Doctor joined but didn't mark as completed, auto-complete and release payment
-                Appointment.update_status(db, appointment['id'], 'completed')
+                # Doctor joined but didn't mark as completed: auto-complete and release the held payment together
+                outcome = Payment.settle_consultation(db, appointment, held_only=True)
+                payment = outcome['payment']
                 
-                payment = Payment.find_by_appointment_id(db, appointment['id'])
-                if payment and payment['payment_status'] == 'hold':
-                    # Auto-approve and release payment
-                    Payment.approve_for_release(db, payment['id'])
-                    release_success = Payment.release_payment(db, payment['id'])
-                    
-                    if release_success:
-                        # Notify doctor
-                        Notification.create(db, {
-                            'title': 'Payment Auto-Released',
-                            'message': f"Payment of ₹{payment['amount']} auto-released for completed consultation",
+                if outcome['released']:
+                    # Notify doctor
+                    notifications.append({
+                        'title': 'Payment Auto-Released',
+                        'message': f"Payment of ₹{payment['amount']} auto-released for completed consultation",
+                        'type': 'payment',
+                        'userId': appointment['doctor_id'],
+                        'relatedTo': {
                             'type': 'payment',
-                            'userId': appointment['doctor_id'],
-                            'relatedTo': {
-                                'type': 'payment',
-                                'id': payment['id']
-                            }
-                        })
-                        
-                        processed_payments.append({
-                            'appointment_id': appointment['id'],
-                            'action': 'released',
-                            'amount': payment['amount']
-                        })
+                            'id': payment['id']
+                        }
+                    })
+                    
+                    processed_payments.append({
+                        'appointment_id': appointment['id'],
+                        'action': 'released',
+                        'amount': payment['amount']
+                    })
+        
+        # One insert for every notification the sweep produced
+        Notification.create_many(db, notifications)
         
         return jsonify({
             'message': f'Processed {len(processed_payments)} overdue payments',
@@ -3178,7 +3279,10 @@ def create_test_appointment():
         }
         
         # Create the test appointment
-        appointment = Appointment.create(db, test_appointment_data)
+        try:
+            appointment = Appointment.create(db, test_appointment_data)
+        except SlotAlreadyBookedError:
+            return jsonify({'error': 'Selected time slot is already booked'}), 409
         
         logger.info(f"Test appointment created with ID: {appointment['id']}")
         
@@ -3276,11 +3380,23 @@ def delete_test_appointment(appointment_id):
         db = get_db()
         
         # Delete the appointment
-        result = db[Appointment.collection_name].delete_one({'_id': ObjectId(appointment_id)})
+        appointment = db[Appointment.collection_name].find_one_and_delete({'_id': ObjectId(appointment_id)})
         
-        if result.deleted_count == 0:
+        if not appointment:
             return jsonify({'error': 'Appointment not found'}), 404
         
+        SlotReservation.release(db, appointment_id)
+        # Freeing the cells flags the day, so the free window refresher
+        # reopens the slot as it does for a cancellation
+        if appointment.get('status') in DoctorAvailability.active_statuses and appointment.get('appointment_start'):
+            SlotOccupancy.update_cells(
+                db, appointment['doctor_id'], appointment['appointment_start'],
+                appointment['appointment_end'], occupied=False
+            )
+        StatsCounter.record_appointment(
+            db, appointment.get('doctor_id'), appointment.get('patient_id'), appointment.get('status'), delta=-1
+        )
+        
         logger.info(f"Test appointment {appointment_id} deleted")
         
         return jsonify({
@@ -3377,7 +3493,8 @@ def create_appointment_with_payment():
             'preferred_language': data.get('preferred_language', 'English'),
             'medical_history': data.get('medical_history', ''),
             'report_complaint': data.get('report_complaint', ''),
-            'video_call_id': data.get('video_call_id', f"call_{int(datetime.utcnow().timestamp())}")
+            'video_call_id': data.get('video_call_id', f"call_{int(datetime.utcnow().timestamp())}"),
+            'hold_id': data.get('hold_id')  # Slot hold placed at checkout, if any
         }
         
         logger.info(f"Creating appointment with data: {appointment_data}")
@@ -3386,6 +3503,12 @@ def create_appointment_with_payment():
         try:
             appointment = Appointment.create(db, appointment_data)
             logger.info(f"Appointment created successfully with ID: {appointment.get('id')}")
+        except SlotAlreadyBookedError:
+            return jsonify({
+                'error': 'Selected time slot is already booked',
+                'message': 'Another patient has already booked this time slot',
+                'success': False
+            }), 409
         except Exception as create_error:
             logger.error(f"Error creating appointment: {create_error}")
             import traceback
@@ -3430,11 +3553,8 @@ def create_appointment_with_payment():
                 success = True
                 
                 if success:
-                    # Update payment status to completed
-                    Payment.update_status(db, payment['id'], 'completed', transaction_id)
-                    
-                    # Update appointment status to confirmed (payment received)
-                    Appointment.update_status(db, appointment['id'], 'confirmed')
+                    # Complete the payment and confirm the appointment (payment received) together
+                    Payment.confirm_checkout(db, payment['id'], appointment['id'], transaction_id)
                     
                     payment_result = {
                         'payment_id': payment['id'],
@@ -3519,38 +3639,19 @@ def get_doctor_payment_history(current_user):
         db = get_db()
         doctor_id = current_user['id']
         
-        # Get all payments for this doctor's appointments
-        payments = list(db.payments.find({
-            'doctor_id': doctor_id
-        }).sort('created_at', -1))
-        
-        # Convert ObjectId to string and format the data
-        for payment in payments:
-            payment['id'] = str(payment['_id'])
-            payment.pop('_id', None)
-            
-            # Get appointment details
-            if payment.get('appointment_id'):
-                try:
-                    appointment = db.appointments.find_one({'_id': ObjectId(payment['appointment_id'])})
-                    if appointment:
-                        payment['appointment_details'] = {
-                            'appointment_date': appointment.get('appointment_date'),
-                            'consultation_type': appointment.get('consultation_type'),
-                            'status': appointment.get('status'),
-                            'reason': appointment.get('reason'),
-                            'patient_name': appointment.get('patient_name'),
-                            'patient_email': appointment.get('patient_email')
-                        }
-                except:
-                    payment['appointment_details'] = None
+        # Get one page of payments for this doctor's appointments with appointment details
+        limit, after = get_page_args()
+        payments, next_cursor = Payment.find_doctor_history(db, doctor_id, limit=limit, after=after)
         
         return jsonify({
             'success': True,
             'payments': payments,
-            'total_count': len(payments)
+            'total_count': len(payments),
+            'next_cursor': next_cursor
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Get doctor payment history error: {str(e)}")
         return jsonify({'error': 'Failed to fetch payment history'}), 500
@@ -3564,17 +3665,8 @@ def get_doctor_payment_stats(current_user):
         db = get_db()
         doctor_id = current_user['id']
         
-        # Aggregate payment statistics
-        pipeline = [
-            {'$match': {'doctor_id': doctor_id}},
-            {'$group': {
-                '_id': '$payment_status',
-                'count': {'$sum': 1},
-                'total_amount': {'$sum': '$amount'}
-            }}
-        ]
-        
-        stats_result = list(db.payments.aggregate(pipeline))
+        # Read the doctor's payment counters by payment_status
+        payment_counters = StatsCounter.get_doctor(db, doctor_id)['payments']
         
         # Initialize stats
         stats = {
@@ -3588,11 +3680,10 @@ def get_doctor_payment_stats(current_user):
             'on_hold_count': 0
         }
         
-        # Process aggregated results
-        for stat in stats_result:
-            status = stat['_id']
-            count = stat['count']
-            amount = stat['total_amount']
+        # Process the counters
+        for status, counter in payment_counters.items():
+            count = counter.get('count', 0)
+            amount = counter.get('amount', 0)
             
             stats['total_appointments'] += count
             stats['total_earnings'] += amount
@@ -3674,39 +3765,20 @@ def test_doctor_payment_history(doctor_id):
     try:
         db = get_db()
         
-        # Get all payments for this doctor's appointments
-        payments = list(db.payments.find({
-            'doctor_id': doctor_id
-        }).sort('created_at', -1))
-        
-        # Convert ObjectId to string and format the data
-        for payment in payments:
-            payment['id'] = str(payment['_id'])
-            payment.pop('_id', None)
-            
-            # Get appointment details
-            if payment.get('appointment_id'):
-                try:
-                    appointment = db.appointments.find_one({'_id': ObjectId(payment['appointment_id'])})
-                    if appointment:
-                        payment['appointment_details'] = {
-                            'appointment_date': appointment.get('appointment_date'),
-                            'consultation_type': appointment.get('consultation_type'),
-                            'status': appointment.get('status'),
-                            'reason': appointment.get('reason'),
-                            'patient_name': appointment.get('patient_name'),
-                            'patient_email': appointment.get('patient_email')
-                        }
-                except:
-                    payment['appointment_details'] = None
+        # Get one page of payments for this doctor's appointments with appointment details
+        limit, after = get_page_args()
+        payments, next_cursor = Payment.find_doctor_history(db, doctor_id, limit=limit, after=after)
         
         return jsonify({
             'success': True,
             'payments': payments,
             'total_count': len(payments),
+            'next_cursor': next_cursor,
             'note': 'This is a test endpoint. Use the authenticated endpoint in production.'
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         logger.error(f"Test doctor payment history error: {str(e)}")
         return jsonify({'error': 'Failed to fetch payment history'}), 500
@@ -3726,11 +3798,11 @@ def get_doctor_upcoming_notifications(current_user):
         appointments = list(db[Appointment.collection_name].find({
             'doctor_id': current_user['id'],
             'status': 'confirmed',
-            'appointment_date': {
-                '$gt': now.isoformat(),
-                '$lte': fifteen_mins_future.isoformat()
+            'appointment_start': {
+                '$gt': now,
+                '$lte': fifteen_mins_future
             }
-        }).sort('appointment_date', 1))
+        }).sort('appointment_start', 1))
         
         appointments = Appointment.serialize_list(appointments)
         
@@ -3758,11 +3830,11 @@ def get_patient_upcoming_notifications(current_user):
         appointments = list(db[Appointment.collection_name].find({
             'patient_id': current_user['id'],
             'status': 'confirmed',
-            'appointment_date': {
-                '$gt': now.isoformat(),
-                '$lte': fifteen_mins_future.isoformat()
+            'appointment_start': {
+                '$gt': now,
+                '$lte': fifteen_mins_future
             }
-        }).sort('appointment_date', 1))
+        }).sort('appointment_start', 1))
         
         appointments = Appointment.serialize_list(appointments)
         
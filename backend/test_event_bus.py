@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Tests for the change-stream event bus.
+
+Writes from a second client (standing in for another gunicorn worker) must
+reach the bus subscribers, transactions must only show up once committed,
+and the capped-collection fallback must deliver published changes once.
+
+Change streams need a replica set. Start a local single-node one with
+    mongod --replSet rs0 --dbpath /tmp/rs0 --port 27017
+    mongosh --eval "rs.initiate()"
+(override the connection string with MONGODB_URI). Tests are skipped when
+no server is reachable, and the change stream tests when it is not a
+replica set.
+"""
+
+import os
+import unittest
+import queue
+from pymongo import MongoClient
+from pymongo.errors import ServerSelectionTimeoutError
+from events import EventBus, EVENTS_COLLECTION
+from models import Appointment, Payment
+
+MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/?replicaSet=rs0')
+DATABASE_NAME = 'doceasy_test_event_bus'
+WAIT_SECONDS = 5
+
+def get_test_db(replica_set=False):
+    client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=3000)
+    try:
+        hello = client.admin.command('hello')
+    except ServerSelectionTimeoutError:
+        client.close()
+        raise unittest.SkipTest(f"No MongoDB server at {MONGODB_URI}")
+    if replica_set and not hello.get('setName'):
+        client.close()
+        raise unittest.SkipTest(f"Change streams need a replica set; {MONGODB_URI} is standalone")
+    client.drop_database(DATABASE_NAME)
+    db = client[DATABASE_NAME]
+    for collection in (Appointment.collection_name, Payment.collection_name):
+        db.create_collection(collection)
+    return client, db
+
+def start_bus(db, mode):
+    """Start a bus in the given mode and collect its events"""
+    os.environ['EVENT_BUS_MODE'] = mode
+    bus = EventBus()
+    received = queue.Queue()
+    bus.subscribe((Appointment.collection_name, Payment.collection_name), received.put)
+    bus.start(db)
+    os.environ.pop('EVENT_BUS_MODE')
+    assert bus.following.wait(WAIT_SECONDS), "Event bus did not open its feed"
+    return bus, received
+
+def next_event(received):
+    return received.get(timeout=WAIT_SECONDS)
+
+def test_change_stream_delivers_writes_from_other_clients():
+    print("📡 Testing change stream delivery")
+    print("=" * 45)
+
+    client, db = get_test_db(replica_set=True)
+    other_client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=3000)
+    bus, received = start_bus(db, 'change_stream')
+    try:
+        appointments = other_client[DATABASE_NAME][Appointment.collection_name]
+        appointment_id = appointments.insert_one({
+            'doctor_id': 'bus_doctor', 'patient_id': 'bus_patient', 'status': 'pending', 'notes': 'x' * 1000
+        }).inserted_id
+
+        event = next_event(received)
+        assert event['operation'] == 'insert' and event['id'] == str(appointment_id)
+        assert event['document'] == {'doctor_id': 'bus_doctor', 'patient_id': 'bus_patient', 'status': 'pending'}, \
+            f"Unexpected document {event['document']}"
+
+        appointments.update_one({'_id': appointment_id}, {'$set': {'status': 'confirmed'}})
+        event = next_event(received)
+        assert event['operation'] == 'update' and event['fields'] == ['status']
+        assert event['document']['status'] == 'confirmed'
+
+        appointments.delete_one({'_id': appointment_id})
+        event = next_event(received)
+        assert event['operation'] == 'delete' and event['document'] is None
+
+        print("   ✅ Inserts, updates and deletes from another client arrive with trimmed documents")
+    finally:
+        bus.stop(WAIT_SECONDS)
+        other_client.close()
+        client.drop_database(DATABASE_NAME)
+
+def test_change_stream_skips_aborted_transactions():
+    print("\n🔁 Testing transaction visibility")
+    print("=" * 45)
+
+    client, db = get_test_db(replica_set=True)
+    bus, received = start_bus(db, 'change_stream')
+    try:
+        payments = db[Payment.collection_name]
+        with client.start_session() as session:
+            session.start_transaction()
+            payments.insert_one({'doctor_id': 'bus_doctor', 'status': 'pending'}, session=session)
+            session.abort_transaction()
+
+            session.start_transaction()
+            payment_id = payments.insert_one({'doctor_id': 'bus_doctor', 'status': 'completed'}, session=session).inserted_id
+            session.commit_transaction()
+
+        event = next_event(received)
+        assert event['id'] == str(payment_id), "The aborted insert reached subscribers"
+        assert received.empty()
+
+        print("   ✅ Only committed transactions reach subscribers")
+    finally:
+        bus.stop(WAIT_SECONDS)
+        client.drop_database(DATABASE_NAME)
+
+def test_capped_fallback_delivers_published_changes_once():
+    print("\n📜 Testing capped collection fallback")
+    print("=" * 45)
+
+    client, db = get_test_db()
+    bus, received = start_bus(db, 'capped')
+    try:
+        assert db[EVENTS_COLLECTION].options().get('capped'), "Events collection is not capped"
+
+        # Another worker announcing its write
+        db[EVENTS_COLLECTION].insert_one({
+            'collection': Payment.collection_name, 'operation': 'update', 'id': 'p1',
+            'document': {'payment_status': 'released'}, 'fields': ['payment_status']
+        })
+        event = next_event(received)
+        assert event == {
+            'collection': Payment.collection_name, 'operation': 'update', 'id': 'p1',
+            'document': {'payment_status': 'released'}, 'fields': ['payment_status']
+        }, f"Unexpected event {event}"
+
+        # This worker's own publish goes through the collection, not straight to subscribers
+        bus.publish(Appointment.collection_name, 'update', 'a1', {'status': 'cancelled'}, fields=('status',))
+        event = next_event(received)
+        assert event['id'] == 'a1' and event['document'] == {'status': 'cancelled'}
+        assert received.empty(), "Published change was delivered twice"
+
+        print("   ✅ Published changes are tailed from the capped collection exactly once")
+    finally:
+        bus.stop(WAIT_SECONDS)
+        client.drop_database(DATABASE_NAME)
+
+if __name__ == "__main__":
+    try:
+        test_change_stream_delivers_writes_from_other_clients()
+        test_change_stream_skips_aborted_transactions()
+        test_capped_fallback_delivers_published_changes_once()
+        print("\n🎉 All event bus tests passed!")
+    except unittest.SkipTest as e:
+        print(f"⏭️  Skipped: {e}")
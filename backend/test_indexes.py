@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Index coverage test.
+
+Builds the index manifest on an empty database, calls every model method in
+indexes.HOT_QUERIES while recording the queries it sends, runs explain() on
+each of them and on the queries routes.py issues itself, and fails if any
+falls back to a collection scan or sorts in memory instead of walking an
+index in order. Runs against a local mongod (override with MONGODB_URI);
+skipped when no server is reachable.
+"""
+
+import os
+import unittest
+from pymongo import MongoClient, monitoring
+from pymongo.errors import ServerSelectionTimeoutError
+from indexes import ensure_indexes, HOT_QUERIES, ROUTE_QUERIES
+
+MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
+DATABASE_NAME = 'doceasy_test_indexes'
+
+# Commands whose filter decides how much of a collection they read
+QUERY_COMMANDS = ('find', 'aggregate', 'count', 'distinct', 'delete', 'update', 'findAndModify')
+# Command fields explain() does not accept
+SESSION_FIELDS = ('lsid', 'txnNumber', 'readConcern', 'writeConcern')
+
+class QueryRecorder(monitoring.CommandListener):
+    """Collects the query commands sent to the test database"""
+
+    def __init__(self):
+        self.commands = []
+
+    def started(self, event):
+        if event.command_name in QUERY_COMMANDS and event.database_name == DATABASE_NAME:
+            self.commands.append(dict(event.command))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+def get_test_db(listeners=()):
+    client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=3000, event_listeners=list(listeners))
+    try:
+        client.admin.command('ping')
+    except ServerSelectionTimeoutError:
+        client.close()
+        raise unittest.SkipTest(f"No MongoDB server at {MONGODB_URI}")
+    client.drop_database(DATABASE_NAME)
+    db = client[DATABASE_NAME]
+    ensure_indexes(db)
+    return client, db
+
+def plan_stages(plan):
+    """Yield every stage name in a query plan tree"""
+    yield plan.get('stage')
+    for key in ('inputStage', 'queryPlan'):
+        if key in plan:
+            yield from plan_stages(plan[key])
+    for child in plan.get('inputStages', []):
+        yield from plan_stages(child)
+
+def test_index_manifest_is_idempotent():
+    print("🔁 Testing that the index manifest can be applied twice")
+    print("=" * 45)
+
+    client, db = get_test_db()
+    try:
+        ensured, failed = ensure_indexes(db)
+        assert failed == 0, f"{failed} index groups failed on the second run"
+        print(f"✅ Re-applied {ensured} index groups without errors")
+    finally:
+        client.drop_database(DATABASE_NAME)
+        client.close()
+
+def explainable(command):
+    """The command as explain() takes it, or None for an intended full scan
+
+    An unfiltered, unsorted read (the dashboard totals) scans on purpose.
+    """
+    name = next(iter(command))
+    if name == 'aggregate':
+        first = command['pipeline'][0] if command['pipeline'] else {}
+        if '$match' not in first and '$sort' not in first:
+            return None
+    elif name in ('delete', 'update'):
+        statements = command['deletes' if name == 'delete' else 'updates']
+        if not any(statement['q'] for statement in statements):
+            return None
+    elif not command.get('filter', command.get('query')) and not command.get('sort'):
+        return None
+    return {key: value for key, value in command.items() if not key.startswith('$') and key not in SESSION_FIELDS}
+
+def sorts(command):
+    """Whether the command asks for its results in index order"""
+    if 'sort' in command:
+        return True
+    return any('$sort' in stage for stage in command.get('pipeline', [])[:2])
+
+def winning_plans(explanation):
+    """Yield every winning plan in an explain() result, including aggregation stages"""
+    if isinstance(explanation, dict):
+        for key, value in explanation.items():
+            if key == 'winningPlan':
+                yield value
+            else:
+                yield from winning_plans(value)
+    elif isinstance(explanation, list):
+        for item in explanation:
+            yield from winning_plans(item)
+
+def check_plan(description, collection_name, explanation, sorted_read, failures):
+    stages = [stage for plan in winning_plans(explanation) for stage in plan_stages(plan)]
+    if 'COLLSCAN' in stages or (sorted_read and 'SORT' in stages):
+        failures.append(f"{description} ({collection_name})")
+        print(f"   ❌ {description} on {collection_name}: {' <- '.join(map(str, stages))}")
+    else:
+        print(f"   ✅ {description} on {collection_name}: {' <- '.join(map(str, stages))}")
+
+def test_hot_queries_use_indexes():
+    print("🔍 Testing that hot queries do not scan whole collections or sort in memory")
+    print("=" * 45)
+
+    recorder = QueryRecorder()
+    client, db = get_test_db([recorder])
+    try:
+        failures = []
+        checked = 0
+        for description, call in HOT_QUERIES:
+            recorder.commands = []
+            call(db)
+            commands = recorder.commands
+            recorder.commands = []
+            for command in commands:
+                explain = explainable(command)
+                if explain is None:
+                    continue
+                explanation = db.command('explain', explain, verbosity='queryPlanner')
+                check_plan(description, command[next(iter(command))], explanation, sorts(command), failures)
+                checked += 1
+
+        for description, collection_name, query, sort in ROUTE_QUERIES:
+            cursor = db[collection_name].find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            check_plan(description, collection_name, cursor.explain(), bool(sort), failures)
+            checked += 1
+
+        assert not failures, f"Queries scanning whole collections or sorting in memory: {failures}"
+        print(f"✅ All {checked} hot queries use an index")
+    finally:
+        client.drop_database(DATABASE_NAME)
+        client.close()
+
+if __name__ == "__main__":
+    try:
+        test_index_manifest_is_idempotent()
+        print()
+        test_hot_queries_use_indexes()
+    except unittest.SkipTest as e:
+        print(f"⏭️  Skipped: {e}")
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Tests for the appointment reminder time wheel.
+
+Checks the wheel's scheduling arithmetic, and that many workers sweeping
+the same due appointment send its reminders exactly once. Runs against a
+local mongod (override with MONGODB_URI); skipped when no server is
+reachable.
+"""
+
+import os
+import unittest
+import threading
+from datetime import datetime, timedelta
+from pymongo import MongoClient
+from pymongo.errors import ServerSelectionTimeoutError
+from models import Appointment, Notification, SlotReservation, SlotOccupancy
+from reminders import TimeWheel, ReminderScheduler
+
+MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
+DATABASE_NAME = 'doceasy_test_reminders'
+DOCTOR_ID = 'reminder_test_doctor'
+CONCURRENT_WORKERS = 20
+
+def get_test_db():
+    client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=3000, maxPoolSize=CONCURRENT_WORKERS)
+    try:
+        client.admin.command('ping')
+    except ServerSelectionTimeoutError:
+        client.close()
+        raise unittest.SkipTest(f"No MongoDB server at {MONGODB_URI}")
+    client.drop_database(DATABASE_NAME)
+    db = client[DATABASE_NAME]
+    Appointment.create_indexes(db)
+    SlotReservation.create_indexes(db)
+    SlotOccupancy.create_indexes(db)
+    return client, db
+
+def book(db, starts_in, patient_id, status='confirmed'):
+    return Appointment.create(db, {
+        'patient_id': patient_id,
+        'doctor_id': DOCTOR_ID,
+        'doctor_name': 'Reminder',
+        'patient_name': patient_id,
+        'appointment_date': (datetime.utcnow() + starts_in).strftime('%Y-%m-%dT%H:%M:00'),
+        'status': status
+    })
+
+def test_time_wheel_fires_each_entry_once():
+    print("⏱️  Testing the time wheel")
+    print("=" * 45)
+
+    start = datetime(2030, 1, 1, 12, 0, 0)
+    wheel = TimeWheel(30, 10, start)
+    wheel.schedule('soon', start + timedelta(seconds=65))
+    wheel.schedule('next_revolution', start + timedelta(minutes=20))
+    wheel.schedule('overdue', start - timedelta(minutes=1))
+    wheel.schedule('cancelled', start + timedelta(seconds=65))
+    wheel.cancel('cancelled')
+
+    assert [key for key, _ in wheel.advance(start + timedelta(seconds=31))] == ['overdue']
+    assert [key for key, _ in wheel.advance(start + timedelta(seconds=70))] == ['soon']
+    # 'next_revolution' shares a slot with earlier ticks but waits for its own
+    assert wheel.advance(start + timedelta(minutes=19)) == []
+    # A stall longer than a revolution still fires everything due
+    assert [key for key, _ in wheel.advance(start + timedelta(hours=3))] == ['next_revolution']
+    assert len(wheel) == 0
+
+    print("   ✅ Entries fire once, on time, and cancelled entries never fire")
+
+def test_concurrent_sweeps_remind_once():
+    print("\n🔔 Testing concurrent reminder sweeps")
+    print("=" * 45)
+
+    client, db = get_test_db()
+    try:
+        due = book(db, timedelta(minutes=10), 'reminder_patient_due')
+        later = book(db, timedelta(hours=2), 'reminder_patient_later')
+        book(db, timedelta(minutes=45), 'reminder_patient_pending', status='pending')
+
+        schedulers = []
+        for _ in range(CONCURRENT_WORKERS):
+            scheduler = ReminderScheduler()
+            scheduler.start(db)
+            scheduler.stop()  # sweep by hand below
+            schedulers.append(scheduler)
+        assert due['id'] in schedulers[0].wheel and later['id'] in schedulers[0].wheel
+        assert len(schedulers[0].wheel) == 2, "Pending appointments must not be tracked"
+
+        barrier = threading.Barrier(CONCURRENT_WORKERS)
+        sweep_at = datetime.utcnow() + timedelta(seconds=60)
+        sent = []
+
+        def sweep(scheduler):
+            barrier.wait()
+            sent.append(scheduler.sweep(sweep_at))
+
+        threads = [threading.Thread(target=sweep, args=(scheduler,)) for scheduler in schedulers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        print(f"   Reminded by sweeps: {sorted(sent, reverse=True)[:3]}...")
+        assert sum(sent) == 1, f"Expected one reminder, got {sum(sent)}"
+        reminders = list(db[Notification.collection_name].find({'type': 'appointment_reminder'}))
+        assert sorted(reminder['userId'] for reminder in reminders) == sorted([DOCTOR_ID, 'reminder_patient_due'])
+
+        # A restarted worker does not pick the reminded appointment up again
+        restarted = ReminderScheduler()
+        restarted.start(db)
+        restarted.stop()
+        assert due['id'] not in restarted.wheel and later['id'] in restarted.wheel
+
+        print("   ✅ Each due appointment is reminded exactly once across workers")
+    finally:
+        client.drop_database(DATABASE_NAME)
+
+if __name__ == "__main__":
+    try:
+        test_time_wheel_fires_each_entry_once()
+        test_concurrent_sweeps_remind_once()
+        print("\n🎉 All reminder tests passed!")
+    except unittest.SkipTest as e:
+        print(f"⏭️  Skipped: {e}")
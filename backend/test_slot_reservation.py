@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Concurrency test for slot reservations.
+
+Fires many simultaneous bookings at the same doctor and slot and checks
+that exactly one of them succeeds, and that simultaneous bookings of
+different slots leave the free windows matching the bookings once the
+flagged days are rebuilt. Runs against a local mongod (override with
+MONGODB_URI); skipped when no server is reachable.
+"""
+
+import os
+import unittest
+import threading
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import MongoClient
+from pymongo.errors import ServerSelectionTimeoutError
+from models import (
+    Appointment, Doctor, DoctorAvailability, SlotReservation, SlotOccupancy, FreeWindow, SlotAlreadyBookedError
+)
+
+MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
+DATABASE_NAME = 'doceasy_test_slot_reservation'
+DOCTOR_ID = 'stress_test_doctor'
+CONCURRENT_BOOKINGS = 50
+
+def get_test_db():
+    client = MongoClient(MONGODB_URI, serverSelectionTimeoutMS=3000, maxPoolSize=CONCURRENT_BOOKINGS)
+    try:
+        client.admin.command('ping')
+    except ServerSelectionTimeoutError:
+        client.close()
+        raise unittest.SkipTest(f"No MongoDB server at {MONGODB_URI}")
+    client.drop_database(DATABASE_NAME)
+    db = client[DATABASE_NAME]
+    Appointment.create_indexes(db)
+    SlotReservation.create_indexes(db)
+    SlotOccupancy.create_indexes(db)
+    FreeWindow.create_indexes(db)
+    return client, db
+
+def book_concurrently(db, appointment_date):
+    """Book the same slot from CONCURRENT_BOOKINGS threads released at once"""
+    barrier = threading.Barrier(CONCURRENT_BOOKINGS)
+    results = {'booked': [], 'rejected': 0, 'errors': []}
+    lock = threading.Lock()
+
+    def book(patient_number):
+        barrier.wait()
+        try:
+            appointment = Appointment.create(db, {
+                'patient_id': f"stress_patient_{patient_number}",
+                'doctor_id': DOCTOR_ID,
+                'appointment_date': appointment_date,
+                'status': 'pending'
+            })
+            with lock:
+                results['booked'].append(appointment['id'])
+        except SlotAlreadyBookedError:
+            with lock:
+                results['rejected'] += 1
+        except Exception as e:
+            with lock:
+                results['errors'].append(e)
+
+    threads = [threading.Thread(target=book, args=(i,)) for i in range(CONCURRENT_BOOKINGS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+def test_concurrent_bookings_for_one_slot():
+    print("🔒 Testing concurrent bookings for one slot")
+    print("=" * 45)
+
+    client, db = get_test_db()
+    try:
+        appointment_date = (datetime.utcnow() + timedelta(days=3)).strftime('%Y-%m-%dT10:00:00')
+        results = book_concurrently(db, appointment_date)
+
+        print(f"   Booked: {len(results['booked'])}, rejected: {results['rejected']}, errors: {len(results['errors'])}")
+        assert not results['errors'], f"Unexpected errors: {results['errors']}"
+        assert len(results['booked']) == 1, f"Expected exactly one booking, got {len(results['booked'])}"
+        assert results['rejected'] == CONCURRENT_BOOKINGS - 1
+
+        # Losing requests must not leave appointments or reservations behind
+        assert db[Appointment.collection_name].count_documents({'doctor_id': DOCTOR_ID}) == 1
+        assert db[SlotReservation.collection_name].distinct('appointment_id', {'doctor_id': DOCTOR_ID}) == [
+            ObjectId(results['booked'][0])
+        ]
+        print("✅ Exactly one booking succeeded")
+    finally:
+        client.drop_database(DATABASE_NAME)
+        client.close()
+
+def test_cancelled_slot_can_be_rebooked():
+    print("🔁 Testing that cancelling an appointment releases its slot")
+    print("=" * 45)
+
+    client, db = get_test_db()
+    try:
+        appointment_date = (datetime.utcnow() + timedelta(days=3)).strftime('%Y-%m-%dT11:30:00')
+        appointment = Appointment.create(db, {
+            'patient_id': 'stress_patient_first',
+            'doctor_id': DOCTOR_ID,
+            'appointment_date': appointment_date,
+            'status': 'confirmed'
+        })
+
+        try:
+            Appointment.create(db, {
+                'patient_id': 'stress_patient_second',
+                'doctor_id': DOCTOR_ID,
+                'appointment_date': appointment_date,
+                'status': 'pending'
+            })
+            assert False, "Second booking for a reserved slot should be rejected"
+        except SlotAlreadyBookedError:
+            pass
+
+        assert DoctorAvailability.is_slot_booked(db, DOCTOR_ID, appointment_date)
+        assert Appointment.update_status(db, appointment['id'], 'cancelled')
+        assert not DoctorAvailability.is_slot_booked(db, DOCTOR_ID, appointment_date)
+
+        rebooked = Appointment.create(db, {
+            'patient_id': 'stress_patient_second',
+            'doctor_id': DOCTOR_ID,
+            'appointment_date': appointment_date,
+            'status': 'pending'
+        })
+        assert rebooked['id'] != appointment['id']
+        print("✅ Cancelled slot was released and rebooked")
+    finally:
+        client.drop_database(DATABASE_NAME)
+        client.close()
+
+def test_overlapping_durations_collide():
+    print("⏱️ Testing that bookings of different lengths cannot overlap")
+    print("=" * 45)
+
+    client, db = get_test_db()
+    try:
+        day = (datetime.utcnow() + timedelta(days=3)).strftime('%Y-%m-%d')
+        Appointment.create(db, {
+            'patient_id': 'stress_patient_long',
+            'doctor_id': DOCTOR_ID,
+            'appointment_date': f"{day}T10:00:00",
+            'duration_minutes': 60,
+            'status': 'confirmed'
+        })
+
+        # A 30-minute booking starting inside the hour must be rejected
+        try:
+            Appointment.create(db, {
+                'patient_id': 'stress_patient_short',
+                'doctor_id': DOCTOR_ID,
+                'appointment_date': f"{day}T10:30:00",
+                'duration_minutes': 30,
+                'status': 'pending'
+            })
+            assert False, "Overlapping booking should be rejected"
+        except SlotAlreadyBookedError:
+            pass
+
+        # The failed claim must not leave partial reservations behind
+        assert db[SlotReservation.collection_name].count_documents({'doctor_id': DOCTOR_ID}) == 4
+
+        # Back-to-back bookings are fine
+        assert Appointment.create(db, {
+            'patient_id': 'stress_patient_short',
+            'doctor_id': DOCTOR_ID,
+            'appointment_date': f"{day}T11:00:00",
+            'duration_minutes': 15,
+            'status': 'pending'
+        })
+        assert DoctorAvailability.is_slot_booked(db, DOCTOR_ID, f"{day}T10:45:00", 15)
+        assert not DoctorAvailability.is_slot_booked(db, DOCTOR_ID, f"{day}T11:15:00", 15)
+        print("✅ Overlapping bookings of different lengths were rejected")
+    finally:
+        client.drop_database(DATABASE_NAME)
+        client.close()
+
+def test_hold_blocks_then_converts():
+    print("⏳ Testing that a checkout hold blocks others and converts into the booking")
+    print("=" * 45)
+
+    client, db = get_test_db()
+    try:
+        day = (datetime.utcnow() + timedelta(days=3)).strftime('%Y-%m-%d')
+        slot_start, slot_end = Appointment.canonical_times(f"{day}T14:00:00", 30)
+        hold = SlotReservation.hold(db, DOCTOR_ID, slot_start, slot_end, 'stress_patient_holder')
+
+        assert DoctorAvailability.is_slot_booked(db, DOCTOR_ID, f"{day}T14:00:00", 30)
+        try:
+            Appointment.create(db, {
+                'patient_id': 'stress_patient_other',
+                'doctor_id': DOCTOR_ID,
+                'appointment_date': f"{day}T14:00:00",
+                'duration_minutes': 30,
+                'status': 'pending'
+            })
+            assert False, "Booking a held slot should be rejected"
+        except SlotAlreadyBookedError:
+            pass
+
+        appointment = Appointment.create(db, {
+            'patient_id': 'stress_patient_holder',
+            'doctor_id': DOCTOR_ID,
+            'appointment_date': f"{day}T14:00:00",
+            'duration_minutes': 30,
+            'status': 'pending',
+            'hold_id': hold['hold_id']
+        })
+        assert appointment['id'] == hold['hold_id']
+        assert db[SlotReservation.collection_name].count_documents({'kind': 'hold'}) == 0
+        assert db[SlotReservation.collection_name].count_documents({'appointment_id': ObjectId(hold['hold_id'])}) == 2
+
+        # An expired hold that the TTL monitor has not removed yet does not block booking
+        slot_start, slot_end = Appointment.canonical_times(f"{day}T15:00:00", 30)
+        SlotReservation.hold(db, DOCTOR_ID, slot_start, slot_end, 'stress_patient_holder')
+        db[SlotReservation.collection_name].update_many(
+            {'kind': 'hold'}, {'$set': {'expires_at': datetime.utcnow() - timedelta(minutes=1)}}
+        )
+        assert Appointment.create(db, {
+            'patient_id': 'stress_patient_other',
+            'doctor_id': DOCTOR_ID,
+            'appointment_date': f"{day}T15:00:00",
+            'duration_minutes': 30,
+            'status': 'pending'
+        })
+        print("✅ Hold blocked other patients and converted atomically")
+    finally:
+        client.drop_database(DATABASE_NAME)
+        client.close()
+
+def test_concurrent_bookings_keep_free_windows_current():
+    print("🪟 Testing free windows under concurrent bookings of one day")
+    print("=" * 45)
+
+    client, db = get_test_db()
+    try:
+        doctor_id = str(db[Doctor.collection_name].insert_one({
+            'name': 'Window Test', 'specialty': 'Cardiology', 'verificationStatus': 'approved'
+        }).inserted_id)
+        day = datetime.utcnow() + timedelta(days=3)
+        DoctorAvailability.create_or_update(db, doctor_id, {
+            day.strftime('%A').lower(): {
+                'is_available': True,
+                'time_slots': [{'start_time': '09:00', 'end_time': '17:00'}]
+            }
+        }, {'slot_duration_minutes': 30})
+
+        # The first half of every hour, each booked by its own thread
+        slots = [f"{day.strftime('%Y-%m-%d')}T{hour:02d}:00:00" for hour in range(9, 17)]
+        barrier = threading.Barrier(len(slots))
+        errors = []
+
+        def book(slot):
+            barrier.wait()
+            try:
+                Appointment.create(db, {
+                    'patient_id': f"window_patient_{slot}",
+                    'doctor_id': doctor_id,
+                    'appointment_date': slot,
+                    'duration_minutes': 30,
+                    'status': 'pending'
+                })
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=book, args=(slot,)) for slot in slots]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not errors, f"Unexpected errors: {errors}"
+
+        # Bookings only flag the day; the background refresher rebuilds it
+        assert FreeWindow.refresh_dirty(db) == 1, "The booked day should be flagged once"
+        assert FreeWindow.refresh_dirty(db) == 0, "A rebuilt day should not stay flagged"
+
+        def windows():
+            return sorted(
+                (window['start'], window['end'])
+                for window in db[FreeWindow.collection_name].find({'doctor_id': doctor_id, 'date': day.strftime('%Y-%m-%d')})
+            )
+
+        after_bookings = windows()
+        FreeWindow.refresh_doctor(db, doctor_id)
+        print(f"   Windows after bookings: {len(after_bookings)}, after a fresh refresh: {len(windows())}")
+        assert after_bookings == windows(), "The background rebuild left stale or duplicate windows"
+        assert len(after_bookings) == len(slots), "Every booking should split the day's window"
+        print("✅ Free windows match the bookings")
+    finally:
+        client.drop_database(DATABASE_NAME)
+        client.close()
+
+if __name__ == "__main__":
+    try:
+        test_concurrent_bookings_for_one_slot()
+        print()
+        test_cancelled_slot_can_be_rebooked()
+        print()
+        test_overlapping_durations_collide()
+        print()
+        test_hold_blocks_then_converts()
+        print()
+        test_concurrent_bookings_keep_free_windows_current()
+    except unittest.SkipTest as e:
+        print(f"⏭️  Skipped: {e}")
@@ -0,0 +1,61 @@
+"""
+Background rebuild of the free windows behind next-available searches.
+
+Bookings and cancellations only flag the occupancy day they change
+(`windows_dirty`, set in the same write as the bitmap), so the request
+never waits for the window rebuild. A thread in each worker process rebuilds
+the flagged days every FREE_WINDOW_REFRESH_SECONDS with
+`FreeWindow.refresh_dirty`; each day is claimed by one worker, and the
+versioned refresh keeps concurrent rebuilds of a doctor consistent.
+"""
+
+import os
+import threading
+import logging
+from models import FreeWindow
+
+logger = logging.getLogger(__name__)
+
+FREE_WINDOW_REFRESH_SECONDS = float(os.getenv('FREE_WINDOW_REFRESH_SECONDS', '5'))
+
+class WindowRefresher:
+    """Rebuilds the free windows of flagged days in a background thread"""
+
+    def __init__(self):
+        self._db = None
+        self._pid = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self, db):
+        """Start refreshing in this process; a no-op once started"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._db = db
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='free-windows', daemon=True)
+            self._thread.start()
+            logger.info(f"Free window refresher running in process {self._pid}")
+
+    def stop(self, timeout=None):
+        """Stop refreshing (tests and shutdown)"""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._thread = None
+        self._pid = None
+
+    def _run(self):
+        while not self._stopped.wait(FREE_WINDOW_REFRESH_SECONDS):
+            try:
+                FreeWindow.refresh_dirty(self._db)
+            except Exception as e:
+                logger.error(f"Free window refresh failed: {e}")
+
+# One refresher per process, started with the first request
+window_refresher = WindowRefresher()
@@ -5,6 +5,7 @@ import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { Video, Phone, Clock, X, Bell, Calendar } from 'lucide-react';
 import { useToast } from "@/components/ui/use-toast";
 import axios from 'axios';
+import { connectRealtime, disconnectRealtime } from '@/services/realtime';
 
 // Using relative API paths with Vite proxy
 const API_URL = '';
@@ -25,6 +26,7 @@ interface NotificationProps {
 }
 
 const AppointmentNotification: React.FC<NotificationProps> = ({ userRole, onClose }) => {
+  const [appointments, setAppointments] = useState<Appointment[]>([]);
   const [upcomingAppointments, setUpcomingAppointments] = useState<Appointment[]>([]);
   const [loading, setLoading] = useState(true);
   const navigate = useNavigate();
@@ -33,12 +35,49 @@ const AppointmentNotification: React.FC<NotificationProps> = ({ userRole, onClos
   useEffect(() => {
     fetchUpcomingAppointments();
     
-    // Set up interval to check for upcoming appointments every minute
-    const interval = setInterval(fetchUpcomingAppointments, 60000);
+    // Refetch only when the server pushes a change or a reminder (or after reconnecting)
+    const handleNotification = (notification: { type?: string }) => {
+      if (notification.type === 'appointment_reminder') {
+        fetchUpcomingAppointments();
+      }
+    };
+    const socket = connectRealtime();
+    socket?.on('connect', fetchUpcomingAppointments);
+    socket?.on('appointment_update', fetchUpcomingAppointments);
+    socket?.on('notification', handleNotification);
     
-    return () => clearInterval(interval);
+    return () => {
+      socket?.off('connect', fetchUpcomingAppointments);
+      socket?.off('appointment_update', fetchUpcomingAppointments);
+      socket?.off('notification', handleNotification);
+      disconnectRealtime();
+    };
   }, []);
 
+  useEffect(() => {
+    filterUpcomingSoon(appointments);
+    
+    // Re-check the fetched appointments every minute without hitting the API
+    const interval = setInterval(() => filterUpcomingSoon(appointments), 60000);
+    
+    return () => clearInterval(interval);
+  }, [appointments]);
+
+  // Keep appointments that are starting within the next 15 minutes
+  const filterUpcomingSoon = (appointments: Appointment[]) => {
+    const now = new Date();
+    const upcomingSoon = appointments.filter((appointment: Appointment) => {
+      const appointmentTime = new Date(appointment.appointment_date);
+      const timeDiff = appointmentTime.getTime() - now.getTime();
+      const minutesDiff = timeDiff / (1000 * 60);
+      
+      // Show notification if appointment is within 15 minutes and hasn't started yet
+      return minutesDiff > 0 && minutesDiff <= 15;
+    });
+    
+    setUpcomingAppointments(upcomingSoon);
+  };
+
   const fetchUpcomingAppointments = async () => {
     const token = localStorage.getItem('token');
     
@@ -51,20 +90,7 @@ const AppointmentNotification: React.FC<NotificationProps> = ({ userRole, onClos
         headers: { Authorization: `Bearer ${token}` }
       });
       
-      const appointments = response.data.appointments || [];
-      
-      // Filter appointments that are starting within the next 15 minutes
-      const now = new Date();
-      const upcomingSoon = appointments.filter((appointment: Appointment) => {
-        const appointmentTime = new Date(appointment.appointment_date);
-        const timeDiff = appointmentTime.getTime() - now.getTime();
-        const minutesDiff = timeDiff / (1000 * 60);
-        
-        // Show notification if appointment is within 15 minutes and hasn't started yet
-        return minutesDiff > 0 && minutesDiff <= 15;
-      });
-      
-      setUpcomingAppointments(upcomingSoon);
+      setAppointments(response.data.appointments || []);
     } catch (err) {
       console.error('Error fetching upcoming appointments:', err);
     } finally {
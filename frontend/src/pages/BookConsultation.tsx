@@ -83,6 +83,8 @@ const BookConsultation = () => {
   const [availableTimes, setAvailableTimes] = useState<string[]>([]);
   const [availableSlots, setAvailableSlots] = useState<any[]>([]);
   const [loadingSlots, setLoadingSlots] = useState(false);
+  // Slots for the whole date picker, keyed by yyyy-MM-dd, fetched in one request
+  const [slotCalendar, setSlotCalendar] = useState<Record<string, any[]>>({});
 
   // UI state
   const [activeTab, setActiveTab] = useState('details');
@@ -99,6 +101,28 @@ const BookConsultation = () => {
     return slots;
   };
 
+  // Fetch slots for every date shown in the date picker in one request
+  const fetchSlotCalendar = async () => {
+    if (!doctorId) return;
+    
+    const from = format(new Date(), 'yyyy-MM-dd');
+    const to = format(addDays(new Date(), 14), 'yyyy-MM-dd');
+    
+    try {
+      const response = await axios.get(`${API_URL}/api/doctors/${doctorId}/availability/range?from=${from}&to=${to}`);
+      if (response.data.success) {
+        const calendar: Record<string, any[]> = {};
+        response.data.days.forEach((day: any) => {
+          calendar[day.date] = day.available_slots || [];
+        });
+        setSlotCalendar(calendar);
+      }
+    } catch (error) {
+      // Dates fall back to being fetched one at a time
+      console.error('Error fetching slot calendar:', error);
+    }
+  };
+
   // Fetch available slots for a specific date
   const fetchAvailableSlots = async (date: Date) => {
     if (!doctorId) return;
@@ -113,6 +137,7 @@ const BookConsultation = () => {
       
       if (data.success) {
         setAvailableSlots(data.available_slots || []);
+        setSlotCalendar(prev => ({ ...prev, [dateString]: data.available_slots || [] }));
         
         // Extract available time slots for backward compatibility
         const availableTimes = data.available_slots
@@ -283,6 +308,7 @@ const BookConsultation = () => {
       }
       
       fetchDoctorDetails();
+      fetchSlotCalendar();
     };
     
     checkAuth();
@@ -363,8 +389,18 @@ const BookConsultation = () => {
     setSelectedDate(date);
     setSelectedTime(''); // Reset time when date changes
     
-    // Fetch available slots for the selected date
-    fetchAvailableSlots(date);
+    // Use the prefetched calendar when it has this date, otherwise fetch it
+    const cachedSlots = slotCalendar[format(date, 'yyyy-MM-dd')];
+    if (cachedSlots) {
+      setAvailableSlots(cachedSlots);
+      setAvailableTimes(
+        cachedSlots
+          .filter((slot: any) => slot.is_available && !slot.is_past)
+          .map((slot: any) => slot.time)
+      );
+    } else {
+      fetchAvailableSlots(date);
+    }
   };
 
   // Handle time selection with real-time validation
@@ -122,6 +122,8 @@ const CheckoutPage = () => {
   const [showAnimation, setShowAnimation] = useState(false);
   const [appointmentId, setAppointmentId] = useState<string>('');
   const [sessionValidated, setSessionValidated] = useState(false);
+  // Server-side hold on the selected slot while the patient pays
+  const [holdId, setHoldId] = useState<string>('');
 
   useEffect(() => {
     const initializeCheckout = async () => {
@@ -244,6 +246,37 @@ const CheckoutPage = () => {
     initializeCheckout();
   }, [location.state, navigate, toast]);
 
+  // Hold the selected slot so other patients cannot take it during checkout
+  useEffect(() => {
+    if (!bookingData) return;
+
+    const holdSlot = async () => {
+      try {
+        const response = await httpClient.post('/api/appointments/holds', {
+          doctor_id: bookingData.doctor_id,
+          appointment_date: bookingData.appointment_date,
+          consultation_type: bookingData.consultation_type
+        });
+        if (response.data.success) {
+          setHoldId(response.data.hold_id);
+        }
+      } catch (error: any) {
+        if (error.response?.status === 409) {
+          toast({
+            title: "Slot No Longer Available",
+            description: "Another patient is booking this time slot. Please go back and choose a different time.",
+            variant: "destructive"
+          });
+        } else {
+          // Booking still works without a hold; the slot is checked again on submit
+          console.error('Error holding slot:', error);
+        }
+      }
+    };
+
+    holdSlot();
+  }, [bookingData, toast]);
+
   // Validate payment form
   const validatePayment = (): boolean => {
     const newErrors: { [key: string]: string } = {};
@@ -355,6 +388,7 @@ const CheckoutPage = () => {
         preferred_language: bookingData.preferred_language,
         medical_history: bookingData.medical_history,
         report_complaint: bookingData.report_complaint,
+        hold_id: holdId || undefined,
         // Payment data
         amount: totalAmount,
         currency: 'INR',
@@ -1,6 +1,6 @@
 import { useState, useEffect } from "react";
 import { Link, useNavigate } from "react-router-dom";
-import { useQuery, useMutation, useQueryClient } from "@tanstack/react-query";
+import { useQuery, useInfiniteQuery, useMutation, useQueryClient } from "@tanstack/react-query";
 import { API_URL } from "@/config";
 import { Button } from "@/components/ui/button";
 import { Card, CardHeader, CardTitle, CardDescription, CardContent } from "@/components/ui/card";
@@ -28,6 +28,29 @@ import {
 } from "lucide-react";
 import { adminService } from "@/services/adminService";
 
+// Shown under a paginated list while the server has more pages
+const LoadMoreButton = ({ hasMore, isLoading, onLoadMore }: {
+  hasMore: boolean;
+  isLoading: boolean;
+  onLoadMore: () => void;
+}) => {
+  if (!hasMore) return null;
+  return (
+    <div className="flex justify-center py-4">
+      <Button variant="outline" onClick={onLoadMore} disabled={isLoading}>
+        {isLoading ? (
+          <>
+            <Loader2 className="h-4 w-4 mr-2 animate-spin" />
+            Loading...
+          </>
+        ) : (
+          'Load more'
+        )}
+      </Button>
+    </div>
+  );
+};
+
 const AdminDashboardNew = () => {
   const { toast } = useToast();
   const queryClient = useQueryClient();
@@ -131,15 +154,21 @@ const AdminDashboardNew = () => {
   
   // Fetch data from API using React Query
   const { 
-    data: doctors = [], 
+    data: doctorsPages,
     isLoading: isDoctorsLoading,
-    error: doctorsError 
-  } = useQuery({
+    error: doctorsError,
+    fetchNextPage: fetchMoreDoctors,
+    hasNextPage: hasMoreDoctors,
+    isFetchingNextPage: isFetchingMoreDoctors
+  } = useInfiniteQuery({
     queryKey: ['admin-doctors'],
-    queryFn: adminService.getDoctors,
+    queryFn: ({ pageParam }) => adminService.getDoctors(pageParam),
+    initialPageParam: undefined as string | undefined,
+    getNextPageParam: (lastPage) => lastPage.nextCursor,
     retry: 1,
     enabled: isAuthenticated && isAdmin,
   });
+  const doctors = doctorsPages?.pages.flatMap(page => page.items) ?? [];
   
   const { 
     data: patients = [], 
@@ -153,15 +182,21 @@ const AdminDashboardNew = () => {
   });
   
   const { 
-    data: complaints = [], 
+    data: complaintsPages,
     isLoading: isComplaintsLoading,
-    error: complaintsError 
-  } = useQuery({
+    error: complaintsError,
+    fetchNextPage: fetchMoreComplaints,
+    hasNextPage: hasMoreComplaints,
+    isFetchingNextPage: isFetchingMoreComplaints
+  } = useInfiniteQuery({
     queryKey: ['admin-complaints'],
-    queryFn: adminService.getComplaints,
+    queryFn: ({ pageParam }) => adminService.getComplaints(pageParam),
+    initialPageParam: undefined as string | undefined,
+    getNextPageParam: (lastPage) => lastPage.nextCursor,
     retry: 1,
     enabled: isAuthenticated && isAdmin,
   });
+  const complaints = complaintsPages?.pages.flatMap(page => page.items) ?? [];
   
   const { 
     data: dashboardStats = {
@@ -185,15 +220,18 @@ const AdminDashboardNew = () => {
   });
   
   const { 
-    data: users = [], 
+    data: usersPages,
     isLoading: isUsersLoading,
-    error: usersError 
-  } = useQuery({
+    error: usersError
+  } = useInfiniteQuery({
     queryKey: ['admin-users'],
-    queryFn: adminService.getAllUsers,
+    queryFn: ({ pageParam }) => adminService.getAllUsers(pageParam),
+    initialPageParam: undefined as string | undefined,
+    getNextPageParam: (lastPage) => lastPage.nextCursor,
     retry: 1,
     enabled: isAuthenticated && isAdmin,
   });
+  const users = usersPages?.pages.flatMap(page => page.items) ?? [];
   
   const { 
     data: settings,
@@ -207,27 +245,36 @@ const AdminDashboardNew = () => {
   });
   
   const { 
-    data: appointments = [], 
+    data: appointmentsPages,
     isLoading: isAppointmentsLoading,
     error: appointmentsError
-  } = useQuery({
+  } = useInfiniteQuery({
     queryKey: ['admin-appointments'],
-    queryFn: adminService.getAllAppointments,
+    queryFn: ({ pageParam }) => adminService.getAllAppointments(pageParam),
+    initialPageParam: undefined as string | undefined,
+    getNextPageParam: (lastPage) => lastPage.nextCursor,
     retry: 1,
     enabled: isAuthenticated && isAdmin,
   });
+  const appointments = appointmentsPages?.pages.flatMap(page => page.items) ?? [];
   
   const { 
-    data: notifications = [],
+    data: notificationsPages,
     isLoading: isNotificationsLoading,
     error: notificationsError,
-    refetch: refetchNotifications
-  } = useQuery({
+    refetch: refetchNotifications,
+    fetchNextPage: fetchMoreNotifications,
+    hasNextPage: hasMoreNotifications,
+    isFetchingNextPage: isFetchingMoreNotifications
+  } = useInfiniteQuery({
     queryKey: ['admin-notifications'],
-    queryFn: adminService.getNotifications,
+    queryFn: ({ pageParam }) => adminService.getNotifications(pageParam),
+    initialPageParam: undefined as string | undefined,
+    getNextPageParam: (lastPage) => lastPage.nextCursor,
     retry: 1,
     enabled: isAuthenticated && isAdmin,
   });
+  const notifications = notificationsPages?.pages.flatMap(page => page.items) ?? [];
   
   // Fetch pending verification doctors specifically
   const { 
@@ -257,17 +304,23 @@ const AdminDashboardNew = () => {
   
   // Fetch consultation history
   const { 
-    data: consultationHistory = [], 
+    data: consultationHistoryPages,
     isLoading: isConsultationHistoryLoading,
     error: consultationHistoryError,
-    refetch: refetchConsultationHistory
-  } = useQuery({
+    refetch: refetchConsultationHistory,
+    fetchNextPage: fetchMoreConsultationHistory,
+    hasNextPage: hasMoreConsultationHistory,
+    isFetchingNextPage: isFetchingMoreConsultationHistory
+  } = useInfiniteQuery({
     queryKey: ['admin-consultation-history'],
-    queryFn: adminService.getConsultationHistory,
+    queryFn: ({ pageParam }) => adminService.getConsultationHistory(pageParam),
+    initialPageParam: undefined as string | undefined,
+    getNextPageParam: (lastPage) => lastPage.nextCursor,
     retry: 1,
     enabled: isAuthenticated && isAdmin,
     staleTime: 2 * 60 * 1000, // 2 minutes
   });
+  const consultationHistory = consultationHistoryPages?.pages.flatMap(page => page.items) ?? [];
   
   // Logout handler
   const handleLogout = () => {
@@ -931,6 +984,11 @@ const AdminDashboardNew = () => {
                             </div>
                           </div>
                         ))}
+                        <LoadMoreButton
+                          hasMore={hasMoreNotifications}
+                          isLoading={isFetchingMoreNotifications}
+                          onLoadMore={() => fetchMoreNotifications()}
+                        />
                       </div>
                     )}
                   </div>
@@ -1182,6 +1240,11 @@ const AdminDashboardNew = () => {
                   </TableBody>
                 </Table>
               )}
+              <LoadMoreButton
+                hasMore={hasMoreDoctors}
+                isLoading={isFetchingMoreDoctors}
+                onLoadMore={() => fetchMoreDoctors()}
+              />
               {!isDoctorsLoading && filteredDoctors.length === 0 && (
                 <div className="text-center py-10 text-gray-500">
                   No doctors found matching your search
@@ -1387,6 +1450,11 @@ const AdminDashboardNew = () => {
                   </TableBody>
                 </Table>
               )}
+              <LoadMoreButton
+                hasMore={hasMoreComplaints}
+                isLoading={isFetchingMoreComplaints}
+                onLoadMore={() => fetchMoreComplaints()}
+              />
               {!isComplaintsLoading && filteredComplaints.length === 0 && (
                 <div className="text-center py-10 text-gray-500">
                   No complaints found matching your search
@@ -1450,7 +1518,9 @@ const AdminDashboardNew = () => {
                 <div className="flex justify-between items-center">
                   <div>
                     <p className="text-sm text-gray-500">Total Consultations</p>
-                    <h3 className="text-2xl font-bold mt-1">{consultationHistory.length}</h3>
+                    <h3 className="text-2xl font-bold mt-1">
+                      {consultationHistory.length}{hasMoreConsultationHistory ? '+' : ''}
+                    </h3>
                   </div>
                   <Calendar className="h-8 w-8 text-blue-500" />
                 </div>
@@ -1462,7 +1532,7 @@ const AdminDashboardNew = () => {
                   <div>
                     <p className="text-sm text-gray-500">Pending Payments</p>
                     <h3 className="text-2xl font-bold mt-1">
-                      {consultationHistory.filter(c => c.paymentStatus === 'on_hold').length}
+                      {consultationHistory.filter(c => c.paymentStatus === 'on_hold').length}{hasMoreConsultationHistory ? '+' : ''}
                     </h3>
                   </div>
                   <CreditCard className="h-8 w-8 text-amber-500" />
@@ -1594,6 +1664,11 @@ const AdminDashboardNew = () => {
                   </TableBody>
                 </Table>
               )}
+              <LoadMoreButton
+                hasMore={hasMoreConsultationHistory}
+                isLoading={isFetchingMoreConsultationHistory}
+                onLoadMore={() => fetchMoreConsultationHistory()}
+              />
               {!isConsultationHistoryLoading && filteredConsultationHistory.length === 0 && (
                 <div className="text-center py-10 text-gray-500">
                   No consultations found matching your search criteria
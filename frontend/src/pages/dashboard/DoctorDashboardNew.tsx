@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { Button } from "@/components/ui/button";
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card";
@@ -23,6 +23,7 @@ import axios from 'axios';
 import Footer from '@/components/layout/Footer';
 import AppointmentNotification from '@/components/AppointmentNotification';
 import DoctorNavbar from '@/components/layout/DoctorNavbar';
+import { connectRealtime, disconnectRealtime } from '@/services/realtime';
 
 // Using relative API paths with Vite proxy
 const API_URL = '';
@@ -109,11 +110,12 @@ const DoctorDashboardNew = () => {
     reason: ''
   });
   
-  // Add WebSocket state
-  const [socket, setSocket] = useState<WebSocket | null>(null);
+  // Real-time connection state
+  const [liveUpdates, setLiveUpdates] = useState(false);
   
-  // Add polling interval state
+  // Polling fallback while the real-time connection is down
   const [pollingInterval, setPollingInterval] = useState<NodeJS.Timeout | null>(null);
+  const pollingRef = useRef<NodeJS.Timeout | null>(null);
   
   // Authentication check
   useEffect(() => {
@@ -904,68 +906,63 @@ const DoctorDashboardNew = () => {
     };
   };
   
-  // Initialize WebSocket connection
-  const initializeWebSocket = () => {
-    const token = localStorage.getItem('token');
-    if (!token) return;
-    
-    const ws = new WebSocket(`${API_URL.replace('http', 'ws')}/ws/doctor/appointments`);
-    
-    ws.onopen = () => {
-      // Send authentication
-      ws.send(JSON.stringify({ token }));
-    };
-    
-    ws.onmessage = (event) => {
-      const data = JSON.parse(event.data);
-      if (data.type === 'appointment_update') {
-        // Refresh appointments when we receive an update
-        fetchTodayAppointments();
-      }
-    };
-    
-    ws.onerror = (error) => {
-      console.error('WebSocket error:', error);
-      // Fall back to polling on WebSocket error
-      startPolling();
-    };
-    
-    ws.onclose = () => {
-      // Fall back to polling when WebSocket closes
-      startPolling();
-    };
-    
-    setSocket(ws);
-  };
-  
   // Start polling for updates
   const startPolling = () => {
-    if (pollingInterval) clearInterval(pollingInterval);
+    if (pollingRef.current) return;
     
     const interval = setInterval(() => {
       fetchTodayAppointments();
     }, 30000); // Poll every 30 seconds
     
+    pollingRef.current = interval;
     setPollingInterval(interval);
   };
   
-  // Clean up function
-  const cleanup = () => {
-    if (socket) {
-      socket.close();
-    }
-    if (pollingInterval) {
-      clearInterval(pollingInterval);
+  // Stop polling once live updates are back
+  const stopPolling = () => {
+    if (pollingRef.current) {
+      clearInterval(pollingRef.current);
+      pollingRef.current = null;
     }
+    setPollingInterval(null);
   };
   
-  // Add useEffect for WebSocket and polling
+  // Subscribe to appointment updates, polling only while disconnected
   useEffect(() => {
-    // Try WebSocket first
-    initializeWebSocket();
+    const socket = connectRealtime();
+    if (!socket) return;
+    
+    const handleConnect = () => {
+      setLiveUpdates(true);
+      stopPolling();
+      // Catch up on anything missed while disconnected
+      fetchTodayAppointments();
+    };
+    const handleDisconnect = () => {
+      setLiveUpdates(false);
+      startPolling();
+    };
+    const handleAppointmentUpdate = () => {
+      fetchTodayAppointments();
+    };
+    
+    socket.on('connect', handleConnect);
+    socket.on('connect_error', handleDisconnect);
+    socket.on('disconnect', handleDisconnect);
+    socket.on('appointment_update', handleAppointmentUpdate);
+    if (socket.connected) {
+      setLiveUpdates(true);
+    }
     
     // Clean up on unmount
-    return () => cleanup();
+    return () => {
+      socket.off('connect', handleConnect);
+      socket.off('connect_error', handleDisconnect);
+      socket.off('disconnect', handleDisconnect);
+      socket.off('appointment_update', handleAppointmentUpdate);
+      disconnectRealtime();
+      stopPolling();
+    };
   }, []);
   
   if (loading) {
@@ -1500,7 +1497,7 @@ const DoctorDashboardNew = () => {
                 </CardTitle>
                     <CardDescription className="flex items-center gap-2">
                   Scheduled consultations for today
-                      {socket?.readyState === WebSocket.OPEN ? (
+                      {liveUpdates ? (
                         <Badge variant="outline" className="bg-green-50 text-green-700 gap-1">
                           <span className="relative flex h-2 w-2">
                             <span className="animate-ping absolute inline-flex h-full w-full rounded-full bg-green-400 opacity-75"></span>
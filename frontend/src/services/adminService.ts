@@ -21,6 +21,23 @@ api.interceptors.request.use(
   }
 );
 
+// One page of a paginated list; pass nextCursor back as `after` for the next page
+export interface Page<T> {
+  items: T[];
+  nextCursor?: string;
+}
+
+// Fetch one page of a paginated list endpoint. Array endpoints return the
+// next cursor in the X-Next-Cursor header, object endpoints in a
+// next_cursor field next to the list under `key`.
+const fetchPage = async (url: string, after?: string, key?: string): Promise<Page<any>> => {
+  const response = await api.get(url, { params: { after } });
+  return {
+    items: key ? response.data[key] : response.data,
+    nextCursor: (key ? response.data.next_cursor : response.headers['x-next-cursor']) || undefined,
+  };
+};
+
 // Add response interceptor to handle 401 errors and token refresh
 api.interceptors.response.use(
   (response) => response,
@@ -213,11 +230,10 @@ export const adminService = {
   },
 
   // Doctor management
-  getDoctors: async (): Promise<Doctor[]> => {
+  getDoctors: async (after?: string): Promise<Page<Doctor>> => {
     try {
       validateAuth();
-      const response = await api.get(`/api/admin/doctors`);
-      return response.data;
+      return await fetchPage(`/api/admin/doctors`, after);
     } catch (error) {
       return handleApiError(error);
     }
@@ -295,11 +311,10 @@ export const adminService = {
   },
 
   // Complaint management
-  getComplaints: async (): Promise<Complaint[]> => {
+  getComplaints: async (after?: string): Promise<Page<Complaint>> => {
     try {
       validateAuth();
-      const response = await api.get(`/api/admin/complaints`);
-      return response.data;
+      return await fetchPage(`/api/admin/complaints`, after);
     } catch (error) {
       return handleApiError(error);
     }
@@ -362,11 +377,10 @@ export const adminService = {
   },
   
   // User management
-  getAllUsers: async (): Promise<any[]> => {
+  getAllUsers: async (after?: string): Promise<Page<any>> => {
     try {
       validateAuth();
-      const response = await api.get(`/api/admin/users`);
-      return response.data;
+      return await fetchPage(`/api/admin/users`, after);
     } catch (error) {
       return handleApiError(error);
     }
@@ -383,38 +397,34 @@ export const adminService = {
   },
   
   // Appointment management
-  getAllAppointments: async (): Promise<any[]> => {
+  getAllAppointments: async (after?: string): Promise<Page<any>> => {
     try {
       validateAuth();
-      const response = await api.get(`/api/admin/appointments`);
-      return response.data;
+      return await fetchPage(`/api/admin/appointments`, after);
     } catch (error) {
       return handleApiError(error);
     }
   },
 
   // Consultation history management
-  getConsultationHistory: async (): Promise<ConsultationHistory[]> => {
+  getConsultationHistory: async (after?: string): Promise<Page<ConsultationHistory>> => {
     try {
       validateAuth();
-      const response = await api.get(`/api/admin/consultations/history`);
-      // Ensure we always return an array
-      return Array.isArray(response.data) ? response.data : [];
+      return await fetchPage(`/api/admin/consultations/history`, after);
     } catch (error) {
       console.error('Failed to get consultation history:', error);
-      return []; // Return empty array on error
+      return { items: [] }; // Return an empty page on error
     }
   },
 
   // Payment history management
-  getPaymentHistory: async (): Promise<PaymentHistory[]> => {
+  getPaymentHistory: async (after?: string): Promise<Page<PaymentHistory>> => {
     try {
       validateAuth();
-      const response = await api.get(`/api/admin/payments`);
+      const { items: payments, nextCursor } = await fetchPage(`/api/admin/payments`, after, 'payments');
       
       // Transform the payment data to match our interface
-      const payments = response.data.payments || response.data;
-      return payments.map((payment: any) => ({
+      const items = payments.map((payment: any) => ({
         id: payment.id,
         appointmentId: payment.appointment_id,
         patientName: payment.patient_name,
@@ -431,6 +441,7 @@ export const adminService = {
         approvedBy: payment.approved_by,
         approvedAt: payment.approved_at
       }));
+      return { items, nextCursor };
     } catch (error) {
       return handleApiError(error);
     }
@@ -448,11 +459,10 @@ export const adminService = {
   },
 
   // Notification management
-  getNotifications: async (): Promise<Notification[]> => {
+  getNotifications: async (after?: string): Promise<Page<Notification>> => {
     try {
       validateAuth();
-      const response = await api.get(`/api/admin/notifications`);
-      return response.data;
+      return await fetchPage(`/api/admin/notifications`, after);
     } catch (error) {
       return handleApiError(error);
     }
@@ -0,0 +1,47 @@
+import { io, Socket } from 'socket.io-client';
+import { API_URL } from '@/config';
+
+// Events pushed by the backend (see backend/realtime.py)
+export interface AppointmentUpdateEvent {
+  appointment_id: string;
+  status: string;
+  doctor_id: string;
+  patient_id: string;
+}
+
+export interface PaymentUpdateEvent {
+  payment_id: string;
+  appointment_id: string;
+  status: string;
+  payment_status: string;
+  doctor_id: string;
+  patient_id: string;
+}
+
+// One connection per tab, shared by every component that subscribes
+let socket: Socket | null = null;
+let subscribers = 0;
+
+// Connect (or reuse the connection) with the current JWT
+export const connectRealtime = (): Socket | null => {
+  if (!localStorage.getItem('token')) return null;
+
+  if (!socket) {
+    socket = io(API_URL, {
+      // Read the token on every (re)connect so refreshed tokens are used
+      auth: (cb) => cb({ token: localStorage.getItem('token') }),
+      transports: ['websocket', 'polling'],
+    });
+  }
+  subscribers += 1;
+  return socket;
+};
+
+// Release the connection; it closes when the last subscriber leaves
+export const disconnectRealtime = () => {
+  subscribers = Math.max(0, subscribers - 1);
+  if (socket && subscribers === 0) {
+    socket.disconnect();
+    socket = null;
+  }
+};